@@ -206,6 +206,19 @@ class JSONEncoder(object):
         '{"foo": ["bar", "baz"]}'
 
         """
+        if (_pypyjson_encode is not None and self.ensure_ascii and
+                self.encoding == 'utf-8' and
+                type(self.item_separator) is str and
+                type(self.key_separator) is str and
+                (self.indent is None or type(self.indent) is int)):
+            if self.indent is None:
+                indent = -1
+            else:
+                indent = max(self.indent, 0)
+            return _pypyjson_encode(o, self.default, self.skipkeys,
+                                    self.allow_nan, self.sort_keys,
+                                    self.check_circular, indent,
+                                    self.item_separator, self.key_separator)
         if self.check_circular:
             markers = {}
         else:
@@ -536,3 +549,7 @@ try:
     from _pypyjson import raw_encode_basestring_ascii
 except ImportError:
     pass
+try:
+    from _pypyjson import encode as _pypyjson_encode
+except ImportError:
+    _pypyjson_encode = None
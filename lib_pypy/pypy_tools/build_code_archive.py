@@ -0,0 +1,170 @@
+"""Build a code archive: a single file holding the compiled code objects of
+the modules in some directories, which PyPy's importer consults before
+looking at the file system (see pypy/module/imp/codearchive.py).
+
+Usage:
+
+    pypy -m pypy_tools.build_code_archive OUTPUT DIR [DIR...]
+
+Run it with the same PyPy that will use the archive: the code objects are
+marshalled in its own format.  Each DIR is normally an entry of sys.path,
+for example the standard library and site-packages directories; packages
+are included recursively.  To use the archive, set PYPY_CODE_ARCHIVE to
+its path (and optionally PYPY_CODE_ARCHIVE_VALIDATE to 'none', 'mtime' or
+'hash'), or call imp._set_code_archive().
+"""
+
+import binascii
+import imp
+import marshal
+import os
+import struct
+import sys
+import time
+
+ARCHIVE_MAGIC = b'PYPYCAR1'
+MARSHAL_VERSION = 2
+
+MODULE = 0
+PACKAGE = 1
+EXTERNAL = 2
+
+
+def _u32(x):
+    return struct.pack('<I', x & 0xffffffff)
+
+def _string(s):
+    return _u32(len(s)) + s
+
+def _is_identifier(name):
+    return name and not name[0].isdigit() and name.replace('_', 'a').isalnum()
+
+
+class ArchiveBuilder(object):
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.dirs = []          # [(path, mtime)]
+        self.preload = []       # names of the modules to import at startup
+        self.entries = {}       # key -> (kind, mtime, size, crc, code data)
+        self._seen_dirs = set()
+        self.suffixes = [suffix for suffix, mode, modtype in imp.get_suffixes()
+                         if suffix != '.py']
+
+    def add_directory(self, path):
+        """Add all the modules and packages found in 'path'."""
+        if path in self._seen_dirs:
+            return
+        self._seen_dirs.add(path)
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            return
+        mtime = os.stat(path).st_mtime
+        # the archive stores whole seconds: a file created in the same
+        # second as the listing would not change the stored mtime, so
+        # don't claim to know the whole content of such a directory
+        if time.time() > mtime + 1.0:
+            self.dirs.append((path, int(mtime)))
+        for name in names:
+            full = os.path.join(path, name)
+            if os.path.isdir(full):
+                if not _is_identifier(name):
+                    continue
+                if os.path.isfile(os.path.join(full, '__init__.py')):
+                    self.entries[full] = (PACKAGE, 0, 0, 0, b'')
+                    self.add_directory(full)
+                else:
+                    self._add_external(full)
+            elif name.endswith('.py'):
+                if _is_identifier(name[:-3]):
+                    self._add_source(full)
+            else:
+                for suffix in self.suffixes:
+                    if name.endswith(suffix):
+                        if _is_identifier(name[:-len(suffix)]):
+                            self._add_external(full[:-len(suffix)])
+                        break
+
+    def _add_external(self, key):
+        # a package directory or a .py file takes precedence
+        if key not in self.entries:
+            self.entries[key] = (EXTERNAL, 0, 0, 0, b'')
+
+    def _add_source(self, filename):
+        key = filename[:-3]
+        if key in self.entries and self.entries[key][0] == PACKAGE:
+            return
+        with open(filename, 'rb') as f:
+            data = f.read()
+        with open(filename, 'U') as f:
+            source = f.read()
+        try:
+            code = compile(source, filename, 'exec', 0, True)
+        except (SyntaxError, TypeError, ValueError):
+            # let the regular import report the error
+            if self.verbose:
+                print >> sys.stderr, "skipping %s" % (filename,)
+            self.entries[key] = (EXTERNAL, 0, 0, 0, b'')
+            return
+        st = os.stat(filename)
+        self.entries[key] = (MODULE, int(st.st_mtime), st.st_size,
+                             binascii.crc32(data),
+                             marshal.dumps(code, MARSHAL_VERSION))
+        if self.verbose:
+            print >> sys.stderr, "added %s" % (filename,)
+
+    def write(self, output):
+        keys = sorted(self.entries)
+        header = [ARCHIVE_MAGIC, imp.get_magic(),
+                  _u32(len(self.dirs)), _u32(len(keys)),
+                  _u32(len(self.preload))]
+        for path, mtime in self.dirs:
+            header.append(_string(path))
+            header.append(_u32(mtime))
+        for name in self.preload:
+            header.append(_string(name))
+        index_size = sum(len(s) for s in header)
+        for key in keys:
+            index_size += 4 + len(key) + 6 * 4
+        index = []
+        data = []
+        offset = index_size
+        for key in keys:
+            kind, mtime, size, crc, code = self.entries[key]
+            index.append(_string(key) + _u32(kind) + _u32(mtime) +
+                         _u32(size) + _u32(crc) + _u32(offset) +
+                         _u32(len(code)))
+            data.append(code)
+            offset += len(code)
+        tmpname = output + '.tmp'
+        with open(tmpname, 'wb') as f:
+            f.write(b''.join(header))
+            f.write(b''.join(index))
+            f.write(b''.join(data))
+        os.rename(tmpname, output)
+
+
+def build_archive(output, directories, preload=(), verbose=False):
+    builder = ArchiveBuilder(verbose)
+    for path in directories:
+        builder.add_directory(os.path.abspath(path))
+    builder.preload.extend(preload)
+    builder.write(output)
+    return builder
+
+
+def main(argv):
+    verbose = '-v' in argv
+    args = [arg for arg in argv if arg != '-v']
+    if len(args) < 2:
+        print >> sys.stderr, __doc__
+        return 2
+    builder = build_archive(args[0], args[1:], verbose=verbose)
+    nmodules = len([e for e in builder.entries.values() if e[0] == MODULE])
+    print "%s: %d modules from %d directories" % (args[0], nmodules,
+                                                 len(builder.dirs))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
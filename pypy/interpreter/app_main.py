@@ -31,6 +31,12 @@ arg ...: arguments passed to program in sys.argv[1:]
 
 PyPy options and arguments:
 --info : print translation information about this PyPy executable
+--preload mod,... : import these modules before running the program
+--write-code-archive file : write a code archive of sys.path, listing the
+         modules imported once the interpreter is initialized (and
+         preloaded), then exit
+--code-archive file : import modules from the code archive, and preload
+         the modules it lists
 -X track-resources : track the creation of files and sockets and display
                      a warning if they are not closed explicitly
 -X faulthandler    : attempt to display tracebacks when PyPy crashes
@@ -47,6 +53,14 @@ PYPY_IRC_TOPIC: if set to a non-empty value, print a random #pypy IRC
                topic at startup of interactive mode.
 PYPYLOG: If set to a non-empty value, enable logging.
 PYPY_DISABLE_JIT: if set to a non-empty value, disable JIT.
+PYPY_CODE_ARCHIVE: code archive to import modules from, built with
+               lib_pypy/pypy_tools/build_code_archive.py.
+PYPY_CODE_ARCHIVE_VALIDATE: how to check that the archive is up-to-date:
+               'mtime' (default), 'hash' or 'none'.
+PYPY_LAZY_IMPORTS: if set to a non-empty value, 'import x' statements only
+               import x when it is first used.
+PYPY_LAZY_IMPORTS_EAGER: comma-separated list of modules that are always
+               imported right away when lazy imports are enabled.
 """
 
 try:
@@ -338,6 +352,47 @@ def setup_and_fix_paths(ignore_environment=False, **extra):
             sys.path.append(dir)
             _seen.add(dir)
 
+def set_code_archive(filename, validate):
+    """Returns the names of the modules that the archive asks to
+    preload."""
+    try:
+        import imp
+        return imp._set_code_archive(filename, validate)
+    except (ImportError, IOError, ValueError, AttributeError) as e:
+        print >> sys.stderr, "warning: code archive %r not used: %s" % (
+            filename, e)
+        return []
+
+def set_lazy_imports(eager):
+    try:
+        import imp
+        imp._set_lazy_imports(True, eager)
+    except (ImportError, AttributeError) as e:
+        print >> sys.stderr, "warning: lazy imports not enabled: %s" % (e,)
+
+def preload_modules(names):
+    for name in names:
+        try:
+            __import__(name)
+        except ImportError as e:
+            print >> sys.stderr, "warning: cannot preload %r: %s" % (name, e)
+
+def write_startup_archive(filename):
+    # A code archive of the directories of sys.path which also lists the
+    # modules imported so far, to preload them.  This is not a heap
+    # snapshot: the listed modules are imported again at startup.  Take
+    # the list before importing the builder, which imports more modules.
+    modules = []
+    for name, module in sys.modules.items():
+        modfile = getattr(module, '__file__', None)
+        if (name != '__main__' and isinstance(modfile, str) and
+                modfile.endswith(('.py', '.pyc'))):
+            modules.append(name)
+    import os
+    from pypy_tools.build_code_archive import build_archive
+    directories = [path for path in sys.path if path and os.path.isdir(path)]
+    build_archive(filename, directories, modules)
+
 def set_stdio_encodings(ignore_environment):
     if IS_WINDOWS:
         pathsep = ';' 
@@ -413,7 +468,10 @@ default_options = dict.fromkeys(
     "run_module",
     "run_stdin",
     "warnoptions",
-    "unbuffered"), 0)
+    "unbuffered",
+    "preload",
+    "write_code_archive",
+    "code_archive"), 0)
 
 def simple_option(options, name, iterargv):
     options[name] += 1
@@ -442,6 +500,17 @@ def W_option(options, warnoption, iterargv):
 def end_options(options, _, iterargv):
     return list(iterargv)
 
+def preload_option(options, modules, iterargv):
+    if options["preload"]:
+        modules = options["preload"] + ',' + modules
+    options["preload"] = modules
+
+def write_code_archive_option(options, filename, iterargv):
+    options["write_code_archive"] = filename
+
+def code_archive_option(options, filename, iterargv):
+    options["code_archive"] = filename
+
 cmdline_options = {
     # simple options just increment the counter of the options listed above
     'b': (simple_option, 'bytes_warning'),
@@ -470,6 +539,9 @@ cmdline_options = {
     'Q':         (div_option,      Ellipsis),
     '--info':    (print_info,      None),
     '--jit':     (set_jit_option,  Ellipsis),
+    '--preload': (preload_option,  Ellipsis),
+    '--write-code-archive': (write_code_archive_option, Ellipsis),
+    '--code-archive':       (code_archive_option,       Ellipsis),
     '-funroll-loops': (funroll_loops, None),
     '-X':        (set_runtime_options, Ellipsis),
     '--':        (end_options,     None),
@@ -609,6 +681,9 @@ def run_command_line(interactive,
                      unbuffered,
                      ignore_environment,
                      verbose,
+                     preload,
+                     write_code_archive,
+                     code_archive,
                      **ignored):
     # with PyPy in top of CPython we can only have around 100
     # but we need more in the PyPy level for the compiler package
@@ -628,15 +703,29 @@ def run_command_line(interactive,
     mainmodule = type(sys)('__main__')
     sys.modules['__main__'] = mainmodule
 
+    readenv = not ignore_environment
+    archive = code_archive or (readenv and getenv('PYPY_CODE_ARCHIVE'))
+    to_preload = []
+    if archive:
+        validate = (readenv and getenv('PYPY_CODE_ARCHIVE_VALIDATE')) or 'mtime'
+        to_preload = set_code_archive(archive, validate)
+        if not code_archive:
+            to_preload = []
+    if preload:
+        to_preload = to_preload + preload.split(',')
+
     if not no_site:
         try:
             import site
         except:
             print >> sys.stderr, "'import site' failed"
 
+    if readenv and getenv('PYPY_LAZY_IMPORTS'):
+        eager = getenv('PYPY_LAZY_IMPORTS_EAGER') or ''
+        set_lazy_imports([name for name in eager.split(',') if name])
+
     set_stdio_encodings(ignore_environment)
 
-    readenv = not ignore_environment
     pythonwarnings = readenv and getenv('PYTHONWARNINGS')
     if pythonwarnings:
         warnoptions.extend(pythonwarnings.split(','))
@@ -672,6 +761,11 @@ def run_command_line(interactive,
     # to encode it during importing).  Note: very obscure.  Issue #2314.
     str(u'')
 
+    preload_modules(to_preload)
+    if write_code_archive:
+        write_startup_archive(write_code_archive)
+        return 0
+
     def inspect_requested():
         # We get an interactive prompt in one of the following three cases:
         #
@@ -192,6 +192,45 @@ class TestParseCommandLine:
 
         self.check([], {'PYPY_DISABLE_JIT': '1'}, sys_argv=[''], run_stdin=True, _jitoptions='off')
 
+    def test_code_archive_options(self):
+        self.check(['--preload', 'os,re', '--preload', 'json', 'foo'], {},
+                   sys_argv=['foo'], preload='os,re,json')
+        self.check(['--write-code-archive', 'snap', '--preload', 'os'], {},
+                   sys_argv=[''], run_stdin=True, preload='os',
+                   write_code_archive='snap')
+        self.check(['--code-archive', 'snap', '-c', 'pass'], {},
+                   sys_argv=['-c'], run_command='pass',
+                   code_archive='snap')
+
+    def test_write_startup_archive(self, monkeypatch):
+        from pypy.interpreter import app_main
+        tmpdir = udir.ensure('test_write_startup_archive', dir=1)
+        tmpdir.join('preloaded.py').write('')
+        tmpdir.join('builder_helper.py').write('')
+        pkg = tmpdir.ensure('pypy_tools', dir=1)
+        pkg.join('__init__.py').write('')
+        pkg.join('build_code_archive.py').write(
+            'import builder_helper\n'
+            'def build_archive(output, directories, preload=()):\n'
+            '    with open(output, "w") as f:\n'
+            '        f.write("\\n".join(sorted(preload)))\n')
+        monkeypatch.setattr(sys, 'path', [str(tmpdir)] + sys.path)
+        saved_modules = sys.modules.copy()
+        for name in ['pypy_tools', 'pypy_tools.build_code_archive']:
+            sys.modules.pop(name, None)
+        output = tmpdir.join('archive')
+        try:
+            import preloaded
+            app_main.write_startup_archive(str(output))
+        finally:
+            sys.modules.clear()
+            sys.modules.update(saved_modules)
+        listed = output.read().split('\n')
+        # the modules imported by the archive builder are not listed
+        assert 'preloaded' in listed
+        assert 'builder_helper' not in listed
+        assert 'pypy_tools.build_code_archive' not in listed
+
     def test_sysflags(self):
         flags = (
             ("debug", "-d", "1"),
@@ -483,6 +483,64 @@ class BufferedMixin:
             self.pos = endpos
             return space.newbytes(data)
 
+    def readinto_w(self, space, w_buffer):
+        self._check_init(space)
+        self._check_closed(space, "readinto of closed file")
+        rwbuffer = space.writebuf_w(w_buffer)
+        length = rwbuffer.getlength()
+        with self.lock:
+            written = self._readinto_generic(space, rwbuffer, length)
+        if written < 0:
+            return space.w_None
+        return space.newint(written)
+
+    def _readinto_generic(self, space, rwbuffer, length):
+        """Read up to 'length' bytes into 'rwbuffer'.  What is larger than
+           our buffer is read by the raw stream directly into 'rwbuffer',
+           without going through our buffer.  Returns -1 if the raw stream
+           would block before anything is read."""
+        # Must run with the lock held!
+        written = self._readahead()
+        if written > 0:
+            if written > length:
+                written = length
+            self.output_slice(space, rwbuffer, 0,
+                              self.buffer[self.pos:self.pos + written])
+            self.pos += written
+            if written == length:
+                return written
+
+        # We're going past the buffer's bounds, flush it
+        if self.writable:
+            self._flush_and_rewind_unlocked(space)
+        self._reader_reset_buf()
+        self.pos = 0
+
+        while written < length:
+            remaining = length - written
+            try:
+                if remaining > self.buffer_size:
+                    size = self._raw_read(space, rwbuffer, written, remaining)
+                else:
+                    # everything that was in our buffer has been consumed
+                    self._reader_reset_buf()
+                    self.pos = 0
+                    size = self._fill_buffer(space)
+                    if size > remaining:
+                        size = remaining
+                    if size > 0:
+                        self.output_slice(space, rwbuffer, written,
+                                          self.buffer[0:size])
+                        self.pos = size
+            except BlockingIOError:
+                if written == 0:
+                    return -1
+                break
+            if size == 0:
+                break
+            written += size
+        return written
+
     def _read_all(self, space):
         "Read all the file, don't update the cache"
         # Must run with the lock held!
@@ -850,6 +908,7 @@ W_BufferedReader.typedef = TypeDef(
     read = interp2app(W_BufferedReader.read_w),
     peek = interp2app(W_BufferedReader.peek_w),
     read1 = interp2app(W_BufferedReader.read1_w),
+    readinto = interp2app(W_BufferedReader.readinto_w),
     raw = interp_attrproperty_w("w_raw", cls=W_BufferedReader),
     readline = interp2app(W_BufferedReader.readline_w),
 
@@ -1047,6 +1106,7 @@ W_BufferedRandom.typedef = TypeDef(
     read = interp2app(W_BufferedRandom.read_w),
     peek = interp2app(W_BufferedRandom.peek_w),
     read1 = interp2app(W_BufferedRandom.read1_w),
+    readinto = interp2app(W_BufferedRandom.readinto_w),
     readline = interp2app(W_BufferedRandom.readline_w),
 
     write = interp2app(W_BufferedRandom.write_w),
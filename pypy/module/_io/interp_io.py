@@ -47,6 +47,7 @@ def open(space, w_file, mode="r", buffering=-1, encoding=None, errors=None,
     newline=None, closefd=True):
     from pypy.module._io.interp_bufferedio import (W_BufferedRandom,
         W_BufferedWriter, W_BufferedReader)
+    from pypy.module._io.interp_mmapreader import W_MMapReader
 
     if not (space.isinstance_w(w_file, space.w_basestring) or
         space.isinstance_w(w_file, space.w_int) or
@@ -54,6 +55,7 @@ def open(space, w_file, mode="r", buffering=-1, encoding=None, errors=None,
         raise oefmt(space.w_TypeError, "invalid file: %R", w_file)
 
     reading = writing = appending = updating = text = binary = universal = False
+    mapped = False
 
     for i in range(1, len(mode)):
         flag = mode[i]
@@ -76,6 +78,8 @@ def open(space, w_file, mode="r", buffering=-1, encoding=None, errors=None,
         elif flag == "U":
             universal = True
             reading = True
+        elif flag == "m":
+            mapped = True
         else:
             raise oefmt(space.w_ValueError, "invalid mode: %s", mode)
 
@@ -103,6 +107,9 @@ def open(space, w_file, mode="r", buffering=-1, encoding=None, errors=None,
     if binary and newline is not None:
         raise oefmt(space.w_ValueError,
                     "binary mode doesn't take a newline argument")
+    if mapped and not (reading and binary and not updating):
+        raise oefmt(space.w_ValueError,
+                    "mode 'm' is only supported with 'rb'")
     w_raw = space.call_function(
         space.gettypefor(W_FileIO), w_file, space.newtext(rawmode), space.newbool(closefd)
     )
@@ -129,6 +136,10 @@ def open(space, w_file, mode="r", buffering=-1, encoding=None, errors=None,
     if buffering < 0:
         raise oefmt(space.w_ValueError, "invalid buffering size")
 
+    if mapped:
+        # the reader maps the whole file, it needs no buffer
+        return space.call_function(space.gettypefor(W_MMapReader), w_raw)
+
     if buffering == 0:
         if not binary:
             raise oefmt(space.w_ValueError, "can't have unbuffered text I/O")
@@ -0,0 +1,301 @@
+import os, stat, weakref
+
+from pypy.interpreter.error import OperationError, oefmt, wrap_oserror
+from pypy.interpreter.typedef import (
+    TypeDef, GetSetProperty, generic_new_descr, interp_attrproperty_w)
+from pypy.interpreter.gateway import interp2app, unwrap_spec
+from pypy.interpreter.buffer import SimpleView
+
+from rpython.rlib import rmmap
+from rpython.rlib.buffer import RawBuffer, StringBuffer
+from rpython.rlib.objectmodel import keepalive_until_here
+from rpython.rtyper.lltypesystem import lltype, rffi
+from pypy.module._io.interp_iobase import (
+    DEFAULT_BUFFER_SIZE, convert_size, check_readable_w)
+from pypy.module._io.interp_bufferedio import W_BufferedIOBase
+
+
+class MMapReaderBuffer(RawBuffer):
+    """A read-only view of the whole mapping, without copying it."""
+    _immutable_ = True
+
+    def __init__(self, space, mmap):
+        self.space = space
+        self.mmap = mmap
+        self.readonly = True
+
+    def getlength(self):
+        self.check_valid()
+        return self.mmap.size
+
+    def getitem(self, index):
+        self.check_valid()
+        return self.mmap.data[index]
+
+    def getslice(self, start, step, size):
+        self.check_valid()
+        if step == 1:
+            return self.mmap.getslice(start, size)
+        return RawBuffer.getslice(self, start, step, size)
+
+    def get_raw_address(self):
+        self.check_valid()
+        return self.mmap.data
+
+    def check_valid(self):
+        try:
+            self.mmap.check_valid()
+        except rmmap.RValueError as e:
+            raise OperationError(self.space.w_ValueError,
+                                 self.space.newtext(e.message))
+
+
+class W_MMapReader(W_BufferedIOBase):
+    """A reader for regular binary files that maps the whole file in
+    memory instead of calling read() on it.  The page cache does the I/O,
+    and read(), readline() and readinto() copy their result directly out
+    of the mapping.  getbuffer() returns a view of the file that does not
+    copy anything; close() leaves the mapping to the views that are still
+    alive, and it is unmapped when the last of them goes away."""
+
+    def __init__(self, space):
+        W_BufferedIOBase.__init__(self, space)
+        self.w_raw = None
+        self.mmap = None    # None before __init__() and for an empty file
+        self.size = 0
+        self.pos = 0
+        self.ready = False
+        self.exports = []   # weakrefs to the MMapReaderBuffers of getbuffer()
+
+    def descr_init(self, space, w_raw):
+        self.ready = False
+        check_readable_w(space, w_raw)
+        fd = space.c_int_w(space.call_method(w_raw, "fileno"))
+        pos = space.int_w(space.call_method(w_raw, "tell"))
+        try:
+            st = os.fstat(fd)
+            if not stat.S_ISREG(st.st_mode):
+                raise oefmt(space.w_IOError,
+                            "only regular files can be memory-mapped")
+            mmap = None
+            size = 0
+            if st.st_size > 0:
+                mmap = rmmap.mmap(fd, 0, access=rmmap.ACCESS_READ)
+                size = mmap.size
+        except OSError as e:
+            raise wrap_oserror(space, e, w_exception_class=space.w_IOError)
+        except rmmap.RMMapError as e:
+            raise OperationError(space.w_ValueError, space.newtext(e.message))
+        self.w_raw = w_raw
+        self.mmap = mmap
+        self.size = size
+        self.pos = min(max(pos, 0), size)
+        self.ready = True
+
+    def _check_init(self, space):
+        if not self.ready:
+            raise oefmt(space.w_ValueError,
+                        "I/O operation on uninitialized object")
+
+    def _closed(self, space):
+        return space.is_true(space.getattr(self.w_raw,
+                                           space.newtext("closed")))
+
+    def _remaining(self, size):
+        remaining = self.size - self.pos
+        if 0 <= size < remaining:
+            return size
+        return remaining
+
+    def _read(self, size):
+        # copies the bytes out of the mapping, with no read() syscall
+        n = self._remaining(size)
+        if n <= 0:
+            return ""
+        assert self.mmap is not None
+        result = self.mmap.getslice(self.pos, n)
+        self.pos += n
+        return result
+
+    def _readline(self, limit):
+        n = self._remaining(limit)
+        if n <= 0:
+            return ""
+        assert self.mmap is not None
+        data = self.mmap.data
+        start = self.pos
+        end = start + n
+        i = start
+        while i < end:
+            if data[i] == '\n':
+                end = i + 1
+                break
+            i += 1
+        return self._read(end - start)
+
+    # ________________________________________________________________
+
+    def read_w(self, space, w_size=None):
+        self._check_init(space)
+        self._check_closed(space, "read of closed file")
+        size = convert_size(space, w_size)
+        if size < -1:
+            raise oefmt(space.w_ValueError,
+                        "read length must be positive or -1")
+        return space.newbytes(self._read(size))
+
+    @unwrap_spec(size=int)
+    def read1_w(self, space, size):
+        self._check_init(space)
+        self._check_closed(space, "read of closed file")
+        if size < 0:
+            raise oefmt(space.w_ValueError, "read length must be positive")
+        return space.newbytes(self._read(size))
+
+    @unwrap_spec(size=int)
+    def peek_w(self, space, size=0):
+        self._check_init(space)
+        self._check_closed(space, "peek of closed file")
+        if size < DEFAULT_BUFFER_SIZE:
+            size = DEFAULT_BUFFER_SIZE
+        pos = self.pos
+        result = self._read(size)
+        self.pos = pos
+        return space.newbytes(result)
+
+    def readinto_w(self, space, w_buffer):
+        self._check_init(space)
+        self._check_closed(space, "readinto of closed file")
+        rwbuffer = space.writebuf_w(w_buffer)
+        n = self._remaining(rwbuffer.getlength())
+        if n <= 0:
+            return space.newint(0)
+        assert self.mmap is not None
+        try:
+            target_address = rwbuffer.get_raw_address()
+        except ValueError:
+            self.output_slice(space, rwbuffer, 0, self._read(n))
+            return space.newint(n)
+        rffi.c_memcpy(rffi.cast(rffi.VOIDP, target_address),
+                      rffi.cast(rffi.VOIDP, self.mmap.getptr(self.pos)),
+                      rffi.cast(rffi.SIZE_T, n))
+        keepalive_until_here(rwbuffer)
+        self.pos += n
+        return space.newint(n)
+
+    def readline_w(self, space, w_limit=None):
+        self._check_init(space)
+        self._check_closed(space, "readline of closed file")
+        return space.newbytes(self._readline(convert_size(space, w_limit)))
+
+    def next_w(self, space):
+        self._check_init(space)
+        self._check_closed(space)
+        line = self._readline(-1)
+        if not line:
+            raise OperationError(space.w_StopIteration, space.w_None)
+        return space.newbytes(line)
+
+    def getbuffer_w(self, space):
+        self._check_init(space)
+        self._check_closed(space)
+        if self.mmap is None:
+            return SimpleView(StringBuffer("")).wrap(space)
+        buf = MMapReaderBuffer(space, self.mmap)
+        self.exports = [ref for ref in self.exports if ref() is not None]
+        self.exports.append(weakref.ref(buf))
+        return SimpleView(buf).wrap(space)
+
+    def _has_exports(self):
+        for ref in self.exports:
+            if ref() is not None:
+                return True
+        return False
+
+    @unwrap_spec(pos=int, whence=int)
+    def seek_w(self, space, pos, whence=0):
+        self._check_init(space)
+        self._check_closed(space, "seek of closed file")
+        if whence == 1:
+            pos += self.pos
+        elif whence == 2:
+            pos += self.size
+        elif whence != 0:
+            raise oefmt(space.w_ValueError,
+                        "whence must be between 0 and 2, not %d", whence)
+        if pos < 0:
+            raise oefmt(space.w_ValueError, "negative seek position %d", pos)
+        self.pos = pos
+        return space.newint(pos)
+
+    def tell_w(self, space):
+        self._check_init(space)
+        return space.newint(self.pos)
+
+    def close_w(self, space):
+        self._check_init(space)
+        if self._closed(space):
+            return
+        if self.mmap is not None:
+            # don't unmap memory that views may still point to, e.g. from
+            # their raw address: the mapping then stays alive as long as
+            # the views, and the mmap's destructor unmaps it
+            if not self._has_exports():
+                self.mmap.close()
+            self.mmap = None
+            self.size = 0
+        self.exports = []
+        space.call_method(self.w_raw, "close")
+
+    def flush_w(self, space):
+        self._check_init(space)
+        self._check_closed(space, "flush of closed file")
+
+    def readable_w(self, space):
+        self._check_init(space)
+        return space.w_True
+
+    def seekable_w(self, space):
+        self._check_init(space)
+        return space.w_True
+
+    def fileno_w(self, space):
+        self._check_init(space)
+        return space.call_method(self.w_raw, "fileno")
+
+    def closed_get_w(self, space):
+        self._check_init(space)
+        return space.getattr(self.w_raw, space.newtext("closed"))
+
+    def name_get_w(self, space):
+        self._check_init(space)
+        return space.getattr(self.w_raw, space.newtext("name"))
+
+    def mode_get_w(self, space):
+        self._check_init(space)
+        return space.getattr(self.w_raw, space.newtext("mode"))
+
+W_MMapReader.typedef = TypeDef(
+    '_io.MMapReader', W_BufferedIOBase.typedef,
+    __new__ = generic_new_descr(W_MMapReader),
+    __init__ = interp2app(W_MMapReader.descr_init),
+    next = interp2app(W_MMapReader.next_w),
+
+    read = interp2app(W_MMapReader.read_w),
+    read1 = interp2app(W_MMapReader.read1_w),
+    peek = interp2app(W_MMapReader.peek_w),
+    readinto = interp2app(W_MMapReader.readinto_w),
+    readline = interp2app(W_MMapReader.readline_w),
+    getbuffer = interp2app(W_MMapReader.getbuffer_w),
+    seek = interp2app(W_MMapReader.seek_w),
+    tell = interp2app(W_MMapReader.tell_w),
+    close = interp2app(W_MMapReader.close_w),
+    flush = interp2app(W_MMapReader.flush_w),
+    readable = interp2app(W_MMapReader.readable_w),
+    seekable = interp2app(W_MMapReader.seekable_w),
+    fileno = interp2app(W_MMapReader.fileno_w),
+    raw = interp_attrproperty_w("w_raw", cls=W_MMapReader),
+    closed = GetSetProperty(W_MMapReader.closed_get_w),
+    name = GetSetProperty(W_MMapReader.name_get_w),
+    mode = GetSetProperty(W_MMapReader.mode_get_w),
+)
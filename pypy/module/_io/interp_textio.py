@@ -13,11 +13,14 @@ from rpython.rlib.rbigint import rbigint
 from rpython.rlib.rstring import StringBuilder
 from rpython.rlib.rutf8 import (check_utf8, next_codepoint_pos,
                                 codepoints_in_utf8, codepoints_in_utf8,
-                                Utf8StringBuilder)
+                                Utf8StringBuilder, CheckError)
 
 
 STATE_ZERO, STATE_OK, STATE_DETACHED = range(3)
 
+# codecs whose output is the input bytes themselves, once validated
+FAST_NONE, FAST_UTF8, FAST_ASCII = range(3)
+
 SEEN_CR   = 1
 SEEN_LF   = 2
 SEEN_CRLF = 4
@@ -309,6 +312,13 @@ class DecodeBuffer(object):
         self.pos = 0
         self.upos = 0
 
+    def set_utf8(self, text, ulen):
+        assert ulen >= 0
+        self.text = text
+        self.ulen = ulen
+        self.pos = 0
+        self.upos = 0
+
     def reset(self):
         self.text = None
         self.pos = 0
@@ -443,9 +453,19 @@ class DecodeBuffer(object):
                 return False
 
         if limit < 0:
-            limit = sys.maxint
-        # XXX it might be better to search for the marker quickly, then compute
-        # the new upos afterwards.
+            # search for the marker quickly, then compute the new upos
+            # afterwards.  The marker is ascii, so it can only be found at
+            # the start of a character.
+            pos = self.pos
+            assert pos >= 0
+            found = self.text.find(marker, pos)
+            if found >= 0:
+                end = found + 1
+            else:
+                end = len(self.text)
+            self.upos += codepoints_in_utf8(self.text, pos, end)
+            self.pos = end
+            return found >= 0
         scanned = 0
         while scanned < limit:
             # don't use next_char here, since that computes a slice etc
@@ -472,12 +492,52 @@ def check_decoded(space, w_decoded):
     return w_decoded
 
 
+def _utf8_complete_prefix(s):
+    """Return the length of s without the incomplete UTF-8 sequence that
+    may be cut at its end."""
+    end = len(s)
+    i = end - 1
+    while i >= 0 and i >= end - 3:
+        c = ord(s[i])
+        if c < 0x80:
+            break
+        if c >= 0xC0:
+            if c >= 0xF0:
+                need = 4
+            elif c >= 0xE0:
+                need = 3
+            else:
+                need = 2
+            if end - i < need:
+                return i
+            break
+        i -= 1
+    return end
+
+
+def _get_fast_decoding(space, w_codec, w_errors):
+    if not space.isinstance_w(w_errors, space.w_bytes):
+        return FAST_NONE
+    if space.bytes_w(w_errors) != 'strict':
+        return FAST_NONE
+    w_name = space.findattr(w_codec, space.newtext("name"))
+    if w_name is None or not space.isinstance_w(w_name, space.w_bytes):
+        return FAST_NONE
+    name = space.bytes_w(w_name)
+    if name == 'utf-8':
+        return FAST_UTF8
+    if name == 'ascii':
+        return FAST_ASCII
+    return FAST_NONE
+
+
 class W_TextIOWrapper(W_TextIOBase):
     def __init__(self, space):
         W_TextIOBase.__init__(self, space)
         self.state = STATE_ZERO
         self.w_encoder = None
         self.w_decoder = None
+        self.fast_decoding = FAST_NONE
 
         self.decoded = DecodeBuffer()
         self.pending_bytes = None   # list of bytes objects waiting to be
@@ -529,11 +589,13 @@ class W_TextIOWrapper(W_TextIOBase):
             self.writenl = None
 
         # build the decoder object
+        self.fast_decoding = FAST_NONE
         if space.is_true(space.call_method(w_buffer, "readable")):
             w_codec = interp_codecs.lookup_codec(space,
                                                  space.text_w(self.w_encoding))
             self.w_decoder = space.call_method(w_codec,
                                                "incrementaldecoder", w_errors)
+            self.fast_decoding = _get_fast_decoding(space, w_codec, w_errors)
             if self.readuniversal:
                 self.w_decoder = space.call_function(
                     space.gettypeobject(W_IncrementalNewlineDecoder.typedef),
@@ -657,9 +719,10 @@ class W_TextIOWrapper(W_TextIOBase):
         if not self.w_decoder:
             raise oefmt(space.w_IOError, "not readable")
 
-        if self.telling:
+        if self.telling or self.fast_decoding != FAST_NONE:
             # To prepare for tell(), we need to snapshot a point in the file
-            # where the decoder's input buffer is empty.
+            # where the decoder's input buffer is empty.  The fast path
+            # below also needs to know that the decoder holds nothing.
             w_state = space.call_method(self.w_decoder, "getstate")
             if (not space.isinstance_w(w_state, space.w_tuple)
                     or space.len_w(w_state) != 2):
@@ -683,11 +746,16 @@ class W_TextIOWrapper(W_TextIOBase):
             raise oefmt(space.w_TypeError, msg, w_input)
 
         eof = space.len_w(w_input) == 0
-        w_decoded = space.call_method(self.w_decoder, "decode",
-                                      w_input, space.newbool(eof))
-        self.decoded.set(space, w_decoded)
-        if space.len_w(w_decoded) > 0:
-            eof = False
+        if (self.fast_decoding != FAST_NONE and not eof and
+                dec_buffer == "" and dec_flags == 0 and
+                self._decode_chunk_fast(space, space.bytes_w(w_input))):
+            pass
+        else:
+            w_decoded = space.call_method(self.w_decoder, "decode",
+                                          w_input, space.newbool(eof))
+            self.decoded.set(space, w_decoded)
+            if space.len_w(w_decoded) > 0:
+                eof = False
 
         if self.telling:
             # At the snapshot point, len(dec_buffer) bytes before the read,
@@ -697,6 +765,45 @@ class W_TextIOWrapper(W_TextIOBase):
 
         return not eof
 
+    def _decode_chunk_fast(self, space, input):
+        """Decode a chunk of UTF-8 or ASCII input with an empty decoder:
+        the decoded utf-8 text is the input itself, so it only needs to be
+        validated.  Only an incomplete character at the end goes through
+        the real decoder.  Returns False if the chunk needs the decoder
+        anyway (errors to report, or \\r to translate)."""
+        end = _utf8_complete_prefix(input)
+        if end == len(input):
+            text = input
+        elif self.fast_decoding == FAST_ASCII:
+            return False
+        else:
+            text = input[:end]
+        try:
+            ulen = check_utf8(text, True)
+        except CheckError:
+            return False
+        if self.fast_decoding == FAST_ASCII and ulen != len(text):
+            return False
+        if self.readuniversal:
+            if text.find('\r') >= 0:
+                return False
+            if text.find('\n') >= 0:
+                w_nldecoder = space.interp_w(W_IncrementalNewlineDecoder,
+                                             self.w_decoder)
+                w_nldecoder.seennl |= SEEN_LF
+        if end < len(input):
+            # keeps the decoder state consistent for tell() and getstate()
+            w_decoded = space.call_method(self.w_decoder, "decode",
+                                          space.newbytes(input[end:]),
+                                          space.w_False)
+            check_decoded(space, w_decoded)
+            tail, tail_len = space.utf8_len_w(w_decoded)
+            if tail_len > 0:
+                text += tail
+                ulen += tail_len
+        self.decoded.set_utf8(text, ulen)
+        return True
+
     def _ensure_data(self, space):
         while not self.decoded.has_data():
             try:
@@ -755,15 +862,14 @@ class W_TextIOWrapper(W_TextIOBase):
         return space.newutf8(builder.build(), builder.getlength())
 
     def _scan_line_ending(self, limit):
-        if self.readuniversal:
+        if self.readtranslate:
+            # Newlines are already translated, only search for \n
+            return self.decoded.find_char('\n', limit)
+        elif self.readuniversal:
             return self.decoded.find_newline_universal(limit)
         else:
-            if self.readtranslate:
-                # Newlines are already translated, only search for \n
-                newline = '\n'
-            else:
-                # Non-universal mode.
-                newline = self.readnl
+            # Non-universal mode.
+            newline = self.readnl
             if newline == '\r\n':
                 return self.decoded.find_crlf(limit)
             else:
@@ -819,6 +925,12 @@ class W_TextIOWrapper(W_TextIOBase):
             found = self._scan_line_ending(remaining)
             end_scan = self.decoded.pos
             uend_scan = self.decoded.upos
+            if builder.getlength() == 0 and (
+                    found or (limit >= 0 and uend_scan - ustart >= limit)):
+                # the whole line is in the current chunk: slice it out
+                # without going through the builder
+                assert end_scan >= 0
+                return (self.decoded.text[start:end_scan], uend_scan - ustart)
             if end_scan > start:
                 builder.append_utf8_slice(self.decoded.text, start, end_scan, uend_scan - ustart)
 
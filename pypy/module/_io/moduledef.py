@@ -22,6 +22,7 @@ class Module(MixedModule):
         'BufferedWriter': 'interp_bufferedio.W_BufferedWriter',
         'BufferedRWPair': 'interp_bufferedio.W_BufferedRWPair',
         'BufferedRandom': 'interp_bufferedio.W_BufferedRandom',
+        'MMapReader': 'interp_mmapreader.W_MMapReader',
         'TextIOWrapper': 'interp_textio.W_TextIOWrapper',
 
         'open': 'interp_io.open',
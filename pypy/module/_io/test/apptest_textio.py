@@ -405,3 +405,38 @@ def test_newlines2():
     for ch in msg:
         decoded += decoder.decode(ch)
     assert set(decoder.newlines) == {"\r", "\n", "\r\n"}
+
+def test_utf8_chunks():
+    data = u"h\xe9llo\n€€\n\U0001f600x\n" * 5
+    for chunk_size in range(1, 12):
+        b = _io.BufferedReader(_io.BytesIO(data.encode("utf-8")))
+        txt = _io.TextIOWrapper(b, encoding="utf-8")
+        txt._CHUNK_SIZE = chunk_size
+        lines = list(txt)
+        assert lines == data.splitlines(True)
+        assert txt.newlines == "\n"
+
+def test_utf8_tell_seek():
+    data = u"a\xe9\n€b\nc\r\nd\n"
+    b = _io.BufferedReader(_io.BytesIO(data.encode("utf-8")))
+    txt = _io.TextIOWrapper(b, encoding="utf-8")
+    txt._CHUNK_SIZE = 5
+    assert txt.readline() == u"a\xe9\n"
+    pos = txt.tell()
+    assert txt.readline() == u"€b\n"
+    assert txt.readline() == u"c\n"
+    assert set(txt.newlines) == {"\n", "\r\n"}
+    txt.seek(pos)
+    assert txt.read() == u"€b\nc\nd\n"
+
+def test_utf8_errors():
+    b = _io.BufferedReader(_io.BytesIO(b"abc\ndef\xff\n"))
+    txt = _io.TextIOWrapper(b, encoding="utf-8")
+    raises(UnicodeDecodeError, txt.readline)
+    b = _io.BufferedReader(_io.BytesIO(b"abc\n\xc3\xa9\n"))
+    txt = _io.TextIOWrapper(b, encoding="ascii")
+    raises(UnicodeDecodeError, txt.read, 6)
+    b = _io.BufferedReader(_io.BytesIO(b"abc\n\xc3"))
+    txt = _io.TextIOWrapper(b, encoding="utf-8")
+    assert txt.readline() == u"abc\n"
+    raises(UnicodeDecodeError, txt.readline)
@@ -169,6 +169,33 @@ class AppTestBufferedReader:
         assert f.readinto(a) == 99
         assert a == '\nb\nc' + 'a\nb\nc' * 19 + 'x' * 100
 
+    def test_readinto_bypasses_buffer(self):
+        import _io, __pypy__
+        class RecordingFileIO(_io.FileIO):
+            def readinto(self, buf):
+                self.sizes.append(len(buf))
+                return _io.FileIO.readinto(self, buf)
+        raw = RecordingFileIO(self.bigtmpfile)
+        raw.sizes = []
+        f = _io.BufferedReader(raw, buffer_size=8)
+        assert f.read(3) == 'a\nb'
+        a = bytearray(50)
+        assert f.readinto(a) == 50
+        assert a == '\nc' + ('a\nb\nc' * 10)[:48]
+        # 5 bytes from our buffer, then one read straight into 'a'
+        assert raw.sizes == [8, 45]
+        assert f.tell() == 53
+        b = __pypy__.bytebuffer(6)
+        assert f.readinto(b) == 6
+        assert b[:] == '\nca\nb\n'
+        assert raw.sizes == [8, 45, 8]
+        assert f.read(2) == 'ca'
+        a = bytearray(100)
+        assert f.readinto(a) == 39
+        assert a[:39] == ('a\nb\nc' * 8)[1:40]
+        assert f.readinto(a) == 0
+        f.close()
+
     def test_seek(self):
         import _io
         raw = _io.FileIO(self.tmpfile)
@@ -728,6 +755,26 @@ class AppTestBufferedRandom:
         f.seek(0)
         assert f.read() == 'abc'
 
+    def test_readinto_after_write(self):
+        import _io
+        raw = _io.FileIO(self.tmpfile, 'wb+')
+        f = _io.BufferedRandom(raw, buffer_size=4)
+        f.write('0123456789')
+        f.seek(2)
+        f.write('ab')
+        a = bytearray(5)
+        assert f.readinto(a) == 5
+        assert a == '45678'
+        assert f.tell() == 9
+        f.seek(0)
+        a = bytearray(20)
+        assert f.readinto(a) == 10
+        assert a[:10] == '01ab456789'
+        f.close()
+        raw = _io.FileIO(self.tmpfile, 'wb')
+        raises(_io.UnsupportedOperation, _io.BufferedWriter(raw).readinto,
+               bytearray(5))
+
     def test_write_rewind_write(self):
         # Various combinations of reading / writing / seeking
         # backwards / writing again
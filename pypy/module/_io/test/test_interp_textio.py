@@ -5,7 +5,8 @@ except ImportError:
     pytest.skip("hypothesis required")
 import os
 from pypy.module._io.interp_bytesio import W_BytesIO
-from pypy.module._io.interp_textio import W_TextIOWrapper, DecodeBuffer
+from pypy.module._io.interp_textio import (
+    W_TextIOWrapper, DecodeBuffer, _utf8_complete_prefix)
 
 # workaround suggestion for slowness by David McIver:
 # force hypothesis to initialize some lazy stuff
@@ -88,3 +89,37 @@ def test_next_char(text):
         ch = buf.next_char()
         assert ch == text[i].encode('utf-8')
     assert buf.exhausted()
+
+@given(st.text(), st.integers(min_value=1, max_value=20),
+       st.sampled_from([None, '\r', '\n', '\r\n', '']))
+@settings(deadline=None, database=None)
+@example(u'\xe9\r\n\u20ac\r', 3, None)
+def test_readline_utf8_chunks(space, txt, chunk_size, mode):
+    import io
+    data = txt.encode('utf-8')
+    expected = list(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8',
+                                     newline=mode))
+    w_stream = W_BytesIO(space)
+    w_stream.descr_init(space, space.newbytes(data))
+    w_textio = W_TextIOWrapper(space)
+    w_textio.descr_init(
+        space, w_stream, encoding='utf-8',
+        w_newline=space.w_None if mode is None else space.newtext(mode))
+    w_textio.chunk_size = chunk_size
+    lines = []
+    while True:
+        w_line = w_textio.readline_w(space, space.newint(-1))
+        line = space.utf8_w(w_line).decode('utf-8')
+        if not line:
+            break
+        lines.append(line)
+    assert lines == expected
+
+@given(st.text())
+def test_utf8_complete_prefix(text):
+    data = text.encode('utf-8')
+    for cut in range(len(data) + 1):
+        s = data[:cut]
+        end = _utf8_complete_prefix(s)
+        s[:end].decode('utf-8')
+        assert cut - end <= 3
@@ -0,0 +1,111 @@
+from rpython.tool.udir import udir
+
+
+class AppTestMMapReader:
+    spaceconfig = dict(usemodules=['_io', 'array'])
+
+    def setup_class(cls):
+        tmpfile = udir.join('mmaptmpfile')
+        tmpfile.write("a\nbb\nccc\n" * 10 + "end", mode='wb')
+        cls.w_tmpfile = cls.space.wrap(str(tmpfile))
+        emptyfile = udir.join('mmapemptyfile')
+        emptyfile.write("", mode='wb')
+        cls.w_emptyfile = cls.space.wrap(str(emptyfile))
+
+    def test_open(self):
+        import _io
+        f = _io.open(self.tmpfile, 'rbm')
+        assert isinstance(f, _io.MMapReader)
+        assert isinstance(f, _io._BufferedIOBase)
+        assert f.name == self.tmpfile
+        assert f.readable() and f.seekable()
+        assert not f.writable()
+        assert f.read() == "a\nbb\nccc\n" * 10 + "end"
+        f.close()
+        assert f.closed
+        assert f.raw.closed
+        raises(ValueError, f.read)
+        raises(ValueError, _io.open, self.tmpfile, 'rm')
+        raises(ValueError, _io.open, self.tmpfile, 'rb+m')
+        raises(ValueError, _io.open, self.tmpfile, 'wbm')
+
+    def test_read(self):
+        import _io
+        with _io.open(self.tmpfile, 'rbm') as f:
+            assert f.read(3) == "a\nb"
+            assert f.read1(2) == "b\n"
+            assert f.peek(1).startswith("ccc\n")
+            assert f.tell() == 5
+            assert f.read(0) == ""
+            raises(ValueError, f.read, -2)
+            f.seek(-3, 2)
+            assert f.read(10) == "end"
+            assert f.read() == ""
+            f.seek(1000)
+            assert f.read() == ""
+
+    def test_readline(self):
+        import _io
+        with _io.open(self.tmpfile, 'rbm') as f:
+            assert f.readline() == "a\n"
+            assert f.readline(2) == "bb"
+            assert f.readline() == "\n"
+            lines = list(f)
+            assert lines == ["ccc\n"] + ["a\n", "bb\n", "ccc\n"] * 9 + ["end"]
+            assert f.readline() == ""
+            f.seek(0)
+            assert f.readlines()[-2:] == ["ccc\n", "end"]
+
+    def test_readinto(self):
+        import _io, array
+        with _io.open(self.tmpfile, 'rbm') as f:
+            a = bytearray(50)
+            n = f.readinto(a)
+            assert n == 50
+            assert a == ("a\nbb\nccc\n" * 10)[:50]
+            b = array.array('c', 'x' * 50)
+            n = f.readinto(b)
+            assert n == 43
+            assert b.tostring() == ("a\nbb\nccc\n" * 10)[50:] + "end" + "xxxxxxx"
+            assert f.readinto(a) == 0
+
+    def test_getbuffer(self):
+        import _io
+        f = _io.open(self.tmpfile, 'rbm')
+        view = f.getbuffer()
+        assert view.readonly
+        assert len(view) == 93
+        assert view[-3:].tobytes() == "end"
+        assert f.tell() == 0
+        f.close()
+        # the mapping stays valid for the views that are still alive
+        assert view[-3:].tobytes() == "end"
+        assert len(view) == 93
+        raises(ValueError, f.read)
+
+    def test_close_with_exported_view(self):
+        import _io
+        f = _io.open(self.tmpfile, 'rbm')
+        view = f.getbuffer()
+        address = view._pypy_raw_address()
+        f.close()
+        # closing did not unmap the memory behind the raw address
+        assert view._pypy_raw_address() == address
+        assert view[:2].tobytes() == "a\n"
+
+    def test_empty_file(self):
+        import _io
+        with _io.open(self.emptyfile, 'rbm') as f:
+            assert f.read() == ""
+            assert f.readline() == ""
+            assert list(f) == []
+            assert len(f.getbuffer()) == 0
+
+    def test_starts_at_raw_position(self):
+        import _io
+        raw = _io.FileIO(self.tmpfile)
+        raw.seek(5)
+        f = _io.MMapReader(raw)
+        assert f.tell() == 5
+        assert f.readline() == "ccc\n"
+        f.close()
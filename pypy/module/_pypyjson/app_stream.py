@@ -0,0 +1,95 @@
+# NOT_RPYTHON
+
+# Streaming decoding: the input is read in chunks, and only the chunk
+# that contains the value being decoded is kept in memory.  A value that
+# does not fit in the current chunk is retried with twice as much data,
+# so that large values are not copied into the buffer too often; the
+# decoder itself only scans the new data.
+
+from _pypyjson import StreamDecoder
+
+_BEFORE_ARRAY, _FIRST_ITEM, _ITEM, _AFTER_ITEM, _AFTER_ARRAY = range(5)
+
+
+def _get_reader(source):
+    if hasattr(source, 'read'):
+        return source.read
+    view = memoryview(source)
+    position = [0]
+    def read(size):
+        start = position[0]
+        chunk = view[start:start + size].tobytes()
+        position[0] = start + len(chunk)
+        return chunk
+    return read
+
+
+def _skip_whitespace(buf, pos):
+    while pos < len(buf) and buf[pos] in ' \t\n\r':
+        pos += 1
+    return pos
+
+
+def iterload(source, array=False, chunk_size=65536):
+    """Decode a stream of JSON values and yield them one at a time.
+
+    'source' is a file-like object with a read() method, like a file or
+    an mmap, or an object that supports the buffer interface.  By
+    default it contains any number of JSON values separated by
+    whitespace, like a JSON-lines file.  If 'array' is true, it must
+    contain a single JSON array instead, and its items are yielded.
+    """
+    read = _get_reader(source)
+    decoder = StreamDecoder()
+    if array:
+        state = _BEFORE_ARRAY
+    else:
+        state = _ITEM
+    buf = ''
+    pos = 0
+    eof = False
+    size = chunk_size
+    need_more = False
+    while True:
+        pos = _skip_whitespace(buf, pos)
+        if pos == len(buf) or need_more:
+            if eof:
+                break
+            chunk = read(size)
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+            need_more = False
+            continue
+        if state == _BEFORE_ARRAY:
+            if buf[pos] != '[':
+                raise ValueError("Expected a JSON array")
+            pos += 1
+            state = _FIRST_ITEM
+            continue
+        if state == _FIRST_ITEM or state == _AFTER_ITEM:
+            if buf[pos] == ']':
+                pos += 1
+                state = _AFTER_ARRAY
+                continue
+        if state == _AFTER_ITEM:
+            if buf[pos] != ',':
+                raise ValueError("Expected ',' or ']' after an array item")
+            pos += 1
+            state = _ITEM
+            continue
+        if state == _AFTER_ARRAY:
+            raise ValueError("Extra data after the JSON array")
+        res = decoder.raw_decode(buf, pos, eof)
+        if res is None:
+            need_more = True
+            size *= 2
+            continue
+        value, pos = res
+        size = chunk_size
+        if array:
+            state = _AFTER_ITEM
+        yield value
+    if array and state != _AFTER_ARRAY:
+        raise ValueError("Unterminated JSON array")
@@ -4,9 +4,12 @@ from rpython.rlib.objectmodel import specialize, always_inline
 from rpython.rlib import rfloat, runicode, jit, objectmodel, rutf8
 from rpython.rtyper.lltypesystem import lltype, rffi
 from rpython.rlib.rarithmetic import r_uint
+from rpython.rlib.listsort import make_timsort_class
 from pypy.interpreter.error import oefmt
 from pypy.interpreter import unicodehelper
 from pypy.interpreter.baseobjspace import W_Root
+from pypy.interpreter.gateway import interp2app, unwrap_spec
+from pypy.interpreter.typedef import TypeDef
 from pypy.module._pypyjson import simd
 
 OVF_DIGITS = len(str(sys.maxint))
@@ -100,6 +103,8 @@ class JSONDecoder(W_Root):
         # string to the cache only if its hash is seen a second time
         self.lru_cache = [0] * self.LRU_SIZE
         self.lru_index = 0
+        # set by W_StreamDecoder when the whole stream is large enough
+        self.force_string_cache = False
 
         self.startmap = self.space.fromcache(Terminator)
 
@@ -121,6 +126,7 @@ class JSONDecoder(W_Root):
             jsonmap = self._get_jsonmap_from_dict(w_obj)
             if jsonmap.is_state_blocked():
                 self._devolve_jsonmap_dict(w_obj)
+        self.startmap.evict_cold_branches()
 
     def getslice(self, start, end):
         assert start >= 0
@@ -129,13 +135,15 @@ class JSONDecoder(W_Root):
 
     def skip_whitespace(self, i):
         ll_chars = self.ll_chars
-        while True:
-            ch = ll_chars[i]
-            if is_whitespace(ch):
-                i += 1
-            else:
-                break
-        return i
+        # most whitespace runs in JSON are zero or one characters long;
+        # only use the word-at-a-time loop for longer ones, like the
+        # indentation of pretty-printed documents
+        if not is_whitespace(ll_chars[i]):
+            return i
+        i += 1
+        if not is_whitespace(ll_chars[i]):
+            return i
+        return simd.skip_whitespace(ll_chars, i + 1, len(self.s))
 
     def decode_any(self, i, contextmap=None):
         """ Decode an object at position i. Optionally pass a contextmap, if
@@ -569,7 +577,8 @@ class JSONDecoder(W_Root):
             contextmap.decoded_strings += 1
             if not contextmap.should_cache_strings():
                 cache = False
-        if len(self.s) < self.MIN_SIZE_FOR_STRING_CACHE:
+        if (len(self.s) < self.MIN_SIZE_FOR_STRING_CACHE and
+                not self.force_string_cache):
             cache = False
 
         if not cache:
@@ -843,6 +852,7 @@ class MapBase(object):
             # one new leaf has been created
             self.change_number_of_leaves(1)
 
+        terminator.number_of_maps += 1
         terminator.register_potential_fringe(next)
         return next
 
@@ -875,9 +885,15 @@ class MapBase(object):
         the knowledge that one object transitioned from self to newmap.
         also it potentially decides that self should move to state USEFUL."""
         newmap.instantiation_count += 1
-        if isinstance(self, JSONMap) and self.state == MapBase.FRINGE:
-            if self.is_useful():
+        if isinstance(self, JSONMap):
+            if self.state == MapBase.FRINGE and self.is_useful():
                 self.mark_useful(terminator)
+        else:
+            # first key of an object: remember when this branch of the
+            # tree was last used, see Terminator.evict_cold_branches()
+            assert isinstance(self, Terminator)
+            newmap.last_used = self.clock
+            self.clock += 1
 
     def _make_next_map(self, w_key, key_repr):
         # Check whether w_key is already part of the self.prev chain
@@ -931,11 +947,23 @@ class MapBase(object):
 
 class Terminator(MapBase):
     """ The root node of the map transition tree. """
+
+    # the maximum number of maps in the tree, see evict_cold_branches()
+    MAX_MAPS = 50000
+
     def __init__(self, space):
         MapBase.__init__(self, space)
         # a set of all map nodes that are currently in the FRINGE state
         self.current_fringe = {}
 
+        # the number of JSONMaps in the tree, excluding the ones that were
+        # dropped when their parent was blocked or evicted
+        self.number_of_maps = 0
+        self.max_maps = self.MAX_MAPS
+        # incremented every time an object starts with one of the children
+        # of the terminator
+        self.clock = 0
+
     def register_potential_fringe(self, prelim):
         """ add prelim to the fringe, if its prev is either a Terminator or
         useful. """
@@ -949,9 +977,10 @@ class Terminator(MapBase):
                 self.cleanup_fringe()
             self.current_fringe[prelim] = None
 
-    def remove_from_fringe(self, former_fringe):
+    def remove_from_fringe(self, former_fringe, evicted=False):
         """ Remove former_fringe from self.current_fringe. """
-        assert former_fringe.state in (MapBase.USEFUL, MapBase.BLOCKED)
+        assert evicted or former_fringe.state in (MapBase.USEFUL,
+                                                  MapBase.BLOCKED)
         del self.current_fringe[former_fringe]
 
     def cleanup_fringe(self):
@@ -967,6 +996,41 @@ class Terminator(MapBase):
         assert min_fringe
         min_fringe.mark_blocked(self)
 
+    def evict_cold_branches(self):
+        """ If the tree has more than max_maps maps, remove the branches
+        starting at the children of the terminator that were least recently
+        used, until it is down to 3/4 of the limit.  The removed maps stay
+        valid for the dicts that use them, but new objects with the same
+        keys get new maps. """
+        if self.max_maps <= 0 or self.number_of_maps <= self.max_maps:
+            return
+        if self.nextmap_all is not None:
+            branches = self.nextmap_all.values()
+        else:
+            branches = [self.nextmap_first]
+        BranchSort(branches).sort()
+        goal = self.max_maps // 4 * 3
+        for branch in branches:
+            if self.number_of_maps <= goal:
+                break
+            self.number_of_maps -= branch.forget_subtree(self)
+            if self.nextmap_all is not None:
+                del self.nextmap_all[branch.w_key]
+        # rebuild the transitions and leaf count from what is left
+        self.nextmap_first = None
+        self.number_of_leaves = 1
+        if self.nextmap_all is not None:
+            if not self.nextmap_all:
+                self.nextmap_all = None
+            else:
+                leaves = 0
+                for branch in self.nextmap_all.itervalues():
+                    if (self.nextmap_first is None or
+                            branch.last_used > self.nextmap_first.last_used):
+                        self.nextmap_first = branch
+                    leaves += branch.number_of_leaves
+                self.number_of_leaves = leaves
+
     def fill_dict(self, dict_w, values_w):
         """ recursively fill the dictionary dict_w in the correct order,
         reading from values_w."""
@@ -992,6 +1056,10 @@ class JSONMap(MapBase):
         self.decoded_strings = 0
         self.cache_hits = 0
 
+        # only for the children of the terminator: the value of
+        # terminator.clock when an object last started with this key
+        self.last_used = 0
+
         # for jsondict support
         self.key_to_index = None
         self.keys_in_order = None
@@ -1071,12 +1139,28 @@ class JSONMap(MapBase):
         if self.nextmap_all:
             for next in self.nextmap_all.itervalues():
                 next.mark_blocked(terminator)
+            terminator.number_of_maps -= len(self.nextmap_all)
         elif self.nextmap_first:
             self.nextmap_first.mark_blocked(terminator)
+            terminator.number_of_maps -= 1
         self.nextmap_first = None
         self.nextmap_all = None
         self.change_number_of_leaves(-self.number_of_leaves + 1)
 
+    def forget_subtree(self, terminator):
+        """ remove self and its children from the fringe of the terminator,
+        before self is removed from the tree.  Returns the number of maps
+        in the subtree. """
+        if self.state == MapBase.FRINGE:
+            terminator.remove_from_fringe(self, evicted=True)
+        count = 1
+        if self.nextmap_all:
+            for next in self.nextmap_all.itervalues():
+                count += next.forget_subtree(terminator)
+        elif self.nextmap_first:
+            count += self.nextmap_first.forget_subtree(terminator)
+        return count
+
     def is_state_blocked(self):
         return self.state == MapBase.BLOCKED
 
@@ -1176,6 +1260,25 @@ class JSONMap(MapBase):
             res += ", fillcolor=lightslategray"
         return res
 
+BranchSort = make_timsort_class(
+    lt=lambda map1, map2: map1.last_used < map2.last_used)
+
+
+@unwrap_spec(max_maps=int)
+def set_max_maps(space, max_maps):
+    """set_max_maps(n)
+
+    Set the maximum number of key maps that the decoder keeps to represent
+    the objects it has seen.  When there are more, the maps of the keys
+    least recently seen at the start of an object are discarded.  A value
+    of 0 or less means no limit.  Returns the previous limit."""
+    terminator = space.fromcache(Terminator)
+    old_max_maps = terminator.max_maps
+    terminator.max_maps = max_maps
+    terminator.evict_cold_branches()
+    return space.newint(old_max_maps)
+
+
 @jit.dont_look_inside
 def loads(space, w_s):
     if space.isinstance_w(w_s, space.w_unicode):
@@ -1195,3 +1298,148 @@ def loads(space, w_s):
     finally:
         decoder.close()
 
+
+def is_value_delimiter(ch):
+    return is_whitespace(ch) or ch == ',' or ch == ']' or ch == '}'
+
+SCAN_VALUE = 0     # between the tokens of the value
+SCAN_STRING = 1    # inside a string
+SCAN_NUMBER = 2    # inside a number or a constant at the top level
+
+class ValueScanner(object):
+    """ Finds the end of the JSON value that starts at some position of a
+    string.  This only looks at strings and brackets, the value is not
+    checked for validity.  If the string ends before the value does, the
+    scanner remembers how far it got: the next call to scan() must be for
+    the same value, with more data after it, and only the new data is
+    scanned. """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.offset = 0        # from the start of the value
+        self.depth = 0
+        self.mode = SCAN_VALUE
+
+    def scan(self, s, start):
+        """ Return the index just after the value that starts at position
+        'start' of 's', or -1 if 's' ends before the value is complete. """
+        length = len(s)
+        i = start + self.offset
+        depth = self.depth
+        mode = self.mode
+        while i < length:
+            ch = s[i]
+            if mode == SCAN_STRING:
+                if ch == '\\':
+                    i += 2
+                elif ch == '"':
+                    i += 1
+                    mode = SCAN_VALUE
+                    if depth == 0:
+                        self.reset()
+                        return i
+                else:
+                    i += 1
+            elif mode == SCAN_NUMBER:
+                # a number or a constant: it ends at the next delimiter
+                if is_value_delimiter(ch):
+                    self.reset()
+                    return i
+                i += 1
+            elif ch == '"':
+                mode = SCAN_STRING
+                i += 1
+            elif ch == '[' or ch == '{':
+                depth += 1
+                i += 1
+            elif ch == ']' or ch == '}':
+                depth -= 1
+                i += 1
+                if depth <= 0:
+                    self.reset()
+                    return i
+            elif depth == 0:
+                mode = SCAN_NUMBER
+            else:
+                i += 1
+        self.offset = i - start
+        self.depth = depth
+        self.mode = mode
+        return -1
+
+def scan_value_end(s, i):
+    """ Return the index just after the JSON value that starts at position
+    i, or -1 if s ends before the value is complete. """
+    return ValueScanner().scan(s, i)
+
+
+class W_StreamDecoder(W_Root):
+    """ Decodes a sequence of JSON values, e.g. read in chunks from a file.
+    The key and string caches are kept between the values, which the
+    decoder of loads() can't do.  They are emptied when they grow past
+    MAX_CACHE_ENTRIES, so that the memory used stays bounded. """
+
+    MAX_CACHE_ENTRIES = 4096
+
+    def __init__(self, space):
+        self.space = space
+        self.scanner = ValueScanner()
+        self.total_size = 0
+        self._clear_caches()
+
+    def _clear_caches(self):
+        self.cache_keys = {}
+        self.cache_values = {}
+        self.lru_cache = [0] * JSONDecoder.LRU_SIZE
+        self.lru_index = 0
+
+    @jit.dont_look_inside
+    @unwrap_spec(s='bytes', start=int, final=bool)
+    def descr_raw_decode(self, space, s, start=0, final=False):
+        """raw_decode(s, start=0, final=False) -> (obj, end) or None
+
+        Decode the JSON value that starts at index 'start' of 's', after
+        whitespace, and return it together with the index just after it.
+        Return None if 's' ends before the value is complete, unless
+        'final' is true.  After None, the next call must be for the same
+        value, with more data after it."""
+        if start < 0:
+            start = 0
+        decoder = JSONDecoder(space, s)
+        try:
+            i = decoder.skip_whitespace(start)
+            if i >= len(s):
+                return space.w_None
+            if final:
+                self.scanner.reset()
+            elif self.scanner.scan(s, i) < 0:
+                return space.w_None
+            decoder.cache_keys = self.cache_keys
+            decoder.cache_values = self.cache_values
+            decoder.lru_cache = self.lru_cache
+            decoder.lru_index = self.lru_index
+            decoder.force_string_cache = (
+                self.total_size >= JSONDecoder.MIN_SIZE_FOR_STRING_CACHE)
+            w_res = decoder.decode_any(i)
+            self.lru_index = decoder.lru_index
+            self.total_size += decoder.pos - i
+            if (len(self.cache_keys) > self.MAX_CACHE_ENTRIES or
+                    len(self.cache_values) > self.MAX_CACHE_ENTRIES):
+                self._clear_caches()
+            return space.newtuple2(w_res, space.newint(decoder.pos))
+        finally:
+            decoder.close()
+
+
+def W_StreamDecoder___new__(space, w_subtype):
+    w_decoder = space.allocate_instance(W_StreamDecoder, w_subtype)
+    W_StreamDecoder.__init__(w_decoder, space)
+    return w_decoder
+
+W_StreamDecoder.typedef = TypeDef(
+    '_pypyjson.StreamDecoder',
+    __new__ = interp2app(W_StreamDecoder___new__),
+    raw_decode = interp2app(W_StreamDecoder.descr_raw_decode),
+)
@@ -1,6 +1,13 @@
+import math
 from rpython.rlib.rstring import StringBuilder
-from rpython.rlib import rutf8
+from rpython.rlib.listsort import make_timsort_class
+from rpython.rlib import jit, rutf8
 from pypy.interpreter import unicodehelper
+from pypy.interpreter.error import oefmt
+from pypy.interpreter.gateway import unwrap_spec
+from pypy.objspace.std.dictmultiobject import W_DictMultiObject
+from pypy.objspace.std.floatobject import float_repr
+from pypy.objspace.std.listobject import W_ListObject
 
 
 HEX = '0123456789abcdef'
@@ -19,20 +26,10 @@ ESCAPE_BEFORE_SPACE = [ESCAPE_DICT.get(chr(_i), '\\u%04x' % _i)
 def raw_encode_basestring_ascii(space, w_string):
     if space.isinstance_w(w_string, space.w_bytes):
         s = space.bytes_w(w_string)
-        for i in range(len(s)):
-            c = s[i]
-            if c >= ' ' and c <= '~' and c != '"' and c != '\\':
-                pass
-            else:
-                first = i
-                break
-        else:
+        if _ascii_safe_prefix(s) == len(s):
             # the input is a string with only non-special ascii chars
             return w_string
-
-        unicodehelper.check_utf8_or_raise(space, s)
         sb = StringBuilder(len(s))
-        sb.append_slice(s, 0, first)
     else:
         # We used to check if 'u' contains only safe characters, and return
         # 'w_string' directly.  But this requires an extra pass over all
@@ -41,10 +38,42 @@ def raw_encode_basestring_ascii(space, w_string):
         # a string (with the ascii encoding).  This requires two passes
         # over the characters.  So we may as well directly turn it into a
         # string here --- only one pass.
+        sb = StringBuilder(space.len_w(w_string))
+    encode_basestring_ascii_into(space, sb, w_string)
+    return space.newtext(sb.build())
+
+
+def encode_basestring_ascii_into(space, sb, w_string):
+    """Append the escaped content of the str or unicode 'w_string' to 'sb',
+    without the surrounding quotes."""
+    if space.isinstance_w(w_string, space.w_bytes):
+        s = space.bytes_w(w_string)
+        first = _ascii_safe_prefix(s)
+        if first == len(s):
+            sb.append(s)
+            return
+        unicodehelper.check_utf8_or_raise(space, s)
+        sb.append_slice(s, 0, first)
+    else:
         s = space.utf8_w(w_string)
-        sb = StringBuilder(len(s))
         first = 0
+    _escape_ascii(sb, s, first)
+
+
+def _ascii_safe_prefix(s):
+    # the length of the prefix of 's' that needs no escaping
+    for i in range(len(s)):
+        c = s[i]
+        if c >= ' ' and c <= '~' and c != '"' and c != '\\':
+            pass
+        else:
+            return i
+    return len(s)
+
 
+def _escape_ascii(sb, s, first):
+    # 's' is valid utf-8; the characters before 'first' are known not to
+    # need escaping
     it = rutf8.Utf8StringIterator(s)
     for i in range(first):
         it.next()
@@ -77,5 +106,236 @@ def raw_encode_basestring_ascii(space, w_string):
                 sb.append(HEX[(s2 >> 4) & 0x0f])
                 sb.append(HEX[s2 & 0x0f])
 
-    res = sb.build()
-    return space.newtext(res)
+
+ItemBaseTimSort = make_timsort_class()
+
+class ItemSort(ItemBaseTimSort):
+    # sorts a list of (w_key, w_value) tuples by key
+    def lt(self, a, b):
+        space = self.space
+        return space.is_true(space.lt(a[0], b[0]))
+
+
+class JSONEncoder(object):
+    """Interp-level version of json.encoder.JSONEncoder.encode(), for the
+    case ensure_ascii=True and encoding='utf-8'.  It follows the same
+    type checks in the same order as the app-level code."""
+
+    def __init__(self, space, w_default, skipkeys, allow_nan, sort_keys,
+                 check_circular, indent, item_separator, key_separator):
+        self.space = space
+        self.w_default = w_default
+        self.skipkeys = skipkeys
+        self.allow_nan = allow_nan
+        self.sort_keys = sort_keys
+        if check_circular:
+            self.markers = {}
+        else:
+            self.markers = None
+        self.indent = indent      # -1 for None
+        self.item_separator = item_separator
+        self.key_separator = key_separator
+        self.builder = StringBuilder()
+
+    def mark(self, w_obj):
+        if self.markers is not None:
+            if w_obj in self.markers:
+                raise oefmt(self.space.w_ValueError,
+                            "Circular reference detected")
+            self.markers[w_obj] = None
+
+    def unmark(self, w_obj):
+        if self.markers is not None:
+            del self.markers[w_obj]
+
+    def floatstr(self, x):
+        if math.isnan(x):
+            text = 'NaN'
+        elif math.isinf(x):
+            if x > 0.0:
+                text = 'Infinity'
+            else:
+                text = '-Infinity'
+        else:
+            return float_repr(x)
+        if not self.allow_nan:
+            raise oefmt(self.space.w_ValueError,
+                        "Out of range float values are not JSON compliant: "
+                        "%s", float_repr(x))
+        return text
+
+    def intstr(self, w_obj):
+        space = self.space
+        if space.is_w(space.type(w_obj), space.w_int):
+            return str(space.int_w(w_obj))
+        return space.bytes_w(space.str(w_obj))
+
+    def emit_indent(self, level):
+        if self.indent >= 0:
+            level += 1
+            newline_indent = '\n' + ' ' * (self.indent * level)
+            self.builder.append(newline_indent)
+            return self.item_separator + newline_indent, level
+        return self.item_separator, level
+
+    def emit_unindent(self, level):
+        if self.indent >= 0:
+            self.builder.append('\n')
+            self.builder.append(' ' * (self.indent * (level - 1)))
+
+    def encode_any(self, w_obj, level):
+        space = self.space
+        sb = self.builder
+        if space.isinstance_w(w_obj, space.w_basestring):
+            sb.append('"')
+            encode_basestring_ascii_into(space, sb, w_obj)
+            sb.append('"')
+        elif space.is_w(w_obj, space.w_None):
+            sb.append('null')
+        elif space.is_w(w_obj, space.w_True):
+            sb.append('true')
+        elif space.is_w(w_obj, space.w_False):
+            sb.append('false')
+        elif (space.isinstance_w(w_obj, space.w_int) or
+              space.isinstance_w(w_obj, space.w_long)):
+            sb.append(self.intstr(w_obj))
+        elif space.isinstance_w(w_obj, space.w_float):
+            sb.append(self.floatstr(space.float_w(w_obj)))
+        elif (space.isinstance_w(w_obj, space.w_list) or
+              space.isinstance_w(w_obj, space.w_tuple)):
+            self.encode_list(w_obj, level)
+        elif space.isinstance_w(w_obj, space.w_dict):
+            self.encode_dict(w_obj, level)
+        else:
+            self.mark(w_obj)
+            w_res = space.call_function(self.w_default, w_obj)
+            self.encode_any(w_res, level)
+            self.unmark(w_obj)
+
+    def encode_list(self, w_obj, level):
+        space = self.space
+        sb = self.builder
+        if (isinstance(w_obj, W_ListObject) and
+                space.is_w(space.type(w_obj), space.w_list)):
+            # iterate like the list iterator does, without copying
+            w_list = w_obj
+            items_w = None
+            length = w_list.length()
+        else:
+            w_list = None
+            items_w = space.unpackiterable(w_obj)
+            length = len(items_w)
+        if length == 0:
+            sb.append('[]')
+            return
+        self.mark(w_obj)
+        sb.append('[')
+        separator, level = self.emit_indent(level)
+        i = 0
+        while True:
+            if w_list is not None:
+                if i >= w_list.length():
+                    break
+                w_item = w_list.getitem(i)
+            else:
+                if i >= length:
+                    break
+                w_item = items_w[i]
+            if i > 0:
+                sb.append(separator)
+            self.encode_any(w_item, level)
+            i += 1
+        self.emit_unindent(level)
+        sb.append(']')
+        self.unmark(w_obj)
+
+    def dict_items(self, w_obj):
+        space = self.space
+        items = []
+        if (isinstance(w_obj, W_DictMultiObject) and
+                space.is_w(space.type(w_obj), space.w_dict)):
+            # go through the dict strategy directly
+            iterator = w_obj.iteritems()
+            while True:
+                w_key, w_value = iterator.next_item()
+                if w_key is None:
+                    break
+                items.append((w_key, w_value))
+        else:
+            # like the app-level encoder: items() if the keys are sorted
+            # anyway, iteritems() otherwise
+            if self.sort_keys:
+                w_items = space.call_method(w_obj, 'items')
+            else:
+                w_items = space.call_method(w_obj, 'iteritems')
+            for w_item in space.unpackiterable(w_items):
+                w_key, w_value = space.fixedview(w_item, 2)
+                items.append((w_key, w_value))
+        if self.sort_keys:
+            sorter = ItemSort(items, len(items))
+            sorter.space = space
+            sorter.sort()
+        return items
+
+    def encode_dict(self, w_obj, level):
+        space = self.space
+        sb = self.builder
+        if space.len_w(w_obj) == 0:
+            sb.append('{}')
+            return
+        self.mark(w_obj)
+        sb.append('{')
+        separator, level = self.emit_indent(level)
+        first = True
+        for w_key, w_value in self.dict_items(w_obj):
+            if space.isinstance_w(w_key, space.w_basestring):
+                key = None
+            # JavaScript is weakly typed for these, so it makes sense to
+            # also allow them, like the app-level encoder does
+            elif space.isinstance_w(w_key, space.w_float):
+                key = self.floatstr(space.float_w(w_key))
+            elif space.is_w(w_key, space.w_True):
+                key = 'true'
+            elif space.is_w(w_key, space.w_False):
+                key = 'false'
+            elif space.is_w(w_key, space.w_None):
+                key = 'null'
+            elif (space.isinstance_w(w_key, space.w_int) or
+                  space.isinstance_w(w_key, space.w_long)):
+                key = self.intstr(w_key)
+            elif self.skipkeys:
+                continue
+            else:
+                raise oefmt(space.w_TypeError, "key %R is not a string",
+                            w_key)
+            if first:
+                first = False
+            else:
+                sb.append(separator)
+            sb.append('"')
+            if key is None:
+                encode_basestring_ascii_into(space, sb, w_key)
+            else:
+                sb.append(key)
+            sb.append('"')
+            sb.append(self.key_separator)
+            self.encode_any(w_value, level)
+        self.emit_unindent(level)
+        sb.append('}')
+        self.unmark(w_obj)
+
+
+@jit.dont_look_inside
+@unwrap_spec(skipkeys=bool, allow_nan=bool, sort_keys=bool,
+             check_circular=bool, indent=int, item_separator='text',
+             key_separator='text')
+def encode(space, w_obj, w_default, skipkeys, allow_nan, sort_keys,
+           check_circular, indent, item_separator, key_separator):
+    """Return the JSON representation of 'obj' as an ascii str, calling
+    'default' on the objects that are not natively supported.  An
+    'indent' of -1 means no pretty-printing."""
+    encoder = JSONEncoder(space, w_default, skipkeys, allow_nan, sort_keys,
+                          check_circular, indent, item_separator,
+                          key_separator)
+    encoder.encode_any(w_obj, 0)
+    return space.newbytes(encoder.builder.build())
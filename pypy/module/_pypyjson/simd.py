@@ -54,13 +54,14 @@ def print_chars(word):
     return out
 
 def index_nonzero(word):
-    # XXX can be done very cheap in theory
+    # 'word' must have only the highest bit of some bytes set, like the
+    # result of any_char_zero().  Returns the index of the first such byte:
+    # isolate the lowest bit, then count the bytes below it with a
+    # multiplication instead of a loop
     assert word
-    for i in unrolling_wordsize:
-        if word & 0xff:
-            return i
-        word >>= 8
-    assert 0
+    lowest = word & (~word + r_uint(1))
+    below = ((lowest - r_uint(1)) >> 7) & r_uint(EVERY_BYTE_ONE)
+    return intmask((below * r_uint(EVERY_BYTE_ONE)) >> (8 * (WORD_SIZE - 1)))
 
 def index_zero(word):
     # XXX can be done very cheap in theory
@@ -220,9 +221,45 @@ def find_end_of_string_slow_no_hash(ll_chars, i, length):
         bits |= ord(ch)
     return bool(bits & 0x80), i
 
+def exact_char_zero(word):
+    # unlike any_char_zero(), this has no false positives in the bytes
+    # after the first zero byte: the highest bit of every zero byte is set,
+    # and nothing else
+    low7 = r_uint(EVERY_BYTE_ONE) * 0x7f
+    return ~(((word & low7) + low7) | word) & r_uint(EVERY_BYTE_HIGHEST_BIT)
+
+@objectmodel.always_inline
+def position_not_whitespace(word):
+    ws = (exact_char_zero(word ^ char_repeated_word_width(' ')) |
+          exact_char_zero(word ^ char_repeated_word_width('\n')) |
+          exact_char_zero(word ^ char_repeated_word_width('\t')) |
+          exact_char_zero(word ^ char_repeated_word_width('\r')))
+    return ~ws & r_uint(EVERY_BYTE_HIGHEST_BIT)
+
+def _is_whitespace(ch):
+    return ch == ' ' or ch == '\t' or ch == '\r' or ch == '\n'
+
+def skip_whitespace_simd_unaligned(ll_chars, i, length):
+    while i + WORD_SIZE <= length:
+        word = rffi.cast(rffi.UNSIGNEDP, rffi.ptradd(ll_chars, i))[0]
+        cond = position_not_whitespace(word)
+        if cond:
+            return i + index_nonzero(cond)
+        i += WORD_SIZE
+    return skip_whitespace_slow(ll_chars, i, length)
+
+def skip_whitespace_slow(ll_chars, i, length):
+    # relies on ll_chars[length] == '\x00'
+    while _is_whitespace(ll_chars[i]):
+        i += 1
+    return i
+
+
 if USE_SIMD:
     find_end_of_string = find_end_of_string_simd_unaligned
     find_end_of_string_no_hash = find_end_of_string_simd_unaligned_no_hash
+    skip_whitespace = skip_whitespace_simd_unaligned
 else:
     find_end_of_string = find_end_of_string_slow
     find_end_of_string_no_hash = find_end_of_string_slow_no_hash
+    skip_whitespace = skip_whitespace_slow
@@ -6,7 +6,9 @@ sys.path.insert(0, str(ROOT))
 import time
 from pypy.interpreter.error import OperationError
 from pypy.module._pypyjson.interp_decoder import loads, JSONDecoder
+from pypy.module._pypyjson import simd
 from rpython.rlib.objectmodel import specialize, dont_inline
+from rpython.rtyper.lltypesystem import rffi
 
 def _create_dict(self, d):
     w_res = W_Dict()
@@ -127,6 +129,30 @@ def bench(title, N, fn, arg):
     b = time.clock()
     print title, (b-a) / N * 1000
 
+@specialize.arg(0)
+def scan_strings(find_end_of_string, msg):
+    # find the end of every string in msg, without decoding anything
+    ll_chars, llobj, flag = rffi.get_nonmovingbuffer_ll_final_null(msg)
+    try:
+        count = 0
+        i = msg.find('"')
+        while i >= 0:
+            strhash, nonascii, end = find_end_of_string(
+                ll_chars, i + 1, len(msg))
+            count += 1
+            if end >= len(msg):
+                break
+            i = msg.find('"', end + 1)
+        return count
+    finally:
+        rffi.free_nonmovingbuffer_ll(ll_chars, llobj, flag)
+
+def scan_strings_simd(msg):
+    return scan_strings(simd.find_end_of_string_simd_unaligned, msg)
+
+def scan_strings_slow(msg):
+    return scan_strings(simd.find_end_of_string_slow, msg)
+
 def entry_point(argv):
     if len(argv) != 3:
         print 'Usage: %s FILE n' % argv[0]
@@ -138,6 +164,8 @@ def entry_point(argv):
 
     try:
         bench('loads     ', N, myloads,  msg)
+        bench('scan simd ', N, scan_strings_simd, msg)
+        bench('scan slow ', N, scan_strings_slow, msg)
     except OperationError as e:
         print 'Error', e._compute_value(fakespace)
 
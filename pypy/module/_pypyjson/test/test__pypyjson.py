@@ -1,6 +1,8 @@
 # -*- encoding: utf-8 -*-
 import pytest
 from pypy.module._pypyjson.interp_decoder import JSONDecoder, Terminator, MapBase
+from pypy.module._pypyjson.interp_decoder import scan_value_end, ValueScanner
+from pypy.module._pypyjson.interp_decoder import W_StreamDecoder
 from rpython.rtyper.lltypesystem import lltype, rffi
 
 
@@ -272,6 +274,100 @@ class TestJson(object):
         assert m2.instantiation_count == 2
         dec.close()
 
+    def test_number_of_maps(self):
+        base, m1, m2, m3, m4 = self._make_some_maps()
+        assert base.number_of_maps == 4
+        m2.mark_blocked(base)
+        assert base.number_of_maps == 2
+
+    def test_last_used(self):
+        base = Terminator(self.space)
+        dec = JSONDecoder(self.space, '"a" "b"')
+        m1 = dec.decode_key_map(dec.skip_whitespace(0), base)
+        m2 = dec.decode_key_map(dec.skip_whitespace(3), base)
+        m1 = dec.decode_key_map(dec.skip_whitespace(0), base)
+        assert m1.last_used == 2
+        assert m2.last_used == 1
+        dec.close()
+
+    def test_evict_cold_branches(self):
+        space = self.space
+        base = Terminator(space)
+        keys_w = [space.newutf8(c, 1) for c in "abcdefgh"]
+        branches = []
+        for i, w_key in enumerate(keys_w):
+            m = base.get_next(w_key, 'x"', 0, 2, base)
+            m.get_next(space.newutf8("z", 1), 'x"', 0, 2, base)
+            m.last_used = (i * 5) % 8
+            branches.append(m)
+        assert base.number_of_maps == 16
+        assert base.number_of_leaves == 8
+        base.max_maps = 20
+        base.evict_cold_branches()
+        assert base.number_of_maps == 16
+        base.max_maps = 10
+        base.evict_cold_branches()
+        # down to 3/4 of the limit: the 5 least recently used are evicted
+        assert base.number_of_maps == 6
+        assert base.number_of_leaves == 3
+        kept = [m for m in branches if m.last_used >= 5]
+        assert len(base.nextmap_all) == 3
+        for m in kept:
+            assert base.nextmap_all[m.w_key] is m
+        assert base.nextmap_first.last_used == 7
+        for fringe in base.current_fringe:
+            assert fringe in kept
+        base._check_invariants()
+        # evicted maps are left intact for the dicts that use them
+        assert branches[1].state == MapBase.FRINGE
+        assert branches[1].nextmap_first is not None
+
+    def test_evict_all_branches(self):
+        base, m1, m2, m3, m4 = self._make_some_maps()
+        base.max_maps = 1
+        base.evict_cold_branches()
+        assert base.number_of_maps == 0
+        assert base.number_of_leaves == 1
+        assert base.nextmap_first is None
+        assert base.nextmap_all is None
+        assert base.current_fringe == {}
+
+    def test_scan_value_end(self):
+        assert scan_value_end('123 ', 0) == 3
+        assert scan_value_end('123', 0) == -1
+        assert scan_value_end('true,', 0) == 4
+        assert scan_value_end('"a\\"b" x', 0) == 6
+        assert scan_value_end('"a\\"', 0) == -1
+        assert scan_value_end('"a\\', 0) == -1
+        assert scan_value_end('[1, "]", {"a": [2]}] 3', 0) == 20
+        assert scan_value_end('[1, "]", {"a": [2]}', 0) == -1
+        assert scan_value_end('x {}', 2) == 4
+
+    def test_value_scanner_resumes(self):
+        data = ' [1, "a]\\"", {"b": [2]}, 345] 6'
+        end = scan_value_end(data, 1)
+        assert end == data.index(' 6')
+        for split in range(2, end):
+            scanner = ValueScanner()
+            assert scanner.scan(data[:split], 1) == -1
+            assert scanner.offset >= split - 1
+            # the value moves to position 0 when the buffer is refilled
+            assert scanner.scan(data[1:], 0) == end - 1
+            assert scanner.offset == 0 and scanner.depth == 0
+        scanner = ValueScanner()
+        assert scanner.scan('12', 0) == -1
+        assert scanner.scan('123 ', 0) == 3
+
+    def test_stream_decoder_caches_bounded(self):
+        space = self.space
+        decoder = W_StreamDecoder(space)
+        limit = W_StreamDecoder.MAX_CACHE_ENTRIES
+        for i in range(limit * 2 + 10):
+            s = '{"key%d": "value%d"} ' % (i, i)
+            decoder.descr_raw_decode(space, s, 0)
+            assert len(decoder.cache_keys) <= limit
+            assert len(decoder.cache_values) <= limit
+
 
 class AppTest(object):
     spaceconfig = {"objspace.usemodules._pypyjson": True}
@@ -437,6 +533,19 @@ class AppTest(object):
         assert _pypyjson.loads('{"neighborhood": ""}') == {
             "neighborhood": ""}
 
+    def test_set_max_maps(self):
+        import _pypyjson
+        old_max_maps = _pypyjson.set_max_maps(4)
+        try:
+            objs = []
+            for i in range(20):
+                s = '[{"x%d": 1, "y": 2}, {"x%d": 3, "y": 4}]' % (i, i)
+                objs.append(_pypyjson.loads(s))
+            for i, res in enumerate(objs):
+                assert res == [{"x%d" % i: 1, "y": 2}, {"x%d" % i: 3, "y": 4}]
+        finally:
+            assert _pypyjson.set_max_maps(old_max_maps) == 4
+
     def test_decode_object_nonstring_key(self):
         import _pypyjson
         raises(ValueError, "_pypyjson.loads('{42: 43}')")
@@ -513,6 +622,72 @@ class AppTest(object):
         assert check("\\\"\b\f\n\r\t") == '\\\\\\"\\b\\f\\n\\r\\t'
         assert check("\x07") == "\\u0007"
 
+    def test_encode(self):
+        import _pypyjson
+        def default(o):
+            raise TypeError(repr(o) + " is not JSON serializable")
+        def enc(o, default=default, skipkeys=False, allow_nan=True,
+                sort_keys=False, check_circular=True, indent=-1,
+                separators=(', ', ': ')):
+            res = _pypyjson.encode(o, default, skipkeys, allow_nan,
+                                   sort_keys, check_circular, indent,
+                                   separators[0], separators[1])
+            assert type(res) is str
+            return res
+        assert enc(None) == 'null'
+        assert enc(True) == 'true'
+        assert enc(False) == 'false'
+        assert enc(-12) == '-12'
+        assert enc(2**100) == str(2**100)
+        assert enc(1.5) == '1.5'
+        assert enc(1e100) == '1e+100'
+        assert enc(float('nan')) == 'NaN'
+        assert enc(float('-inf')) == '-Infinity'
+        raises(ValueError, enc, float('inf'), allow_nan=False)
+        assert enc("a\n\"b") == '"a\\n\\"b"'
+        assert enc(u"\u1234") == '"\\u1234"'
+        assert enc([1, (2, 3.5), [], ()]) == '[1, [2, 3.5], [], []]'
+        assert enc({}) == '{}'
+        assert enc({"a": [None]}) == '{"a": [null]}'
+        d = {"b": 1, u"a": 2, 3: 3, 1.5: 4, None: 5, True: 6}
+        assert enc(d, sort_keys=True) == (
+            '{"null": 5, "true": 6, "1.5": 4, "3": 3, "a": 2, "b": 1}')
+        raises(TypeError, enc, {(1, 2): 3})
+        assert enc({(1, 2): 3, "x": 4}, skipkeys=True) == '{"x": 4}'
+        assert enc([1, {"a": 2}], indent=2, separators=(',', ':')) == (
+            '[\n  1,\n  {\n    "a":2\n  }\n]')
+        assert enc([1, 2], indent=0) == '[\n1, \n2\n]'
+        #
+        class Point(object):
+            def __init__(self, x, y):
+                self.x = x
+                self.y = y
+        def default_point(o):
+            return [o.x, o.y]
+        assert enc([Point(1, 2)], default=default_point) == '[[1, 2]]'
+        raises(TypeError, enc, Point(1, 2))
+        #
+        class MyInt(int):
+            def __str__(self):
+                return "forty-two"
+        class MyDict(dict):
+            def items(self):
+                return [("x", 1)]
+            def iteritems(self):
+                return iter([("y", 2)])
+        assert enc(MyInt(42)) == 'forty-two'
+        # like json.encoder: iteritems(), or items() when sorting
+        assert enc(MyDict(a=2)) == '{"y": 2}'
+        assert enc(MyDict(a=2), sort_keys=True) == '{"x": 1}'
+        #
+        l = []
+        l.append(l)
+        raises(ValueError, enc, l)
+        d = {}
+        d["d"] = d
+        raises(ValueError, enc, d)
+        raises(ValueError, enc, Point(1, 2), default=lambda o: o)
+
     def test_error_position(self):
         import _pypyjson
         test_cases = [
@@ -541,3 +716,62 @@ class AppTest(object):
         a = '{"abc": "4", "k": 1, "k": 1.5, "c": null, "k": 2}'
         d = _pypyjson.loads(a)
         assert d == {u"abc": u"4", u"c": None, u"k": 2}
+
+
+class AppTestJsonModule(object):
+    spaceconfig = dict(usemodules=['_pypyjson', 'struct'])
+
+    def test_encode_through_json(self):
+        import json
+        obj = {"a": [1, 2.5, None, True, u"\xe9"], "b": {"c": "d"}}
+        assert json.dumps(obj, sort_keys=True) == (
+            '{"a": [1, 2.5, null, true, "\\u00e9"], "b": {"c": "d"}}')
+        assert json.dumps(obj, sort_keys=True, indent=1) == (
+            '{\n "a": [\n  1, \n  2.5, \n  null, \n  true, \n  "\\u00e9"\n ], '
+            '\n "b": {\n  "c": "d"\n }\n}')
+        assert json.dumps(obj, sort_keys=True, ensure_ascii=False) == (
+            u'{"a": [1, 2.5, null, true, "\xe9"], "b": {"c": "d"}}')
+        class Encoder(json.JSONEncoder):
+            def default(self, o):
+                if isinstance(o, set):
+                    return sorted(o)
+                return json.JSONEncoder.default(self, o)
+        assert json.dumps({3, 1}, cls=Encoder) == '[1, 3]'
+        raises(TypeError, json.dumps, {3, 1})
+
+    def test_iterload(self):
+        import _pypyjson, StringIO
+        data = '{"a": 1, "b": [true, null]}\n"x"\n 2.5 [] {"a": 2, "b": 3}\n'
+        expected = [{"a": 1, "b": [True, None]}, u"x", 2.5, [],
+                    {"a": 2, "b": 3}]
+        for chunk_size in [1, 2, 3, 7, 1000]:
+            res = list(_pypyjson.iterload(StringIO.StringIO(data),
+                                          chunk_size=chunk_size))
+            assert res == expected
+            res = list(_pypyjson.iterload(data, chunk_size=chunk_size))
+            assert res == expected
+        assert list(_pypyjson.iterload('12')) == [12]
+        assert list(_pypyjson.iterload('  ')) == []
+        raises(ValueError, list, _pypyjson.iterload('{"a": 1'))
+        raises(ValueError, list, _pypyjson.iterload('1 x'))
+
+    def test_iterload_array(self):
+        import _pypyjson, StringIO
+        data = ' [ {"a": 1}, "b" , [2, 3], 4 ] '
+        for chunk_size in [1, 4, 1000]:
+            res = list(_pypyjson.iterload(StringIO.StringIO(data), True,
+                                          chunk_size))
+            assert res == [{"a": 1}, u"b", [2, 3], 4]
+        assert list(_pypyjson.iterload(' [ ] ', array=True)) == []
+        for data in ['{}', '[1 2]', '[1, 2', '[1] 2', '']:
+            raises(ValueError, list, _pypyjson.iterload(data, array=True))
+
+    def test_stream_decoder(self):
+        import _pypyjson
+        decoder = _pypyjson.StreamDecoder()
+        assert decoder.raw_decode(' {"a": "x"} {"a"', 0) == ({"a": u"x"}, 11)
+        assert decoder.raw_decode(' {"a": "x"} {"a"', 11) is None
+        raises(ValueError, decoder.raw_decode, ' {"a": "x"} {"a"', 11, True)
+        assert decoder.raw_decode(' 12', 0) is None
+        assert decoder.raw_decode(' 12', 0, True) == (12, 3)
+        assert decoder.raw_decode('', 0, True) is None
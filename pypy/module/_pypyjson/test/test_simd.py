@@ -9,6 +9,9 @@ from pypy.module._pypyjson.simd import find_end_of_string_slow_no_hash
 from pypy.module._pypyjson.simd import print_chars
 from pypy.module._pypyjson.simd import find_end_of_string_simd_unaligned, WORD_SIZE
 from pypy.module._pypyjson.simd import find_end_of_string_simd_unaligned_no_hash
+from pypy.module._pypyjson.simd import index_nonzero, EVERY_BYTE_HIGHEST_BIT
+from pypy.module._pypyjson.simd import skip_whitespace_slow
+from pypy.module._pypyjson.simd import skip_whitespace_simd_unaligned
 
 try:
     from hypothesis import example, given, strategies
@@ -108,3 +111,29 @@ def test_find_end_of_string_position_invariance_no_hash(a, prefix):
     assert nonascii1 == nonascii2
     assert i1 + len(prefix) == i2
 
+@given(strategies.integers(min_value=1, max_value=(1 << WORD_SIZE) - 1))
+def test_index_nonzero(bytemask):
+    word = r_uint(0)
+    for i in range(WORD_SIZE):
+        if bytemask & (1 << i):
+            word |= r_uint(0x80) << (8 * i)
+    expected = 0
+    while not bytemask & (1 << expected):
+        expected += 1
+    assert index_nonzero(word & r_uint(EVERY_BYTE_HIGHEST_BIT)) == expected
+
+@example((' ' * 20 + 'x', 0))
+@example(('\n\t\r ' * 5, 3))
+@example(('  \x00 ', 0))
+@given(strategies.tuples(
+    strategies.text(alphabet=u' \t\r\n\x00\x0b\x20\x80x"').map(
+        lambda u: u.encode('latin-1')),
+    strategies.integers(min_value=0, max_value=10)))
+def test_skip_whitespace(a):
+    (string, startindex) = a
+    startindex = min(startindex, len(string))
+    i1 = ll(skip_whitespace_slow, string, startindex, len(string))
+    i2 = ll(skip_whitespace_simd_unaligned, string, startindex, len(string))
+    assert i1 == i2
+    assert i1 == len(string) or string[i1] not in ' \t\r\n'
+    assert string[startindex:i1].strip(' \t\r\n') == ''
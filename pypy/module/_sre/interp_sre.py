@@ -13,7 +13,7 @@ from rpython.rlib.rstring import StringBuilder
 #
 # Constants and exposed functions
 
-from rpython.rlib.rsre import rsre_core, rsre_utf8
+from rpython.rlib.rsre import rsre_core, rsre_dfa, rsre_utf8
 from rpython.rlib.rsre.rsre_char import CODESIZE, MAXREPEAT, getlower, set_unicode_db
 
 
@@ -91,13 +91,13 @@ def import_re(space):
 
 def matchcontext(space, ctx, pattern):
     try:
-        return rsre_core.match_context(ctx, pattern)
+        return rsre_dfa.match_context(ctx, pattern)
     except rsre_core.Error as e:
         raise OperationError(space.w_RuntimeError, space.newtext(e.msg))
 
 def searchcontext(space, ctx, pattern):
     try:
-        return rsre_core.search_context(ctx, pattern)
+        return rsre_dfa.search_context(ctx, pattern)
     except rsre_core.Error as e:
         raise OperationError(space.w_RuntimeError, space.newtext(e.msg))
 
@@ -520,6 +520,78 @@ W_SRE_Pattern.typedef = TypeDef(
 )
 W_SRE_Pattern.typedef.acceptable_as_base_class = False
 
+# ____________________________________________________________
+#
+# SRE_PatternSet class
+
+class W_SRE_PatternSet(W_Root):
+    """A list of SRE_Pattern objects that are matched together, in a
+    single pass over the string when possible."""
+    _immutable_fields_ = ["srepats[*]", "patternset"]
+
+    def __init__(self, space, srepats):
+        self.space = space
+        self.srepats = srepats
+        self.patternset = rsre_dfa.PatternSet(
+            [srepat.code for srepat in srepats])
+
+    def make_ctx(self, w_string, pos, endpos):
+        if not self.srepats:
+            return None
+        return self.srepats[0].make_ctx(w_string, pos, endpos)
+
+    def wrap_indexes(self, indexes):
+        return self.space.newlist([self.space.newint(i) for i in indexes])
+
+    @unwrap_spec(pos=int, endpos=int)
+    def match_w(self, w_string, pos=0, endpos=sys.maxint):
+        """Return the sorted list of the indexes of the patterns that
+        match at the start of the string."""
+        ctx = self.make_ctx(w_string, pos, endpos)
+        if ctx is None:
+            return self.wrap_indexes([])
+        try:
+            indexes = rsre_dfa.set_match_context(ctx, self.patternset)
+        except rsre_core.Error as e:
+            raise OperationError(self.space.w_RuntimeError,
+                                 self.space.newtext(e.msg))
+        return self.wrap_indexes(indexes)
+
+    @unwrap_spec(pos=int, endpos=int)
+    def search_w(self, w_string, pos=0, endpos=sys.maxint):
+        """Return the sorted list of the indexes of the patterns that
+        match somewhere in the string."""
+        ctx = self.make_ctx(w_string, pos, endpos)
+        if ctx is None:
+            return self.wrap_indexes([])
+        try:
+            indexes = rsre_dfa.set_search_context(ctx, self.patternset)
+        except rsre_core.Error as e:
+            raise OperationError(self.space.w_RuntimeError,
+                                 self.space.newtext(e.msg))
+        return self.wrap_indexes(indexes)
+
+    def patterns_w(self, space):
+        return space.newlist([srepat for srepat in self.srepats])
+
+
+def SRE_PatternSet__new__(space, w_subtype, w_patterns):
+    srepats = [space.interp_w(W_SRE_Pattern, w_pattern)
+               for w_pattern in space.listview(w_patterns)]
+    w_srepatset = space.allocate_instance(W_SRE_PatternSet, w_subtype)
+    W_SRE_PatternSet.__init__(w_srepatset, space, srepats)
+    return w_srepatset
+
+
+W_SRE_PatternSet.typedef = TypeDef(
+    'SRE_PatternSet',
+    __new__      = interp2app(SRE_PatternSet__new__),
+    match        = interp2app(W_SRE_PatternSet.match_w),
+    search       = interp2app(W_SRE_PatternSet.search_w),
+    patterns     = GetSetProperty(W_SRE_PatternSet.patterns_w),
+)
+W_SRE_PatternSet.typedef.acceptable_as_base_class = False
+
 # ____________________________________________________________
 #
 # SRE_Match class
@@ -156,6 +156,35 @@ class AppTestSrePattern:
         res = re.match(r'(a)|(b)', 'b').start(1)
         assert res == -1
 
+    def test_catastrophic_backtracking(self):
+        import re
+        r = re.compile(r'(x+x+)+y')
+        s = 'x' * 40
+        assert r.match(s) is None
+        assert r.search(s) is None
+        assert r.findall(s) == []
+        m = r.search('..' + s + 'y')
+        assert m.span() == (2, 43)
+        assert m.group(1) == s
+        assert [m.span() for m in r.finditer('xxy.xxxy')] == [(0, 3), (4, 8)]
+
+    def test_compile_set(self):
+        import re, _sre
+        patterns = [re.compile(r) for r in
+                    [r'ab+c', r'^x', r'(a)\1', r'(x+x+)+y', r'(?i)Z$']]
+        s = _sre.compile_set(patterns)
+        assert s.patterns == patterns
+        assert s.search('xxabbc') == [0, 1]
+        assert s.search('xxabbc', 1) == [0]
+        assert s.search('aaxxyz') == [2, 3, 4]
+        assert s.search(u'aaxxyz') == [2, 3, 4]
+        assert s.search('x' * 40) == [1]
+        assert s.match('abc') == [0]
+        assert s.match('aab') == [2]
+        assert s.match('xxabc', 2, 4) == []
+        assert _sre.compile_set([]).search('abc') == []
+        raises(TypeError, _sre.compile_set, ['abc'])
+
 
 class AppTestSreMatch:
     spaceconfig = dict(usemodules=('array', ))
@@ -508,6 +537,19 @@ class AppTestSimpleSearches:
         assert re.search("bla", "blab")
         assert not re.search("bla", "blu")
 
+    def test_search_required_literal(self):
+        import re, array
+        r = re.compile(r"\d+ ERROR: (.*)")
+        for s in ["12 INFO: x\n345 ERROR: disk full",
+                  u"12 INFO: \xe9\n345 ERROR: disk full",
+                  array.array('c', "12 INFO: x\n345 ERROR: disk full")]:
+            m = r.search(s)
+            assert m.group(0) == "345 ERROR: disk full"
+            assert m.group(1) == "disk full"
+        assert r.search("12 INFO: x") is None
+        assert r.search(u"x ERROR: y") is None
+        assert r.findall("1 ERROR: a\nb ERROR: c\n2 ERROR: d") == ["a", "d"]
+
     def test_search_simple_ats(self):
         import re
         assert re.search("^bla", "bla")
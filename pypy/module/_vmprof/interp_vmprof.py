@@ -5,6 +5,7 @@ from pypy.interpreter.pycode import PyCode
 from pypy.interpreter.baseobjspace import W_Root
 from rpython.rlib import rvmprof, jit
 from pypy.interpreter.error import oefmt
+from pypy.module.gc.hook import LowLevelGcHooks
 
 # ____________________________________________________________
 
@@ -51,24 +52,38 @@ def VMProfError(space, e):
     return OperationError(w_VMProfError, space.newtext(e.msg))
 
 
-@unwrap_spec(fileno=int, period=float, memory=int, lines=int, native=int, real_time=int)
-def enable(space, fileno, period, memory, lines, native, real_time):
+@unwrap_spec(fileno=int, period=float, memory=int, lines=int, native=int,
+             real_time=int, alloc_sample=int)
+def enable(space, fileno, period, memory, lines, native, real_time,
+           alloc_sample=0):
     """Enable vmprof.  Writes go to the given 'fileno', a file descriptor
     opened for writing.  *The file descriptor must remain open at least
     until disable() is called.*
 
     'interval' is a float representing the sampling interval, in seconds.
     Must be smaller than 1.0
+
+    If 'alloc_sample' is a positive number of bytes, the profile contains
+    allocation samples instead of timer samples: the stack is recorded
+    roughly every 'alloc_sample' bytes allocated in the nursery.  Each
+    sample is followed by a record with its number and size, and the next
+    minor collection writes a record saying if the object survived.  Only
+    works with the incminimark GC.
     """
     try:
-        rvmprof.enable(fileno, period, memory, native, real_time)
+        rvmprof.enable(fileno, period, memory, native, real_time,
+                       alloc_sample > 0)
     except rvmprof.VMProfError as e:
         raise VMProfError(space, e)
+    if alloc_sample > 0:
+        rvmprof.stop_sampling()
+        space.fromcache(LowLevelGcHooks).alloc_sample_interval = alloc_sample
 
 def disable(space):
     """Disable vmprof.  Remember to close the file descriptor afterwards
     if necessary.
     """
+    space.fromcache(LowLevelGcHooks).alloc_sample_interval = 0
     try:
         rvmprof.disable()
     except rvmprof.VMProfError as e:
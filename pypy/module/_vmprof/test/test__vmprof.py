@@ -107,6 +107,25 @@ class AppTestVMProf(object):
         _vmprof.disable()
         assert _vmprof.is_enabled() is False
 
+    def test_alloc_sample(self):
+        import _vmprof, sys
+        tmpfile = open(self.tmpfilename, 'wb')
+        if sys.platform == 'win32':
+            raises(_vmprof.VMProfError, _vmprof.enable, tmpfile.fileno(),
+                   0.01, 0, 0, 0, 0, 4096)
+            assert _vmprof.is_enabled() is False
+            return
+        _vmprof.enable(tmpfile.fileno(), 0.01, 0, 0, 0, 0, 4096)
+        assert _vmprof.is_enabled() is True
+        l = [[i] for i in range(10000)]
+        _vmprof.disable()
+        assert _vmprof.is_enabled() is False
+        s = open(self.tmpfilename, 'rb').read()
+        assert 'pypy' in s
+        # and vmprof can be enabled again afterwards
+        _vmprof.enable(tmpfile.fileno(), 0.01, 0, 0, 0, 0)
+        _vmprof.disable()
+
     @py.test.mark.xfail(sys.platform.startswith('freebsd'), reason = "not implemented")
     def test_get_profile_path(self):
         import _vmprof
@@ -1,6 +1,6 @@
 from rpython.memory.gc.hook import GcHooks
 from rpython.memory.gc import incminimark
-from rpython.rlib import rgc
+from rpython.rlib import rgc, rvmprof
 from rpython.rlib.nonconst import NonConstant
 from rpython.rlib.rarithmetic import r_uint, r_longlong, longlongmax
 from pypy.interpreter.gateway import interp2app, unwrap_spec, WrappedDefault
@@ -24,6 +24,8 @@ class LowLevelGcHooks(GcHooks):
     def __init__(self, space):
         self.space = space
         self.w_hooks = space.fromcache(W_AppLevelHooks)
+        # set by _vmprof.enable(); 0 means no allocation sampling
+        self.alloc_sample_interval = 0
 
     def is_gc_minor_enabled(self):
         return self.w_hooks.gc_minor_enabled
@@ -34,6 +36,12 @@ class LowLevelGcHooks(GcHooks):
     def is_gc_collect_enabled(self):
         return self.w_hooks.gc_collect_enabled
 
+    def is_gc_alloc_sample_enabled(self):
+        return self.alloc_sample_interval > 0
+
+    def get_gc_alloc_sample_interval(self):
+        return self.alloc_sample_interval
+
     def on_gc_minor(self, duration, total_memory_used, pinned_objects):
         action = self.w_hooks.gc_minor
         action.count += 1
@@ -69,6 +77,12 @@ class LowLevelGcHooks(GcHooks):
         action.pinned_objects = pinned_objects
         action.fire()
 
+    def on_gc_alloc_sample(self, sample_id, size):
+        rvmprof.sample_allocation(sample_id, size)
+
+    def on_gc_alloc_sample_promoted(self, sample_id, survived):
+        rvmprof.alloc_sample_promoted(sample_id, survived)
+
 
 class W_AppLevelHooks(W_Root):
 
@@ -0,0 +1,269 @@
+"""
+Code archives: a single prebuilt file holding the compiled code objects of
+whole directories of modules (typically the standard library and
+site-packages), built by lib_pypy/pypy_tools/build_code_archive.py.
+
+The importer consults the archive before looking at the file system.  For
+a directory covered by the archive, finding a module is one dictionary
+lookup instead of a handful of stat() calls, and a miss is known to be a
+miss as long as the directory has not changed.  The archive is mmapped and a code object is only unmarshalled when
+its module is imported.  An archive can also list modules to import at
+startup: 'pypy --write-code-archive' writes such an archive with the modules
+that the initialized interpreter has imported.
+
+File format (all integers are 4 bytes, little-endian):
+
+    header:   'PYPYCAR1', pyc magic, number of dirs, number of entries,
+              number of modules to preload
+    dirs:     path length, path, mtime of the directory
+    preload:  name length, module name
+    entries:  key length, key, kind, source mtime, source size,
+              source crc32, data offset, data length
+    data:     the marshalled code objects
+
+The key of an entry is the directory joined with the module name, without
+extension: the 'filepart' that importing.find_module() computes.
+"""
+
+import os, stat
+
+from rpython.rlib import rmmap
+from rpython.rlib.rarithmetic import r_uint
+from rpython.rlib.rzipfile import crc32
+
+ARCHIVE_MAGIC = 'PYPYCAR1'
+
+# kinds of entries
+MODULE = 0      # a .py file, whose code object is in the archive
+PACKAGE = 1     # a directory with an __init__.py
+EXTERNAL = 2    # something else that must be found the usual way
+                # (extension module, lone .pyc, directory without
+                # __init__.py, source with a syntax error...)
+NOT_FOUND = 3   # only used for the result of CodeArchive.find()
+
+# validation modes
+VALIDATE_NONE = 0   # trust the archive completely
+VALIDATE_MTIME = 1  # check the mtime and size of the sources
+VALIDATE_HASH = 2   # check the crc32 of the sources
+
+MASK_32 = r_uint(0xffffffff)
+
+
+class ArchiveError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+class ArchiveEntry(object):
+    _immutable_ = True
+
+    def __init__(self, archive, kind, key, mtime, size, crc, offset, length):
+        self.archive = archive
+        self.kind = kind
+        self.key = key
+        self.mtime = mtime
+        self.size = size
+        self.crc = crc
+        self.offset = offset
+        self.length = length
+
+    def source_filename(self):
+        return self.key + ".py"
+
+    def read_code(self):
+        """Return the marshalled code object, copied out of the mapping."""
+        return self.archive.read_data(self.offset, self.length)
+
+NOT_FOUND_ENTRY = ArchiveEntry(None, NOT_FOUND, '', r_uint(0), r_uint(0),
+                               r_uint(0), 0, 0)
+
+
+class CodeArchive(object):
+    def __init__(self, filename, mmap, pyc_magic, validate):
+        self.filename = filename
+        self.mmap = mmap
+        self.pyc_magic = pyc_magic
+        self.validate = validate
+        self.dir_mtimes = {}    # covered directory -> mtime at build time
+        self.entries = {}       # key -> ArchiveEntry
+        self.preload = []       # names of the modules to import at startup
+
+    def close(self):
+        self.mmap.close()
+        self.entries.clear()
+        self.dir_mtimes.clear()
+
+    def read_data(self, offset, length):
+        try:
+            return self.mmap.getslice(offset, length)
+        except rmmap.RValueError as e:
+            raise ArchiveError(e.message)
+
+    def covers(self, path):
+        """Is the archive's list of entries for the directory 'path' known
+        to be complete?  With validation, the directory's mtime is checked
+        at every lookup, like the directory listings of importing.py, so
+        that a module created later in the directory is found.  (The
+        builder does not cover a directory modified within a second of
+        the build, whose mtime could miss a change.)"""
+        try:
+            dir_mtime = self.dir_mtimes[path]
+        except KeyError:
+            return False
+        if self.validate == VALIDATE_NONE:
+            return True
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        mtime = r_uint(int(st[stat.ST_MTIME])) & MASK_32
+        return mtime == dir_mtime
+
+    def find(self, path, filepart):
+        """Look up 'filepart' in the directory 'path'.  Returns None if the
+        archive cannot tell, NOT_FOUND_ENTRY if it knows that there is
+        nothing to import there, and an ArchiveEntry otherwise."""
+        if not self.covers(path):
+            return None
+        entry = self.entries.get(filepart, None)
+        if entry is None:
+            return NOT_FOUND_ENTRY
+        if entry.kind == MODULE and not self._source_unchanged(entry):
+            return None
+        if entry.kind == EXTERNAL:
+            return None
+        return entry
+
+    def _source_unchanged(self, entry):
+        filename = entry.source_filename()
+        if self.validate == VALIDATE_MTIME:
+            try:
+                st = os.stat(filename)
+            except OSError:
+                return False
+            mtime = r_uint(int(st[stat.ST_MTIME])) & MASK_32
+            size = r_uint(st[stat.ST_SIZE]) & MASK_32
+            return mtime == entry.mtime and size == entry.size
+        elif self.validate == VALIDATE_HASH:
+            try:
+                fd = os.open(filename, os.O_RDONLY, 0)
+            except OSError:
+                return False
+            try:
+                crc = r_uint(0)
+                while True:
+                    data = os.read(fd, 65536)
+                    if not data:
+                        break
+                    crc = crc32(data, crc)
+            except OSError:
+                os.close(fd)
+                return False
+            os.close(fd)
+            return (crc & MASK_32) == entry.crc
+        return True
+
+
+def _get_uint(s, pos):
+    return r_uint(ord(s[pos]) | (ord(s[pos + 1]) << 8) |
+                  (ord(s[pos + 2]) << 16)) | (r_uint(ord(s[pos + 3])) << 24)
+
+def _get_int(s, pos):
+    x = _get_uint(s, pos)
+    if x > r_uint(0x7fffffff):
+        raise ArchiveError("corrupted archive")
+    return int(x)
+
+def _get_long(s, pos):
+    # same as importing._get_long(), for the pyc magic
+    a = ord(s[pos])
+    b = ord(s[pos + 1])
+    c = ord(s[pos + 2])
+    d = ord(s[pos + 3])
+    if d >= 0x80:
+        d -= 0x100
+    return a | (b<<8) | (c<<16) | (d<<24)
+
+
+class _Reader(object):
+    def __init__(self, mmap):
+        self.mmap = mmap
+        self.pos = 0
+
+    def read(self, n):
+        if n < 0 or self.pos + n > self.mmap.size:
+            raise ArchiveError("truncated archive")
+        result = self.mmap.getslice(self.pos, n)
+        self.pos += n
+        return result
+
+    def read_uint(self):
+        return _get_uint(self.read(4), 0)
+
+    def read_int(self):
+        return _get_int(self.read(4), 0)
+
+    def read_string(self):
+        return self.read(self.read_int())
+
+
+def open_archive(filename, validate):
+    """Map the archive and read its index.  Raises OSError or
+    ArchiveError."""
+    fd = os.open(filename, os.O_RDONLY, 0)
+    try:
+        size = os.fstat(fd).st_size
+        if size < len(ARCHIVE_MAGIC) + 16:
+            raise ArchiveError("not a code archive")
+        try:
+            mmap = rmmap.mmap(fd, 0, access=rmmap.ACCESS_READ)
+        except rmmap.RMMapError as e:
+            raise ArchiveError(e.message)
+    finally:
+        os.close(fd)
+    try:
+        reader = _Reader(mmap)
+        if reader.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+            raise ArchiveError("not a code archive")
+        pyc_magic = _get_long(reader.read(4), 0)
+        archive = CodeArchive(filename, mmap, pyc_magic, validate)
+        ndirs = reader.read_int()
+        nentries = reader.read_int()
+        npreload = reader.read_int()
+        for i in range(ndirs):
+            path = reader.read_string()
+            archive.dir_mtimes[path] = reader.read_uint()
+        for i in range(npreload):
+            archive.preload.append(reader.read_string())
+        for i in range(nentries):
+            key = reader.read_string()
+            kind = reader.read_int()
+            if kind != MODULE and kind != PACKAGE and kind != EXTERNAL:
+                raise ArchiveError("corrupted archive")
+            mtime = reader.read_uint()
+            size = reader.read_uint()
+            crc = reader.read_uint()
+            offset = reader.read_int()
+            length = reader.read_int()
+            if offset + length > mmap.size:
+                raise ArchiveError("truncated archive")
+            archive.entries[key] = ArchiveEntry(archive, kind, key, mtime,
+                                                size, crc, offset, length)
+    except:
+        mmap.close()
+        raise
+    return archive
+
+
+class ArchiveState(object):
+    def __init__(self, space):
+        self.archive = None
+
+def get_code_archive(space):
+    return space.fromcache(ArchiveState).archive
+
+def set_code_archive(space, archive):
+    state = space.fromcache(ArchiveState)
+    if state.archive is not None:
+        state.archive.close()
+    state.archive = archive
@@ -12,10 +12,12 @@ from pypy.interpreter.baseobjspace import W_Root, CannotHaveLock
 from pypy.interpreter.eval import Code
 from pypy.interpreter.pycode import PyCode
 from pypy.interpreter.streamutil import wrap_streamerror
-from rpython.rlib import streamio, jit
+from rpython.rlib import streamio, jit, rtime
 from rpython.rlib.streamio import StreamErrors
 from rpython.rlib.objectmodel import we_are_translated, specialize
 from pypy.module.sys.version import PYPY_VERSION
+from pypy.module.imp import codearchive
+from pypy.module.marshal import interp_marshal
 
 _WIN32 = sys.platform == 'win32'
 
@@ -29,6 +31,7 @@ C_BUILTIN = 6
 PY_FROZEN = 7
 # PY_CODERESOURCE = 8
 IMP_HOOK = 9
+PY_ARCHIVED = 10    # pypy-specific: a module from the code archive
 
 SO = '.pyd' if _WIN32 else '.so'
 
@@ -137,6 +140,81 @@ else:
         except OSError:
             return False
 
+
+class DirectoryListing(object):
+    def __init__(self, mtime, names):
+        self.mtime = mtime
+        self.names = names      # dict {name: None}
+        # a listing read in the same second as the last change of the
+        # directory may miss a file created just after: don't reuse it
+        self.reusable = rtime.time() > mtime + 1.0
+
+class DirectoryCache(object):
+    """Caches the listing of the directories of sys.path, so that a
+    directory that cannot contain the module costs one stat() instead of
+    one per candidate file.  A listing is reused as long as the mtime of
+    the directory is unchanged; clearing sys.path_importer_cache flushes
+    all of them."""
+
+    def __init__(self, space):
+        self.listings = {}
+        self.importer_cache_len = 0
+        self.skipped = 0    # lookups answered from a listing
+        self.listed = 0     # directories listed
+
+    def _cleanup_(self):
+        # don't keep the listings made at translation time
+        self.listings.clear()
+
+    def check_flush(self, space):
+        w_path_importer_cache = space.sys.get("path_importer_cache")
+        length = space.len_w(w_path_importer_cache)
+        if length < self.importer_cache_len:
+            self.listings.clear()
+        self.importer_cache_len = length
+
+    def get_listing(self, space, path):
+        """Returns the names in the directory 'path' as a dict, or None
+        if the cache cannot be used for 'path'."""
+        if _WIN32 or not path.startswith('/'):
+            return None     # case-insensitive, or depends on the cwd
+        try:
+            st = os.stat(path)
+        except OSError:
+            return {}
+        if not stat.S_ISDIR(st.st_mode):
+            return None
+        listing = self.listings.get(path, None)
+        if (listing is not None and listing.reusable and
+                listing.mtime == st.st_mtime):
+            return listing.names
+        try:
+            names = os.listdir(path)
+        except OSError:
+            return None
+        d = {}
+        for name in names:
+            d[name] = None
+        listing = DirectoryListing(st.st_mtime, d)
+        self.listings[path] = listing
+        self.listed += 1
+        log_pyverbose(space, 2, "# listed %s: %d entries (%d directories "
+                      "listed, %d lookups skipped so far)\n" %
+                      (path, len(names), self.listed, self.skipped))
+        return listing.names
+
+def may_contain_module(space, names, partname):
+    """Can the directory listing 'names' contain what find_module() looks
+    for?  (See find_modtype())"""
+    if partname in names or (partname + ".py") in names:
+        return True
+    if space.config.objspace.lonepycfiles and (partname + ".pyc") in names:
+        return True
+    if has_so_extension(space) and (
+            partname + get_so_extension(space)) in names:
+        return True
+    return False
+
 def try_getattr(space, w_obj, w_name):
     try:
         return space.getattr(w_obj, w_name)
@@ -271,31 +349,40 @@ def importhook(space, name, w_globals=None,
         w_fromlist = None
 
     rel_modulename = None
+    rel_level = 0
     if (level != 0 and w_globals is not None and
             space.isinstance_w(w_globals, space.w_dict)):
         rel_modulename, rel_level = _get_relative_name(space, modulename, level,
                                                        w_globals)
-        if rel_modulename:
-            # if no level was set, ignore import errors, and
-            # fall back to absolute import at the end of the
-            # function.
-            if level == -1:
-                # This check is a fast path to avoid redoing the
-                # following absolute_import() in the common case
-                w_mod = check_sys_modules_w(space, rel_modulename)
-                if w_mod is not None and space.is_w(w_mod, space.w_None):
-                    # if we already find space.w_None, it means that we
-                    # already tried and failed and fell back to the
-                    # end of this function.
-                    w_mod = None
-                else:
-                    w_mod = absolute_import(space, rel_modulename, rel_level,
-                                            w_fromlist, tentative=True)
+
+    if w_fromlist is None and rel_level == 0 and modulename:
+        # a plain 'import x', which cannot refer to a module of the
+        # current package
+        w_mod = lazy_import(space, modulename)
+        if w_mod is not None:
+            return w_mod
+
+    if rel_modulename:
+        # if no level was set, ignore import errors, and
+        # fall back to absolute import at the end of the
+        # function.
+        if level == -1:
+            # This check is a fast path to avoid redoing the
+            # following absolute_import() in the common case
+            w_mod = check_sys_modules_w(space, rel_modulename)
+            if w_mod is not None and space.is_w(w_mod, space.w_None):
+                # if we already find space.w_None, it means that we
+                # already tried and failed and fell back to the
+                # end of this function.
+                w_mod = None
             else:
                 w_mod = absolute_import(space, rel_modulename, rel_level,
-                                        w_fromlist, tentative=False)
-            if w_mod is not None:
-                return w_mod
+                                        w_fromlist, tentative=True)
+        else:
+            w_mod = absolute_import(space, rel_modulename, rel_level,
+                                    w_fromlist, tentative=False)
+        if w_mod is not None:
+            return w_mod
 
     w_mod = absolute_import(space, modulename, 0, w_fromlist, tentative=0)
     if rel_modulename is not None:
@@ -520,22 +607,129 @@ W_NullImporter.typedef = TypeDef(
     find_module=interp2app(W_NullImporter.find_module_w),
     )
 
+# ____________________________________________________________
+# Lazy imports
+
+# modules imported for their side effects, which are never made lazy
+DEFAULT_EAGER_MODULES = ['__main__', 'site', 'sitecustomize', 'usercustomize',
+                         'encodings', 'readline', 'rlcompleter', 'this',
+                         'antigravity']
+
+class LazyImportState(object):
+    def __init__(self, space):
+        self.enabled = False
+        self.eager = {}
+        for name in DEFAULT_EAGER_MODULES:
+            self.eager[name] = None
+
+def lazy_import(space, modulename):
+    """Return a W_LazyModule for a top-level 'import modulename', or None
+    if it must be imported right now.  The module is searched right
+    away, so that an ImportError is still raised by the import statement;
+    only running its body is deferred."""
+    lazystate = space.fromcache(LazyImportState)
+    if not lazystate.enabled or '.' in modulename:
+        return None
+    if modulename in lazystate.eager or modulename in space.builtin_modules:
+        return None
+    w_modulename = space.newtext(modulename)
+    lock = getimportlock(space)
+    lock.acquire_lock()
+    try:
+        if check_sys_modules(space, w_modulename) is not None:
+            return None     # already imported, or a failed relative import
+        find_info = find_module(space, modulename, w_modulename, modulename,
+                                None)
+        if find_info is None:
+            return None
+        if find_info.stream:
+            _close_ignore(find_info.stream)
+        # only the kinds of modules that load_module() can load into an
+        # existing module object
+        if find_info.w_loader is not None or find_info.modtype not in (
+                PY_SOURCE, PY_COMPILED, PKG_DIRECTORY, PY_ARCHIVED):
+            return None
+        log_pyverbose(space, 1, "import %s # lazy\n" % (modulename,))
+        w_lazy = W_LazyModule(space, w_modulename)
+        space.setitem(space.sys.get('modules'), w_modulename, w_lazy)
+    finally:
+        lock.release_lock(silent_after_fork=True)
+    return w_lazy
+
+LAZY_PENDING = 0
+LAZY_LOADING = 1
+LAZY_LOADED = 2
+
+class W_LazyModule(Module):
+    """A module in sys.modules whose body has not been run yet.  It is
+    what 'import x' binds in lazy import mode.  The body runs in this
+    same module object, the first time its __dict__ is needed, e.g. to
+    read, set or delete an attribute; afterwards it is a regular module.
+    """
+    _immutable_fields_ = ["lazy_state?"]
+
+    def __init__(self, space, w_name):
+        Module.__init__(self, space, w_name)
+        self.lazy_state = LAZY_PENDING
+
+    def getdict(self, space):
+        if self.lazy_state != LAZY_LOADED:
+            self.force(space)
+        return self.w_dict
+
+    def force(self, space):
+        lock = getimportlock(space)
+        lock.acquire_lock()
+        try:
+            # if this is LAZY_LOADING, we are running the module body
+            # ourselves, or another thread did it while we waited
+            if self.lazy_state == LAZY_PENDING:
+                self._load(space)
+        finally:
+            lock.release_lock(silent_after_fork=True)
+
+    def _load(self, space):
+        w_modulename = self.w_name
+        modulename = space.text0_w(w_modulename)
+        find_info = find_module(space, modulename, w_modulename, modulename,
+                                None)
+        if find_info is None:
+            raise oefmt(space.w_ImportError, "No module named %s",
+                        modulename)
+        # load_module() runs the body in the module of sys.modules
+        space.setitem(space.sys.get('modules'), w_modulename, self)
+        self.lazy_state = LAZY_LOADING
+        try:
+            load_module(space, w_modulename, find_info, reuse=True)
+        except:
+            # like a failed import, it is removed from sys.modules; the
+            # next attribute access will try again
+            self.lazy_state = LAZY_PENDING
+            raise
+        finally:
+            if find_info.stream:
+                _close_ignore(find_info.stream)
+        self.lazy_state = LAZY_LOADED
+
+# ____________________________________________________________
+
 class FindInfo:
     def __init__(self, modtype, filename, stream,
-                 suffix="", filemode="", w_loader=None):
+                 suffix="", filemode="", w_loader=None, archive_entry=None):
         self.modtype = modtype
         self.filename = filename
         self.stream = stream
         self.suffix = suffix
         self.filemode = filemode
         self.w_loader = w_loader
+        self.archive_entry = archive_entry
 
     @staticmethod
     def fromLoader(w_loader):
         return FindInfo(IMP_HOOK, '', None, w_loader=w_loader)
 
 def find_module(space, modulename, w_modulename, partname, w_path,
-                use_loader=True):
+                use_loader=True, use_archive=True):
     # Examin importhooks (PEP302) before doing the import
     if use_loader:
         w_loader  = find_in_meta_path(space, w_modulename, w_path)
@@ -564,6 +758,12 @@ def find_module(space, modulename, w_modulename, partname, w_path,
     # XXX check frozen modules?
     #     when w_path is null
 
+    archive = None
+    if use_archive:
+        archive = codearchive.get_code_archive(space)
+    dircache = space.fromcache(DirectoryCache)
+    dircache.check_flush(space)
+
     if w_path is not None:
         for w_pathitem in space.unpackiterable(w_path):
             # sys.path_hooks import hook
@@ -577,6 +777,24 @@ def find_module(space, modulename, w_modulename, partname, w_path,
 
             path = space.fsencode_w(w_pathitem)
             filepart = os.path.join(path, partname)
+            if archive is not None:
+                # a directory covered by the code archive: no stat() needed
+                entry = archive.find(path, filepart)
+                if entry is not None:
+                    if entry.kind == codearchive.NOT_FOUND:
+                        continue
+                    if entry.kind == codearchive.PACKAGE:
+                        return FindInfo(PKG_DIRECTORY, filepart, None)
+                    return FindInfo(PY_ARCHIVED, entry.source_filename(),
+                                    None, suffix=".py",
+                                    archive_entry=entry)
+            names = dircache.get_listing(space, path)
+            if names is not None and not may_contain_module(space, names,
+                                                            partname):
+                dircache.skipped += 1
+                log_pyverbose(space, 2, "# skipping %s (not in the "
+                              "directory listing)\n" % (filepart,))
+                continue
             log_pyverbose(space, 2, "# trying %s\n" % (filepart,))
             if os.path.isdir(filepart) and case_ok(filepart):
                 if has_init_module(space, filepart):
@@ -641,7 +859,8 @@ def load_module(space, w_modulename, find_info, reuse=False):
         return space.getbuiltinmodule(find_info.filename, force_init=True,
                                       reuse=reuse)
 
-    if find_info.modtype in (PY_SOURCE, PY_COMPILED, C_EXTENSION, PKG_DIRECTORY):
+    if find_info.modtype in (PY_SOURCE, PY_COMPILED, C_EXTENSION, PKG_DIRECTORY,
+                             PY_ARCHIVED):
         w_mod = None
         if reuse:
             try:
@@ -669,6 +888,10 @@ def load_module(space, w_modulename, find_info, reuse=False):
                 return load_compiled_module(space, w_modulename, w_mod, find_info.filename,
                                      magic, timestamp,
                                      _wrap_readall(space, find_info.stream))
+            elif find_info.modtype == PY_ARCHIVED:
+                return load_archived_module(space, w_modulename, w_mod,
+                                            find_info.filename,
+                                            find_info.archive_entry)
             elif find_info.modtype == PKG_DIRECTORY:
                 w_path = space.newlist([space.newtext(find_info.filename)])
                 space.setattr(w_mod, space.newtext('__path__'), w_path)
@@ -680,7 +903,8 @@ def load_module(space, w_modulename, find_info, reuse=False):
                     w_mod = load_module(space, w_modulename, find_info,
                                         reuse=True)
                 finally:
-                    _close_ignore(find_info.stream)
+                    if find_info.stream:
+                        _close_ignore(find_info.stream)
                 return w_mod
             elif find_info.modtype == C_EXTENSION and has_so_extension(space):
                 return load_c_extension(space, find_info.filename,
@@ -724,6 +948,8 @@ def load_part(space, w_path, prefix, partname, w_parent, tentative):
 def reload(space, w_module):
     """Reload the module.
     The module must have been successfully imported before."""
+    if isinstance(w_module, W_LazyModule):
+        w_module.force(space)
     if not space.isinstance_w(w_module, space.type(space.sys)):
         raise oefmt(space.w_TypeError, "reload() argument must be module")
 
@@ -1059,8 +1285,7 @@ def check_compiled_module(space, pycfilename, expected_mtime):
 def read_compiled_module(space, cpathname, strbuf):
     """ Read a code object from a file and check it for validity """
 
-    w_marshal = space.getbuiltinmodule('marshal')
-    w_code = space.call_method(w_marshal, 'loads', space.newbytes(strbuf))
+    w_code = interp_marshal.loads_bytes(space, strbuf)
     if not isinstance(w_code, Code):
         raise oefmt(space.w_ImportError, "Non-code object in %s", cpathname)
     return w_code
@@ -1090,6 +1315,34 @@ def load_compiled_module(space, w_modulename, w_mod, cpathname, magic,
     return exec_code_module(space, w_mod, code_w, w_modulename,
                             check_afterwards=check_afterwards)
 
+@jit.dont_look_inside
+def load_archived_module(space, w_modulename, w_mod, pathname, entry,
+                         check_afterwards=True):
+    """
+    Load a module from the code archive and execute it.  Returns
+    'sys.modules[modulename]', which must exist.
+    """
+    log_pyverbose(space, 1, "import %s # from %s (archived)\n" %
+                  (space.text_w(w_modulename), pathname))
+
+    assert entry is not None
+    try:
+        strbuf = entry.read_code()
+    except codearchive.ArchiveError as e:
+        raise oefmt(space.w_ImportError, "cannot load %s from the code "
+                    "archive: %s", pathname, e.msg)
+    code_w = read_compiled_module(space, pathname, strbuf)
+    try:
+        optimize = space.sys.get_flag('optimize')
+    except RuntimeError:
+        # during bootstrapping
+        optimize = 0
+    if optimize >= 2:
+        code_w.remove_docstrings(space)
+
+    return exec_code_module(space, w_mod, code_w, w_modulename,
+                            check_afterwards=check_afterwards)
+
 def open_exclusive(space, cpathname, mode):
     try:
         os.unlink(cpathname)
@@ -1,8 +1,8 @@
-from pypy.module.imp import importing
+from pypy.module.imp import importing, codearchive
 from pypy.module._file.interp_file import W_File
 from rpython.rlib import streamio
 from rpython.rlib.streamio import StreamErrors
-from pypy.interpreter.error import oefmt
+from pypy.interpreter.error import oefmt, wrap_oserror
 from pypy.interpreter.module import Module
 from pypy.interpreter.gateway import unwrap_spec
 from pypy.interpreter.streamutil import wrap_streamerror
@@ -54,7 +54,8 @@ def find_module(space, w_name, w_path=None):
         w_path = None
 
     find_info = importing.find_module(
-        space, name, w_name, name, w_path, use_loader=False)
+        space, name, w_name, name, w_path, use_loader=False,
+        use_archive=False)
     if not find_info:
         raise oefmt(space.w_ImportError, "No module named %s", name)
 
@@ -127,6 +128,55 @@ def _run_compiled_module(space, w_modulename, filename, w_file, w_module,
         importing._wrap_close(space, stream)
     return w_mod
 
+_VALIDATE_MODES = {'none': codearchive.VALIDATE_NONE,
+                   'mtime': codearchive.VALIDATE_MTIME,
+                   'hash': codearchive.VALIDATE_HASH}
+
+@unwrap_spec(validate='text')
+def _set_code_archive(space, w_filename, validate='mtime'):
+    # the function 'imp._set_code_archive' is a pypy-only extension.
+    # Returns the names of the modules that the archive asks to preload.
+    try:
+        mode = _VALIDATE_MODES[validate]
+    except KeyError:
+        raise oefmt(space.w_ValueError,
+                    "validate must be 'none', 'mtime' or 'hash', not '%s'",
+                    validate)
+    if space.is_none(w_filename):
+        codearchive.set_code_archive(space, None)
+        return space.newlist([])
+    filename = space.fsencode_w(w_filename)
+    try:
+        archive = codearchive.open_archive(filename, mode)
+    except OSError as e:
+        raise wrap_oserror(space, e, filename, w_exception_class=space.w_IOError)
+    except codearchive.ArchiveError as e:
+        raise oefmt(space.w_ImportError, "%s: %s", filename, e.msg)
+    if archive.pyc_magic != importing.get_pyc_magic(space):
+        archive.close()
+        raise oefmt(space.w_ImportError, "Bad magic number in %s", filename)
+    importing.getimportlock(space).acquire_lock()
+    try:
+        codearchive.set_code_archive(space, archive)
+    finally:
+        importing.getimportlock(space).release_lock(silent_after_fork=False)
+    return space.newlist([space.newtext(name) for name in archive.preload])
+
+@unwrap_spec(enabled=bool)
+def _set_lazy_imports(space, enabled, w_eager=None):
+    # the function 'imp._set_lazy_imports' is a pypy-only extension.
+    # With 'enabled', a top-level 'import x' binds a lazy module that is
+    # only imported when first used.  'eager' is an iterable of names of
+    # modules that are always imported right away, on top of the default
+    # ones.  Returns the previous setting.
+    state = space.fromcache(importing.LazyImportState)
+    if not space.is_none(w_eager):
+        for w_name in space.unpackiterable(w_eager):
+            state.eager[space.text0_w(w_name)] = None
+    w_previous = space.newbool(state.enabled)
+    state.enabled = enabled
+    return w_previous
+
 @unwrap_spec(filename='fsencode')
 def load_compiled(space, w_modulename, filename, w_file=None):
     w_mod = Module(space, w_modulename)
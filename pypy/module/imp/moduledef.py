@@ -24,6 +24,8 @@ class Module(MixedModule):
         'load_dynamic':    'interp_imp.load_dynamic',
         '_run_compiled_module': 'interp_imp._run_compiled_module',   # pypy
         '_getimporter':    'importing._getimporter',                 # pypy
+        '_set_code_archive': 'interp_imp._set_code_archive',         # pypy
+        '_set_lazy_imports': 'interp_imp._set_lazy_imports',         # pypy
         #'run_module':      'interp_imp.run_module',
         'new_module':      'interp_imp.new_module',
         'init_builtin':    'interp_imp.init_builtin',
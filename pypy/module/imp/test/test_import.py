@@ -3,6 +3,7 @@ from pypy.interpreter.module import Module
 from pypy.interpreter import gateway
 from pypy.interpreter.error import OperationError
 import pypy.interpreter.pycode
+import pypy
 from rpython.tool.udir import udir
 from rpython.rlib import streamio
 from pypy.tool.option import make_config
@@ -1479,6 +1480,338 @@ class AppTestPyPyExtension(object):
         assert isinstance(importer, zipimport.zipimporter)
 
 
+class AppTestCodeArchive(object):
+    spaceconfig = dict(usemodules=['imp', 'struct', 'binascii'])
+
+    def setup_class(cls):
+        root = udir.join('codearchive')
+        root.ensure(dir=1)
+        root.join('carch_mod.py').write('x = 42\n')
+        pkg = root.join('carch_pkg')
+        pkg.ensure(dir=1)
+        pkg.join('__init__.py').write('y = 1\n')
+        pkg.join('sub.py').write('from . import y\nz = y + 1\n')
+        root.join('carch_broken.py').write('x = (\n')
+        root.join('carch_nopkg').ensure(dir=1)
+        cls.w_root = cls.space.wrap(str(root))
+        cls.w_archive = cls.space.wrap(str(udir.join('codearchive.bin')))
+        cls.w_lib_pypy = cls.space.wrap(
+            os.path.join(os.path.dirname(pypy.__file__), '..', 'lib_pypy'))
+
+    def setup_method(self, meth):
+        self.space.appexec([self.w_root, self.w_archive, self.w_lib_pypy], """
+            (root, archive, lib_pypy):
+                import sys, os
+                sys.path.insert(0, lib_pypy)
+                try:
+                    from pypy_tools.build_code_archive import build_archive
+                finally:
+                    del sys.path[0]
+                # make sure that adding a file changes the mtime of 'root'
+                os.utime(root, (1000000000, 1000000000))
+                build_archive(archive, [root])
+                sys.path.insert(0, root)
+                sys.dont_write_bytecode = True
+        """)
+
+    def teardown_method(self, meth):
+        self.space.appexec([self.w_root], """
+            (root):
+                import sys, imp
+                imp._set_code_archive(None)
+                sys.path.remove(root)
+                sys.dont_write_bytecode = False
+                for name in list(sys.modules):
+                    if name.startswith('carch_'):
+                        del sys.modules[name]
+        """)
+
+    def test_import_from_archive(self):
+        import imp, os
+        imp._set_code_archive(self.archive, 'none')
+        # the archive is used even if the source changed
+        with open(os.path.join(self.root, 'carch_mod.py'), 'w') as f:
+            f.write('x = 43\n')
+        import carch_mod
+        assert carch_mod.x == 42
+        assert carch_mod.__file__ == os.path.join(self.root, 'carch_mod.py')
+        import carch_pkg.sub
+        assert carch_pkg.y == 1
+        assert carch_pkg.sub.z == 2
+        assert carch_pkg.__path__ == [os.path.join(self.root, 'carch_pkg')]
+        raises(SyntaxError, "import carch_broken")
+        raises(ImportError, "import carch_nopkg")
+        # a miss in a directory of the archive is authoritative
+        with open(os.path.join(self.root, 'carch_new.py'), 'w') as f:
+            f.write('x = 5\n')
+        try:
+            raises(ImportError, "import carch_new")
+        finally:
+            os.unlink(os.path.join(self.root, 'carch_new.py'))
+
+    def test_validate_mtime(self):
+        import imp, os
+        imp._set_code_archive(self.archive)
+        with open(os.path.join(self.root, 'carch_mod.py'), 'w') as f:
+            f.write('x = 143\n')
+        import carch_mod
+        assert carch_mod.x == 143
+        with open(os.path.join(self.root, 'carch_mod.py'), 'w') as f:
+            f.write('x = 42\n')
+
+    def test_validate_mtime_new_file(self):
+        import imp, os
+        imp._set_code_archive(self.archive, 'mtime')
+        with open(os.path.join(self.root, 'carch_new.py'), 'w') as f:
+            f.write('x = 5\n')
+        try:
+            import carch_new
+            assert carch_new.x == 5
+        finally:
+            os.unlink(os.path.join(self.root, 'carch_new.py'))
+
+    def test_validate_mtime_file_created_after_lookup(self):
+        import imp, os
+        imp._set_code_archive(self.archive, 'mtime')
+        raises(ImportError, "import carch_late")
+        with open(os.path.join(self.root, 'carch_late.py'), 'w') as f:
+            f.write('x = 6\n')
+        try:
+            import carch_late
+            assert carch_late.x == 6
+        finally:
+            os.unlink(os.path.join(self.root, 'carch_late.py'))
+
+    def test_recently_modified_dir_not_covered(self):
+        import imp, os, sys
+        sys.path.insert(0, self.lib_pypy)
+        try:
+            from pypy_tools.build_code_archive import build_archive
+        finally:
+            del sys.path[0]
+        os.utime(self.root, None)
+        build_archive(self.archive, [self.root])
+        imp._set_code_archive(self.archive, 'none')
+        # a file created in the same second as the build would not change
+        # the mtime of the directory: the archive doesn't claim to list it
+        with open(os.path.join(self.root, 'carch_late.py'), 'w') as f:
+            f.write('x = 7\n')
+        try:
+            import carch_late
+            assert carch_late.x == 7
+            import carch_mod
+            assert carch_mod.x == 42
+        finally:
+            os.unlink(os.path.join(self.root, 'carch_late.py'))
+
+    def test_validate_hash(self):
+        import imp, os
+        filename = os.path.join(self.root, 'carch_mod.py')
+        st = os.stat(filename)
+        imp._set_code_archive(self.archive, 'hash')
+        # same size and mtime, different contents
+        with open(filename, 'w') as f:
+            f.write('x = 24\n')
+        os.utime(filename, (st.st_atime, st.st_mtime))
+        import carch_mod
+        assert carch_mod.x == 24
+        with open(filename, 'w') as f:
+            f.write('x = 42\n')
+
+    def test_preload(self):
+        import imp, sys
+        sys.path.insert(0, self.lib_pypy)
+        try:
+            from pypy_tools.build_code_archive import build_archive
+        finally:
+            del sys.path[0]
+        build_archive(self.archive, [self.root],
+                      preload=['carch_mod', 'carch_pkg.sub'])
+        preload = imp._set_code_archive(self.archive)
+        assert preload == ['carch_mod', 'carch_pkg.sub']
+        assert imp._set_code_archive(None) == []
+
+    def test_errors(self):
+        import imp, os
+        raises(ValueError, imp._set_code_archive, self.archive, 'sometimes')
+        raises(IOError, imp._set_code_archive,
+               os.path.join(self.root, 'does_not_exist'))
+        raises(ImportError, imp._set_code_archive,
+               os.path.join(self.root, 'carch_mod.py'))
+        # imp.find_module() does not look in the archive
+        imp._set_code_archive(self.archive, 'none')
+        f, filename, info = imp.find_module('carch_mod', [self.root])
+        f.close()
+        assert info[2] == imp.PY_SOURCE
+
+
+class AppTestDirectoryCache(object):
+    spaceconfig = dict(usemodules=['imp'])
+
+    def setup_class(cls):
+        root = udir.join('dircache')
+        root.ensure(dir=1)
+        root.join('dcache_a.py').write('x = 1\n')
+        cls.w_root = cls.space.wrap(str(root))
+
+    def test_listing_is_cached(self):
+        import sys, os
+        old_mtime = 1000000000
+        sys.path.insert(0, self.root)
+        newfile = os.path.join(self.root, 'dcache_b.py')
+        try:
+            import dcache_a
+            assert dcache_a.x == 1
+            # (importing may have written a .pyc)
+            os.utime(self.root, (old_mtime, old_mtime))
+            raises(ImportError, "import dcache_b")
+            with open(newfile, 'w') as f:
+                f.write('x = 2\n')
+            # the listing is still considered valid if the directory's
+            # mtime did not change
+            os.utime(self.root, (old_mtime, old_mtime))
+            raises(ImportError, "import dcache_b")
+            # clearing sys.path_importer_cache flushes the listings
+            sys.path_importer_cache.clear()
+            import dcache_b
+            assert dcache_b.x == 2
+        finally:
+            sys.path.remove(self.root)
+            sys.modules.pop('dcache_a', None)
+            sys.modules.pop('dcache_b', None)
+            if os.path.exists(newfile):
+                os.unlink(newfile)
+
+    def test_mtime_change(self):
+        import sys, os
+        os.utime(self.root, (1000000000, 1000000000))
+        sys.path.insert(0, self.root)
+        newfile = os.path.join(self.root, 'dcache_c.py')
+        try:
+            raises(ImportError, "import dcache_c")
+            with open(newfile, 'w') as f:
+                f.write('x = 3\n')
+            os.utime(self.root, (1000000100, 1000000100))
+            import dcache_c
+            assert dcache_c.x == 3
+        finally:
+            sys.path.remove(self.root)
+            sys.modules.pop('dcache_c', None)
+            os.unlink(newfile)
+
+
+class AppTestLazyImports(object):
+    spaceconfig = dict(usemodules=['imp'])
+
+    def setup_class(cls):
+        root = udir.join('lazyimports')
+        root.ensure(dir=1)
+        for name in ['lazy_a', 'lazy_b', 'lazy_c', 'lazy_d']:
+            root.join(name + '.py').write(
+                'import sys\n'
+                'sys.lazy_log.append(__name__)\n'
+                'x = 42\n')
+        root.join('lazy_err.py').write('x = 1\nraise ValueError("boom")\n')
+        cls.w_root = cls.space.wrap(str(root))
+
+    def setup_method(self, meth):
+        self.space.appexec([self.w_root], """(root):
+            import sys, imp
+            sys.path.insert(0, root)
+            sys.lazy_log = []
+            imp._set_lazy_imports(True, ['lazy_b'])
+        """)
+
+    def teardown_method(self, meth):
+        self.space.appexec([self.w_root], """(root):
+            import sys, imp
+            imp._set_lazy_imports(False)
+            sys.path.remove(root)
+            del sys.lazy_log
+            for name in ['lazy_a', 'lazy_b', 'lazy_c', 'lazy_d', 'lazy_err']:
+                sys.modules.pop(name, None)
+        """)
+
+    def test_deferred(self):
+        import sys
+        import lazy_a
+        assert sys.lazy_log == []
+        assert sys.modules['lazy_a'] is lazy_a
+        assert lazy_a.x == 42
+        assert sys.lazy_log == ['lazy_a']
+        assert sys.modules['lazy_a'] is lazy_a
+        assert lazy_a.__file__.startswith(self.root)
+        lazy_a.y = 5
+        del lazy_a.y
+        assert not hasattr(lazy_a, 'y')
+        import lazy_a as a2
+        assert a2 is lazy_a
+        assert sys.lazy_log == ['lazy_a']
+
+    def test_setattr_forces(self):
+        import sys
+        import lazy_a
+        lazy_a.y = 5
+        assert sys.lazy_log == ['lazy_a']
+        assert lazy_a.x == 42 and lazy_a.y == 5
+
+    def test_import_module(self):
+        # the pattern of importlib.import_module(), pkgutil...
+        import sys
+        __import__('lazy_a')
+        mod = sys.modules['lazy_a']
+        assert sys.lazy_log == []
+        assert mod.x == 42
+        assert sys.lazy_log == ['lazy_a']
+        import importlib
+        assert importlib.import_module('lazy_c').x == 42
+        assert sys.lazy_log == ['lazy_a', 'lazy_c']
+
+    def test_same_lazy_module(self):
+        import sys
+        import lazy_c as c1
+        import lazy_c as c2
+        assert c1 is c2
+        assert c2.x == 42
+        assert sys.lazy_log == ['lazy_c']
+        from lazy_c import x
+        assert x == 42
+        assert sys.lazy_log == ['lazy_c']
+
+    def test_eager(self):
+        import sys
+        import lazy_b
+        assert sys.lazy_log == ['lazy_b']
+        assert lazy_b is sys.modules['lazy_b']
+        from lazy_d import x
+        assert x == 42
+        assert sys.lazy_log == ['lazy_b', 'lazy_d']
+
+    def test_error_in_body(self):
+        import sys
+        import lazy_err
+        assert 'lazy_err' in sys.modules
+        raises(ValueError, "lazy_err.x")
+        assert 'lazy_err' not in sys.modules
+        raises(ValueError, "lazy_err.x")
+
+    def test_not_found(self):
+        import sys
+        raises(ImportError, "import lazy_does_not_exist")
+
+    def test_reload(self):
+        import sys
+        import lazy_a
+        assert reload(lazy_a) is sys.modules['lazy_a']
+        assert sys.lazy_log == ['lazy_a', 'lazy_a']
+
+    def test_disabled(self):
+        import sys, imp
+        assert imp._set_lazy_imports(False) is True
+        import lazy_a
+        assert sys.lazy_log == ['lazy_a']
+
+
 class AppTestWriteBytecode(object):
     spaceconfig = {
         "translation.sandbox": False
@@ -0,0 +1,58 @@
+""" Benchmark marshal.loads() on the code objects of the whole standard
+library, i.e. what importing modules from their .pyc files does.
+
+    pypy bench_loads.py [STDLIB_DIR] [ROUNDS]
+
+STDLIB_DIR defaults to lib-python/2.7.  The sources are compiled and
+marshalled once, with the running interpreter, before timing.
+"""
+
+import marshal, os, sys, time
+
+def default_stdlib():
+    here = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(here, '..', '..', '..', '..', 'lib-python', '2.7')
+
+def collect(stdlib):
+    result = []
+    for dirpath, dirnames, filenames in os.walk(stdlib):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if not name.endswith('.py'):
+                continue
+            filename = os.path.join(dirpath, name)
+            with open(filename, 'U') as f:
+                source = f.read()
+            try:
+                code = compile(source, filename, 'exec')
+            except (SyntaxError, TypeError, ValueError):
+                continue     # e.g. the lib2to3 test data
+            result.append(marshal.dumps(code))
+    return result
+
+def bench_loads(data, rounds):
+    best = None
+    for i in range(rounds):
+        t0 = time.time()
+        for s in data:
+            marshal.loads(s)
+        t = time.time() - t0
+        if best is None or t < best:
+            best = t
+    return best
+
+def main(argv):
+    stdlib = argv[0] if len(argv) > 0 else default_stdlib()
+    rounds = int(argv[1]) if len(argv) > 1 else 10
+    data = collect(stdlib)
+    if not data:
+        print "no modules found in %s" % (stdlib,)
+        return
+    size = sum([len(s) for s in data])
+    print "%d code objects, %.1f MB of marshal data" % (len(data),
+                                                      size / 1e6)
+    t = bench_loads(data, rounds)
+    print "loads: best of %d: %f s, %.1f MB/s" % (rounds, t, size / 1e6 / t)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -4,6 +4,8 @@ from rpython.rlib.rarithmetic import intmask
 from rpython.rlib import rstackovf
 from pypy.module._file.interp_file import W_File
 from pypy.objspace.std.marshal_impl import marshal, get_unmarshallers
+from pypy.objspace.std.marshal_impl import (
+    TYPE_NONE, TYPE_INT, TYPE_STRING, TYPE_INTERNED)
 
 
 Py_MARSHAL_VERSION = 2
@@ -53,6 +55,12 @@ ignored."""
     obj = u.load_w_obj()
     return obj
 
+def loads_bytes(space, s):
+    """Interp-level version of loads() for a string that is not wrapped,
+e.g. the contents of a .pyc file."""
+    u = BufferUnmarshaller(space, s)
+    return u.load_w_obj()
+
 
 class AbstractReaderWriter(object):
     def __init__(self, space):
@@ -402,8 +410,10 @@ class Unmarshaller(_Base):
         return self.get(lng)
 
     def get_w_obj(self, allow_null=False):
+        return self.get_w_obj_tc(self.get1(), allow_null)
+
+    def get_w_obj_tc(self, tc, allow_null=False):
         space = self.space
-        tc = self.get1()
         w_ret = self._dispatch[ord(tc)](space, self, tc)
         if w_ret is None and not allow_null:
             raise oefmt(space.w_TypeError, "NULL object in marshal data")
@@ -425,9 +435,21 @@ class Unmarshaller(_Base):
         w_ret = space.w_None # something not
         while idx < lng:
             tc = self.get1()
-            w_ret = self._dispatch[ord(tc)](space, self, tc)
-            if w_ret is None:
-                break
+            # the most common items of the tuples of code objects (constants
+            # and names) are decoded here, without going through _dispatch
+            if tc == TYPE_STRING:
+                w_ret = space.newbytes(self.get_str())
+            elif tc == TYPE_INTERNED:
+                w_ret = space.new_interned_str(self.get_str())
+                self.stringtable_w.append(w_ret)
+            elif tc == TYPE_INT:
+                w_ret = space.newint(self.get_int())
+            elif tc == TYPE_NONE:
+                w_ret = space.w_None
+            else:
+                w_ret = self._dispatch[ord(tc)](space, self, tc)
+                if w_ret is None:
+                    break
             res_w[idx] = w_ret
             idx += 1
         if w_ret is None:
@@ -441,13 +463,13 @@ class Unmarshaller(_Base):
         self.raise_exc('object too deeply nested to unmarshal')
 
 
-class StringUnmarshaller(Unmarshaller):
+class BufferUnmarshaller(Unmarshaller):
     # Unmarshaller with inlined buffer string
-    def __init__(self, space, w_str):
+    def __init__(self, space, bufstr):
         Unmarshaller.__init__(self, space, None)
-        self.bufstr = space.getarg_w('s#', w_str)
+        self.bufstr = bufstr
         self.bufpos = 0
-        self.limit = len(self.bufstr)
+        self.limit = len(bufstr)
 
     def raise_eof(self):
         space = self.space
@@ -498,3 +520,17 @@ class StringUnmarshaller(Unmarshaller):
             return x
         else:
             self.raise_exc('bad marshal data')
+
+    def get_str(self):
+        lng = self.get_lng()
+        pos = self.bufpos
+        newpos = pos + lng
+        if newpos > self.limit:
+            self.raise_eof()
+        self.bufpos = newpos
+        return self.bufstr[pos : newpos]
+
+
+class StringUnmarshaller(BufferUnmarshaller):
+    def __init__(self, space, w_str):
+        BufferUnmarshaller.__init__(self, space, space.getarg_w('s#', w_str))
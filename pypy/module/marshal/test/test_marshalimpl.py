@@ -1,6 +1,7 @@
 from pypy.module.marshal import interp_marshal
 from pypy.interpreter.error import OperationError
 import sys
+import py
 
 
 class AppTestMarshalMore:
@@ -54,6 +55,38 @@ class AppTestMarshalMore:
         z = marshal.loads('I\x00\x1c\xf4\xab\xfd\xff\xff\xff')
         assert z == -10000000000
 
+    def test_tuple_items(self):
+        import marshal
+        a = intern('foo' * 3)
+        t = (1, -2, None, 'bar', a, a, (a, 'bar'), 1.5, [2], u'\xe9')
+        s = marshal.dumps(t)
+        assert s.count('foo' * 3) == 1     # the other ones are references
+        t1 = marshal.loads(s)
+        assert t1 == t
+        assert t1[4] is t1[5] is t1[6][0]
+        raises(EOFError, marshal.loads, s[:-3])
+        raises(TypeError, marshal.loads, '(\x02\x00\x00\x000N')
+
+    def test_code_strings(self):
+        import marshal
+        def f(x, y=5):
+            z = x + y
+            def g():
+                return z + len('foo')
+            return g
+        co = f.func_code
+        co1 = marshal.loads(marshal.dumps(co))
+        for name in ['co_code', 'co_consts', 'co_names', 'co_varnames',
+                     'co_freevars', 'co_cellvars', 'co_filename', 'co_name',
+                     'co_lnotab']:
+            assert getattr(co1, name) == getattr(co, name)
+        assert co1.co_consts[1].co_freevars == ('z',)
+        s = marshal.dumps(co)
+        i = s.index(co.co_filename)
+        # a code object whose filename is an int is invalid
+        bad = s[:i - 5] + marshal.dumps(42) + s[i + len(co.co_filename):]
+        raises(ValueError, marshal.loads, bad)
+
 
 class AppTestMarshalSmallLong(AppTestMarshalMore):
     spaceconfig = dict(usemodules=('array',),
@@ -91,3 +124,20 @@ def test_long_more(space):
         for i in range(100):
             _marshal_check(sign * ((1L << i) - 1L))
             _marshal_check(sign * (1L << i))
+
+
+def test_loads_bytes(space):
+    w_code = space.appexec([], """():
+        return compile('x = [1, None, "a"]; y = x', 'test.py', 'exec')
+    """)
+    data = space.bytes_w(interp_marshal.dumps(
+        space, w_code, space.newint(interp_marshal.Py_MARSHAL_VERSION)))
+    w_code2 = interp_marshal.loads_bytes(space, data)
+    assert w_code2.co_filename == 'test.py'
+    assert w_code2.co_names == w_code.co_names
+    assert w_code2.co_code == w_code.co_code
+    assert len(w_code2.co_consts_w) == len(w_code.co_consts_w)
+    for w_a, w_b in zip(w_code2.co_consts_w, w_code.co_consts_w):
+        assert space.eq_w(w_a, w_b)
+    py.test.raises(OperationError, interp_marshal.loads_bytes, space,
+                   data[:-1])
@@ -0,0 +1,96 @@
+# NOT_RPYTHON
+
+# A warm-up cache for the JIT.  The greenkeys of the loops compiled by a
+# process are saved as (filename, firstlineno, name, next_instr) tuples,
+# which are stable across processes, unlike the code objects and the
+# jitcounter hashes.  A new process can then load the file and mark these
+# positions with trace_next_iteration(): the loop is traced the next time
+# it runs, instead of waiting for its counter to reach the threshold.
+# The JIT still traces and optimizes everything from scratch; this only
+# skips the counting phase.
+
+import pypyjit
+
+
+def warmup_hook(keys, next_hook=None):
+    """Return a function to pass to pypyjit.set_compile_hook() that
+    adds the greenkey of every loop compiled by the JIT to the set
+    'keys', and then calls 'next_hook', if given.
+    """
+    def hook(info):
+        if info.jitdriver_name == 'pypyjit' and info.type == 'loop':
+            code, next_instr, is_being_profiled = info.greenkey
+            keys.add((code.co_filename, code.co_firstlineno,
+                      code.co_name, next_instr))
+        if next_hook is not None:
+            next_hook(info)
+    return hook
+
+
+def save_warmup(filename, keys):
+    """Write the set of keys, e.g. collected with warmup_hook(), to the
+    given file."""
+    with open(filename, 'w') as f:
+        for key in sorted(keys):
+            co_filename, co_firstlineno, co_name, next_instr = key
+            f.write('%s\t%d\t%s\t%d\n' % (co_filename, co_firstlineno,
+                                          co_name, next_instr))
+
+
+def _read_warmup(filename):
+    keys = set()
+    with open(filename) as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) != 4:
+                continue
+            try:
+                keys.add((parts[0], int(parts[1]), parts[2], int(parts[3])))
+            except ValueError:
+                continue
+    return keys
+
+
+def _all_code_objects():
+    import gc, types
+    result = []
+    seen = set()
+    pending = [obj for obj in gc.get_objects()
+                   if isinstance(obj, types.CodeType)]
+    while pending:
+        code = pending.pop()
+        if id(code) in seen:
+            continue
+        seen.add(id(code))
+        result.append(code)
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                pending.append(const)
+    return result
+
+
+def load_warmup(filename, codes=None):
+    """Read a file written by save_warmup() and ask the JIT to trace the
+    corresponding loops the next time they run.  'codes' is the list of
+    code objects to consider; by default, all code objects alive at this
+    point.  Returns the number of loops found.
+
+    Call this after the application has imported its modules.  Loops in
+    code objects that do not exist yet are not pre-seeded.
+    """
+    positions = {}
+    for co_filename, co_firstlineno, co_name, next_instr in (
+            _read_warmup(filename)):
+        key = (co_filename, co_firstlineno, co_name)
+        positions.setdefault(key, []).append(next_instr)
+    if not positions:
+        return 0
+    if codes is None:
+        codes = _all_code_objects()
+    count = 0
+    for code in codes:
+        key = (code.co_filename, code.co_firstlineno, code.co_name)
+        for next_instr in positions.get(key, ()):
+            pypyjit.trace_next_iteration(next_instr, False, code)
+            count += 1
+    return count
@@ -397,6 +397,12 @@ def get_stats_asmmemmgr(space):
     m2 = jit_hooks.stats_asmmemmgr_used(None)
     return space.newtuple2(space.newint(m1), space.newint(m2))
 
+def get_stats_memmgr_code_size(space):
+    """Returns the size of the machine code of the loops, including their
+    bridges, that the JIT currently keeps alive.  Compare it with the
+    'max_code_size' parameter, which is in KB."""
+    return space.newint(jit_hooks.stats_memmgr_code_size(None))
+
 def enable_debug(space):
     """ Set the jit debugging - completely necessary for some stats to work,
     most notably assembler counters.
@@ -2,6 +2,9 @@ from pypy.interpreter.mixedmodule import MixedModule
 
 class Module(MixedModule):
     appleveldefs = {
+        'warmup_hook': 'app_warmup.warmup_hook',
+        'save_warmup': 'app_warmup.save_warmup',
+        'load_warmup': 'app_warmup.load_warmup',
     }
 
     interpleveldefs = {
@@ -19,6 +22,8 @@ class Module(MixedModule):
         'set_trace_too_long_hook': 'interp_resop.set_trace_too_long_hook',
         'get_stats_snapshot': 'interp_resop.get_stats_snapshot',
         'get_stats_asmmemmgr': 'interp_resop.get_stats_asmmemmgr',
+        'get_stats_memmgr_code_size':
+            'interp_resop.get_stats_memmgr_code_size',
         # those things are disabled because they have bugs, but if
         # they're found to be useful, fix test_ztranslation_jit_stats
         # in the backend first. get_stats_snapshot still produces
@@ -1,5 +1,6 @@
 
 import py
+from rpython.tool.udir import udir
 from pypy.interpreter.gateway import interp2app
 from pypy.interpreter.pycode import PyCode
 from rpython.jit.metainterp.history import JitCellToken, ConstInt, ConstPtr,\
@@ -10,6 +11,7 @@ from rpython.rtyper.annlowlevel import (cast_instance_to_base_ptr,
                                       cast_base_ptr_to_instance)
 from rpython.rtyper.lltypesystem import lltype, llmemory
 from rpython.rtyper.rclass import OBJECT
+from pypy.module.pypyjit import interp_jit
 from pypy.module.pypyjit.interp_jit import pypyjitdriver
 from pypy.module.pypyjit.hooks import pypy_hooks
 from rpython.jit.tool.oparser import parse
@@ -124,6 +126,32 @@ class AppTestJitHook(object):
         cls.orig_oplist = oplist
         cls.orig_oplist_no_descrs = oplist_no_descrs
         cls.w_sorted_keys = space.wrap(sorted(Counters.counter_names))
+        cls.w_warmup_file = space.wrap(str(udir.join('pypyjit_warmup.txt')))
+
+        # trace_next_iteration() needs a translated JIT: record the calls
+        traced = []
+        def fake_trace_next_iteration(name, next_instr, is_being_profiled,
+                                      ll_pycode):
+            ll_code = lltype.cast_opaque_ptr(lltype.Ptr(OBJECT), ll_pycode)
+            pycode = cast_base_ptr_to_instance(PyCode, ll_code)
+            traced.append((name, next_instr, is_being_profiled, pycode))
+
+        def interp_pop_traced():
+            result = [space.newtuple([space.newtext(name),
+                                      space.newint(next_instr),
+                                      space.newint(is_being_profiled),
+                                      pycode])
+                      for name, next_instr, is_being_profiled, pycode
+                          in traced]
+            del traced[:]
+            return space.newlist(result)
+
+        cls.orig_trace_next_iteration = interp_jit.jit_hooks.trace_next_iteration
+        interp_jit.jit_hooks.trace_next_iteration = fake_trace_next_iteration
+        cls.w_pop_traced = space.wrap(interp2app(interp_pop_traced))
+
+    def teardown_class(cls):
+        interp_jit.jit_hooks.trace_next_iteration = cls.orig_trace_next_iteration
 
     def setup_method(self, meth):
         self.__class__.oplist = self.orig_oplist[:]
@@ -171,6 +199,31 @@ class AppTestJitHook(object):
         self.on_compile()
         assert len(all) == 2
 
+    def test_warmup(self):
+        import pypyjit
+        keys = set()
+        all = []
+        pypyjit.set_compile_hook(pypyjit.warmup_hook(keys, all.append))
+        self.on_compile()
+        self.on_compile_bridge()
+        code = self.f.func_code
+        assert keys == set([(code.co_filename, code.co_firstlineno,
+                             'function', 0)])
+        assert len(all) == 2
+        pypyjit.save_warmup(self.warmup_file, keys)
+        with open(self.warmup_file) as f:
+            assert f.read() == '%s\t%d\tfunction\t0\n' % (
+                code.co_filename, code.co_firstlineno)
+        # no matching code object: nothing to pre-seed
+        def other():
+            pass
+        assert pypyjit.load_warmup(self.warmup_file, [other.func_code]) == 0
+        assert self.pop_traced() == []
+        # a matching code object gets its loop marked for tracing
+        assert pypyjit.load_warmup(self.warmup_file,
+                                   [other.func_code, code]) == 1
+        assert self.pop_traced() == [('pypyjit', 0, 0, code)]
+
     def test_on_compile_exception(self):
         import pypyjit, sys, cStringIO
 
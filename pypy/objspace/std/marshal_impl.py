@@ -360,7 +360,19 @@ def marshal_pycode(space, w_pycode, m):
 # into rpython-level lists of strings.  Only for code objects.
 
 def unmarshal_str(u):
-    w_obj = u.get_w_obj()
+    # fast path for the usual string type codes, which does not wrap the
+    # string just to unwrap it again
+    tc = u.get1()
+    if tc == TYPE_STRING:
+        return u.get_str()
+    elif tc == TYPE_INTERNED:
+        s = u.get_str()
+        u.stringtable_w.append(u.space.new_interned_str(s))
+        return s
+    elif tc == TYPE_STRINGREF:
+        w_obj = unmarshal_stringref(u.space, u, tc)
+    else:
+        w_obj = u.get_w_obj_tc(tc)
     try:
         return u.space.bytes_w(w_obj)
     except OperationError as e:
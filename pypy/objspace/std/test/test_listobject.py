@@ -811,6 +811,15 @@ class AppTestListObject(object):
         l = []
         raises(IndexError, "l[1]")
 
+    def test_getitem_identity(self):
+        t = (1, 2)
+        l = [t, (3, 4)]
+        assert l[0] is t
+        assert l[1] is l[1]
+        assert [t][0] is t
+        l.append(t)
+        assert l[-1] is t
+
     def test_getitem_range(self):
         l = range(5)
         raises(IndexError, "l[-6]")
@@ -4,8 +4,16 @@ Prints a human-readable total out of a dumpfile produced
 by gc.dump_rpy_heap(), and optionally a typeids.txt.
 
 Syntax:  dump.py  <dumpfile>  [<typeids.txt>]
+         dump.py  --diff  <dumpfile1>  <dumpfile2>  [<typeids.txt>]
 
 By default, typeids.txt is loaded from the same dir as dumpfile.
+With --diff, prints what changed from the first dump to the second one,
+per type and per allocation size class, e.g. to look for leaks.
+
+The dump files are read in chunks, but they are still written by
+rgc.dump_rpy_heap(), which walks the whole heap in one go and blocks the
+process meanwhile.  There is no incremental dump taken between the steps
+of a major collection.
 """
 import sys, array, struct, os
 
@@ -14,12 +22,15 @@ class Stat(object):
     summary = {}
     typeids = {0: '<GCROOT>'}
     BIGOBJ = 65536   # bytes
+    CHUNK = 1024*1024    # words read at once by iter_dump_file()
+    # objects up to this size are allocated by size class in minimarkpage
+    SMALL_REQUEST_THRESHOLD = 35 * struct.calcsize('l')
 
     def summarize(self, filename):
-        a = self.load_dump_file(filename)
         self.summary = {}     # {typenum: [count, totalsize]}
         self.bigobjs = []     # list of individual (size, typenum)
-        for obj in self.walk(a):
+        self.sizeclasses = {} # {size class: [count, totalsize]}
+        for obj in self.iter_dump_file(filename):
             self.add_object_summary(obj[2], obj[3])
 
     def load_typeids(self, filename_or_iter):
@@ -75,6 +86,44 @@ class Stat(object):
         f.close()
         return a
 
+    def iter_dump_file(self, filename):
+        """Like walk(self.load_dump_file(filename)), but reads the file
+        in chunks instead of loading it all in memory first."""
+        f = open(filename, 'rb')
+        try:
+            wordsize = struct.calcsize('l')
+            a = array.array('l')
+            base = 0      # position in the file of a[0], in words
+            i = 0         # start of the current object in 'a'
+            j = 3         # where to go on looking for the -1 that ends it
+            last2 = (0, 0)
+            while True:
+                data = f.read(self.CHUNK * wordsize)
+                if len(data) % wordsize:
+                    raise AssertionError("invalid or truncated dump file "
+                                         "(or 32/64-bit mix)")
+                if not data:
+                    break
+                del a[:i]
+                base += i
+                j -= i
+                i = 0
+                a.fromstring(data)
+                if len(a) >= 2:
+                    last2 = (a[-2], a[-1])
+                while True:
+                    while j < len(a) and a[j] != -1:
+                        j += 1
+                    if j >= len(a):
+                        break    # the object continues in the next chunk
+                    yield (base + i, a[i], a[i+1], a[i+2], a[i+3:j])
+                    i = j + 1
+                    j = i + 3
+            assert i == len(a) and last2[1] == -1 and last2[0] != -1, (
+                "invalid or truncated dump file (or 32/64-bit mix)")
+        finally:
+            f.close()
+
     def add_object_summary(self, typenum, sizeobj):
         if sizeobj >= self.BIGOBJ:
             self.bigobjs.append((sizeobj, typenum))
@@ -84,6 +133,54 @@ class Stat(object):
             stat = self.summary[typenum] = [0, 0]
         stat[0] += 1
         stat[1] += sizeobj
+        sizeclass = self.get_size_class(sizeobj)
+        try:
+            stat = self.sizeclasses[sizeclass]
+        except KeyError:
+            stat = self.sizeclasses[sizeclass] = [0, 0]
+        stat[0] += 1
+        stat[1] += sizeobj
+
+    def get_size_class(self, sizeobj):
+        """Small objects are grouped by their exact (word-aligned) size,
+        like minimarkpage does; larger ones by power of two."""
+        if sizeobj <= self.SMALL_REQUEST_THRESHOLD:
+            return sizeobj
+        sizeclass = self.SMALL_REQUEST_THRESHOLD + 1
+        while sizeclass < sizeobj:
+            sizeclass *= 2
+        return sizeclass
+
+    def get_size_class_name(self, sizeclass):
+        if sizeclass <= self.SMALL_REQUEST_THRESHOLD:
+            return '%d bytes' % (sizeclass,)
+        return '<= %d bytes' % (sizeclass,)
+
+    def diff(self, older):
+        """Compare with the Stat 'older'.  Returns two lists of
+        (delta_totalsize, delta_count, key), sorted by delta_totalsize,
+        where 'key' is the typenum in the first list and the size class
+        in the second one.  Unchanged entries are not listed."""
+        return (_diff_summaries(older.summary, self.summary),
+                _diff_summaries(older.sizeclasses, self.sizeclasses))
+
+    def print_diff(self, older):
+        bytype, bysizeclass = self.diff(older)
+        M = 1024.0*1024.0
+        print 'changes per type:'
+        for dsize, dcount, typenum in bytype:
+            print '%+9d %+9.2fM  %s' % (dcount, dsize / M,
+                                        self.get_type_name(typenum))
+        print
+        print 'changes per size class:'
+        for dsize, dcount, sizeclass in bysizeclass:
+            print '%+9d %+9.2fM  %s' % (dcount, dsize / M,
+                                        self.get_size_class_name(sizeclass))
+        print
+        total = sum([stat[1] for stat in self.summary.values()])
+        oldtotal = sum([stat[1] for stat in older.summary.values()])
+        print 'total %.1fM => %.1fM (%+.1fM)' % (oldtotal / M, total / M,
+                                                 (total - oldtotal) / M)
 
     def walk(self, a, start=0, stop=None):
         assert a[-1] == -1, "invalid or truncated dump file (or 32/64-bit mix)"
@@ -101,21 +198,44 @@ class Stat(object):
         print >> sys.stderr, 'done'
 
 
+def _diff_summaries(oldsummary, newsummary):
+    result = []
+    for key in set(oldsummary) | set(newsummary):
+        oldcount, oldsize = oldsummary.get(key, (0, 0))
+        newcount, newsize = newsummary.get(key, (0, 0))
+        if oldcount != newcount or oldsize != newsize:
+            result.append((newsize - oldsize, newcount - oldcount, key))
+    result.sort()
+    return result
+
+
 if __name__ == '__main__':
-    if len(sys.argv) <= 1:
+    args = sys.argv[1:]
+    older = None
+    if args and args[0] == '--diff':
+        del args[0]
+        if len(args) < 2:
+            print >> sys.stderr, __doc__
+            sys.exit(2)
+        older = Stat()
+        older.summarize(args.pop(0))
+    if len(args) < 1:
         print >> sys.stderr, __doc__
         sys.exit(2)
     stat = Stat()
-    stat.summarize(sys.argv[1])
+    stat.summarize(args[0])
     #
-    if len(sys.argv) > 2:
-        typeid_name = sys.argv[2]
+    if len(args) > 1:
+        typeid_name = args[1]
     else:
-        typeid_name = os.path.join(os.path.dirname(sys.argv[1]), 'typeids.txt')
+        typeid_name = os.path.join(os.path.dirname(args[0]), 'typeids.txt')
     if os.path.isfile(typeid_name):
         stat.load_typeids(typeid_name)
     else:
         import zlib, gc
         stat.load_typeids(zlib.decompress(gc.get_typeids_z()).split("\n"))
     #
-    stat.print_summary()
+    if older is not None:
+        stat.print_diff(older)
+    else:
+        stat.print_summary()
@@ -0,0 +1,63 @@
+import array
+from pypy.tool.gcdump import Stat
+
+
+def write_dump(tmpdir, name, objects):
+    a = array.array('l')
+    for addr, typenum, size, refs in objects:
+        a.extend([addr, typenum, size] + refs + [-1])
+    f = tmpdir.join(name)
+    f.write(a.tostring(), 'wb')
+    return str(f)
+
+OBJECTS = [(1000, 5, 16, []),
+           (0, 0, 0, []),           # end-of-roots marker
+           (2000, 5, 16, [1000]),
+           (3000, 7, 24, [1000, 2000, 4000]),
+           (4000, 7, 100000, [])]
+
+
+def test_iter_dump_file(tmpdir):
+    filename = write_dump(tmpdir, 'dump1', OBJECTS)
+    stat = Stat()
+    expected = list(stat.walk(stat.load_dump_file(filename)))
+    for chunk in [1, 2, 3, 5, 7, 1000]:
+        stat.CHUNK = chunk
+        got = list(stat.iter_dump_file(filename))
+        assert got == expected
+
+def test_iter_dump_file_big_object(tmpdir):
+    # an object spanning many chunks is scanned once, not once per chunk
+    refs = range(1, 5001)
+    objects = [(1000, 5, 16, []), (2000, 9, 40000, refs), (3000, 5, 16, [])]
+    filename = write_dump(tmpdir, 'dump_big', objects)
+    stat = Stat()
+    stat.CHUNK = 4
+    got = list(stat.iter_dump_file(filename))
+    assert [obj[0:4] for obj in got] == [(0, 1000, 5, 16), (4, 2000, 9, 40000),
+                                        (5008, 3000, 5, 16)]
+    assert list(got[1][4]) == refs
+
+def test_summarize(tmpdir):
+    filename = write_dump(tmpdir, 'dump1', OBJECTS)
+    stat = Stat()
+    stat.summarize(filename)
+    assert stat.summary == {0: [1, 0], 5: [2, 32], 7: [2, 100024]}
+    assert stat.bigobjs == [(100000, 7)]
+    large = stat.get_size_class(100000)
+    assert large >= 100000 and large < 200000
+    assert stat.sizeclasses == {0: [1, 0], 16: [2, 32], 24: [1, 24],
+                                large: [1, 100000]}
+
+def test_diff(tmpdir):
+    older = Stat()
+    older.summarize(write_dump(tmpdir, 'dump1', OBJECTS))
+    newer = Stat()
+    newer.summarize(write_dump(tmpdir, 'dump2', OBJECTS[:-1] + [
+        (4000, 7, 100000, []),
+        (5000, 7, 24, []),
+        (6000, 7, 24, [])]))
+    bytype, bysizeclass = newer.diff(older)
+    assert bytype == [(48, 2, 7)]
+    assert bysizeclass == [(48, 2, 24)]
+    assert older.diff(older) == ([], [])
@@ -26,6 +26,7 @@ from rpython.rlib.objectmodel import Symbolic, compute_hash
 class LLAsmInfo(object):
     def __init__(self, lltrace):
         self.ops_offset = None
+        self.asmlen = 0
         self.lltrace = lltrace
 
 class LLTrace(object):
@@ -540,6 +540,8 @@ def send_loop_to_backend(greenkey, jitdriver_sd, metainterp_sd, loop, type,
     finally:
         debug_stop("jit-backend")
     metainterp_sd.profiler.end_backend()
+    if asminfo is not None:
+        original_jitcell_token.asm_size += asminfo.asmlen
     if hooks is not None:
         debug_info.asminfo = asminfo
         hooks.after_compile(debug_info)
@@ -590,6 +592,8 @@ def send_bridge_to_backend(jitdriver_sd, metainterp_sd, faildescr, inputargs,
     finally:
         debug_stop("jit-backend")
     metainterp_sd.profiler.end_backend()
+    if asminfo is not None:
+        original_loop_token.asm_size += asminfo.asmlen
     if hooks is not None:
         debug_info.asminfo = asminfo
         hooks.after_compile_bridge(debug_info)
@@ -2,6 +2,7 @@ import math
 from rpython.rlib.rarithmetic import r_int64
 from rpython.rlib.debug import debug_start, debug_print, debug_stop
 from rpython.rlib.objectmodel import we_are_translated
+from rpython.rlib.listsort import make_timsort_class
 
 #
 # Logic to decide which loops are old and not used any more.
@@ -19,6 +20,14 @@ from rpython.rlib.objectmodel import we_are_translated
 # 'generation' field is much smaller than the current generation, and
 # removed from the set.
 #
+# Independently, if 'max_code_size' is set, the total machine code of
+# the loops in 'alive_loops' is bounded: when it is exceeded, the loops
+# that were least recently entered are removed first.  'asm_size' on the
+# LoopToken is the size of the loop and of all bridges attached to it.
+#
+
+LoopTokenSort = make_timsort_class(
+    lt=lambda token1, token2: token1.generation < token2.generation)
 
 class MemoryManager(object):
 
@@ -37,11 +46,15 @@ class MemoryManager(object):
         # per second
         self.current_generation = r_int64(1)
         self.next_check = r_int64(-1)
+        self.max_age = 0
+        self.max_code_size = 0
         self.alive_loops = {}
 
     def set_max_age(self, max_age, check_frequency=0):
         if max_age <= 0:
-            self.next_check = r_int64(-1)
+            self.max_age = 0
+            if self.max_code_size == 0:
+                self.next_check = r_int64(-1)
         else:
             self.max_age = max_age
             if check_frequency <= 0:
@@ -49,6 +62,19 @@ class MemoryManager(object):
             self.check_frequency = check_frequency
             self.next_check = self.current_generation + 1
 
+    def set_max_code_size(self, max_code_size, check_frequency=0):
+        if max_code_size <= 0:
+            self.max_code_size = 0
+            if self.max_age == 0:
+                self.next_check = r_int64(-1)
+        else:
+            self.max_code_size = max_code_size
+            if check_frequency > 0:
+                self.check_frequency = check_frequency
+            elif self.check_frequency <= 0:
+                self.check_frequency = 32
+            self.next_check = self.current_generation + 1
+
     def next_generation(self):
         self.current_generation += 1
         if self.current_generation == self.next_check:
@@ -66,11 +92,16 @@ class MemoryManager(object):
         #print self.alive_loops.keys()
         debug_print("Current generation:", self.current_generation)
         debug_print("Loop tokens before:", oldtotal)
-        max_generation = self.current_generation - (self.max_age-1)
+        if self.max_age > 0:
+            max_generation = self.current_generation - (self.max_age-1)
+        else:
+            max_generation = 0
         for looptoken in self.alive_loops.keys():
             if (0 <= looptoken.generation < max_generation or
                 looptoken.invalidated):
                 del self.alive_loops[looptoken]
+        if self.max_code_size > 0:
+            self._free_loops_over_code_size()
         newtotal = len(self.alive_loops)
         debug_print("Loop tokens freed: ", oldtotal - newtotal)
         debug_print("Loop tokens left:  ", newtotal)
@@ -82,6 +113,31 @@ class MemoryManager(object):
             rgc.collect(); rgc.collect(); rgc.collect()
         debug_stop("jit-mem-collect")
 
+    def _free_loops_over_code_size(self):
+        code_size = self.get_code_size()
+        debug_print("Machine code before:", code_size)
+        if code_size <= self.max_code_size:
+            return
+        # the loops entered least recently have the smallest generation.
+        # Don't free the loops of the current generation, which may have
+        # been compiled just now.
+        looptokens = self.alive_loops.keys()
+        LoopTokenSort(looptokens).sort()
+        for looptoken in looptokens:
+            if code_size <= self.max_code_size:
+                break
+            if 0 <= looptoken.generation < self.current_generation:
+                del self.alive_loops[looptoken]
+                code_size -= looptoken.asm_size
+        debug_print("Machine code after: ", code_size)
+
+    def get_code_size(self):
+        """Total size of the machine code of the loops kept alive."""
+        code_size = 0
+        for looptoken in self.alive_loops:
+            code_size += looptoken.asm_size
+        return code_size
+
     def release_all_loops(self):
         debug_start("jit-mem-releaseall")
         debug_print("Loop tokens cleared:", len(self.alive_loops))
@@ -21,6 +21,7 @@ from rpython.rlib import rgc
 class FakeLoopToken:
     generation = 0
     invalidated = False
+    asm_size = 0
 
 
 class _TestMemoryManager:
@@ -78,6 +79,41 @@ class _TestMemoryManager:
             else:
                 assert tokens[i] in memmgr.alive_loops
 
+    def test_max_code_size(self):
+        memmgr = MemoryManager()
+        memmgr.set_max_code_size(1000, 1)
+        tokens = [FakeLoopToken() for i in range(10)]
+        for token in tokens:
+            token.asm_size = 300
+            memmgr.keep_loop_alive(token)
+            memmgr.next_generation()
+            assert memmgr.get_code_size() <= 1200
+        assert memmgr.alive_loops == dict.fromkeys(tokens[7:])
+        #
+        # entering a loop again makes it the most recently used one
+        memmgr.keep_loop_alive(tokens[7])
+        token = FakeLoopToken()
+        token.asm_size = 300
+        memmgr.keep_loop_alive(token)
+        memmgr.next_generation()
+        assert memmgr.alive_loops == dict.fromkeys(
+            [tokens[7], tokens[9], token])
+
+    def test_max_code_size_and_max_age(self):
+        memmgr = MemoryManager()
+        memmgr.set_max_code_size(10000, 1)
+        memmgr.set_max_age(4, 1)
+        tokens = [FakeLoopToken() for i in range(10)]
+        for token in tokens:
+            token.asm_size = 300
+            memmgr.keep_loop_alive(token)
+            memmgr.next_generation()
+        assert memmgr.alive_loops == dict.fromkeys(tokens[7:])
+        memmgr.set_max_age(0)
+        assert memmgr.next_check > 0     # still checking the code size
+        memmgr.set_max_code_size(0)
+        assert memmgr.next_check == -1
+
 
 class _TestIntegration(LLJitMixin):
     # See comments in TestMemoryManager.  To get temporarily the normal
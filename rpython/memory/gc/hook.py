@@ -21,6 +21,16 @@ class GcHooks(object):
     def is_gc_collect_enabled(self):
         return False
 
+    def is_gc_alloc_sample_enabled(self):
+        return False
+
+    def get_gc_alloc_sample_interval(self):
+        """
+        Number of bytes allocated in the nursery between two allocation
+        samples.  Read at the end of every minor collection.
+        """
+        return 1024 * 1024
+
     def on_gc_minor(self, duration, total_memory_used, pinned_objects):
         """
         Called after a minor collection
@@ -45,6 +55,21 @@ class GcHooks(object):
         Called after a major collection is fully done
         """
 
+    def on_gc_alloc_sample(self, sample_id, size):
+        """
+        Called when a nursery allocation of ``size`` bytes crosses the next
+        sample point, before the object is initialized.  ``sample_id``
+        numbers the samples in order, starting from 0.  Typically used to
+        record the current stack, e.g. with rvmprof.sample_allocation().
+        """
+
+    def on_gc_alloc_sample_promoted(self, sample_id, survived):
+        """
+        Called once per allocation sample by the next minor collection, in
+        the order of the samples: ``survived`` tells if the sampled object
+        was still alive, i.e. moved out of the nursery or pinned there.
+        """
+
     # the fire_* methods are meant to be called from the GC and should NOT be
     # overridden
 
@@ -68,3 +93,13 @@ class GcHooks(object):
                                arenas_count_before, arenas_count_after,
                                arenas_bytes, rawmalloc_bytes_before,
                                rawmalloc_bytes_after, pinned_objects)
+
+    @rgc.no_collect
+    def fire_gc_alloc_sample(self, sample_id, size):
+        if self.is_gc_alloc_sample_enabled():
+            self.on_gc_alloc_sample(sample_id, size)
+
+    @rgc.no_collect
+    def fire_gc_alloc_sample_promoted(self, sample_id, survived):
+        if self.is_gc_alloc_sample_enabled():
+            self.on_gc_alloc_sample_promoted(sample_id, survived)
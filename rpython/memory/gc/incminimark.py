@@ -9,6 +9,16 @@ Environment variables can be used to fine-tune the following parameters:
  PYPY_GC_NURSERY_DEBUG   If set to non-zero, will fill nursery with garbage,
                          to help debugging.
 
+ PYPY_GC_NURSERY_PAUSE   If set, the nursery size is adapted at run-time
+                         to keep the duration of minor collections below
+                         this many seconds (e.g. '0.002').  The nursery is
+                         shrunk when minor collections take longer, and
+                         grown when they are much faster.  Off by default.
+
+ PYPY_GC_NURSERY_MIN     With PYPY_GC_NURSERY_PAUSE, the minimal and
+ PYPY_GC_NURSERY_MAX     maximal nursery size.  Default to 1/8th and 8
+                         times the initial nursery size.
+
  PYPY_GC_INCREMENT_STEP  The size of memory marked during the marking step.
                          Default is size of nursery * 2. If you mark it too high
                          your GC is not incremental at all. The minimum is set
@@ -191,6 +201,13 @@ STATE_FINALIZING = 3
 
 GC_STATES = ['SCANNING', 'MARKING', 'SWEEPING', 'FINALIZING']
 
+# for the adaptive nursery size (PYPY_GC_NURSERY_PAUSE): the nursery is
+# shrunk when the average fraction of it that survives minor collections
+# is above NURSERY_SURVIVAL_HIGH, and only grown when it is below
+# NURSERY_SURVIVAL_LOW.  See _adapt_nursery_size().
+NURSERY_SURVIVAL_LOW = 0.25
+NURSERY_SURVIVAL_HIGH = 0.75
+
 
 FORWARDSTUB = lltype.GcStruct('forwarding_stub',
                               ('forw', llmemory.Address))
@@ -325,6 +342,23 @@ class IncrementalMiniMarkGC(MovingGCBase):
         self.nursery_top  = llmemory.NULL
         self.debug_tiny_nursery = -1
         self.debug_rotating_nurseries = lltype.nullptr(NURSARRAY)
+        #
+        # Adaptive nursery size: off if 'nursery_pause_budget' is 0.0.
+        # See _adapt_nursery_size().
+        self.nursery_pause_budget = 0.0
+        self.nursery_size_min = 0
+        self.nursery_size_max = 0
+        self.nursery_pause_avg = 0.0
+        self.nursery_survival_avg = 0.0
+        #
+        # Allocation sampling: off if 'alloc_sample_interval' is 0.  When
+        # on, 'nursery_top' is lowered to the next sample point and the
+        # real value is saved in 'sample_nursery_top'.  See
+        # _set_next_alloc_sample().
+        self.alloc_sample_interval = 0
+        self.sample_nursery_top = llmemory.NULL
+        self.alloc_sample_next_id = 0      # id of the next sample taken
+        self.alloc_sample_next_report = 0  # id of the next sample reported
         self.extra_threshold = 0
         #
         # The ArenaCollection() handles the nonmovable objects allocation.
@@ -369,6 +403,12 @@ class IncrementalMiniMarkGC(MovingGCBase):
         # for more details.
         self.size_objects_made_old = r_uint(0)
         self.threshold_objects_made_old = r_uint(0)
+        #
+        # During sweeping, allocating an object of a size class with no
+        # free block left first sweeps at most this number of old pages
+        # of that size class; see _sweep_size_class_lazily().
+        self.lazy_sweep_max_pages = 8
+        self.lazily_swept_pages = 0
 
 
     def setup(self):
@@ -407,6 +447,9 @@ class IncrementalMiniMarkGC(MovingGCBase):
         self.young_objects_with_destructors = self.AddressStack()
         self.old_objects_with_destructors = self.AddressStack()
         #
+        # The young objects whose allocation was sampled.
+        self.young_sampled_objects = self.AddressDeque()
+        #
         # Two lists of the objects with weakrefs.  No weakref can be an
         # old object weakly pointing to a young object: indeed, weakrefs
         # are immutable so they cannot point to an object that was
@@ -508,10 +551,24 @@ class IncrementalMiniMarkGC(MovingGCBase):
                 self.gc_nursery_debug = True
             else:
                 self.gc_nursery_debug = False
+            #
+            nursery_pause = env.read_float_from_env('PYPY_GC_NURSERY_PAUSE')
+            nursery_min = env.read_from_env('PYPY_GC_NURSERY_MIN')
+            if nursery_min <= 0:
+                nursery_min = newsize // 8
+            nursery_max = env.read_from_env('PYPY_GC_NURSERY_MAX')
+            if nursery_max <= 0:
+                nursery_max = newsize * 8
             self._minor_collection()    # to empty the nursery
             llarena.arena_free(self.nursery)
             self.nursery_size = newsize
             self.allocate_nursery()
+            #
+            if nursery_pause > 0.0 and self.debug_tiny_nursery < 0:
+                self.nursery_pause_budget = nursery_pause
+                self.nursery_size_min = max(nursery_min, minsize) & ~(WORD-1)
+                self.nursery_size_max = max(nursery_max,
+                                            self.nursery_size_min) & ~(WORD-1)
         #
         env_max_number_of_pinned_objects = os.environ.get('PYPY_GC_MAX_PINNED')
         if env_max_number_of_pinned_objects:
@@ -525,7 +582,10 @@ class IncrementalMiniMarkGC(MovingGCBase):
         else:
             # Estimate this number conservatively
             bigobj = self.nonlarge_max + 1
-            self.max_number_of_pinned_objects = self.nursery_size / (bigobj * 2)
+            nursery_size = self.nursery_size
+            if self.nursery_pause_budget > 0.0:
+                nursery_size = self.nursery_size_min
+            self.max_number_of_pinned_objects = nursery_size / (bigobj * 2)
 
     def enable(self):
         self.enabled = True
@@ -870,6 +930,17 @@ class IncrementalMiniMarkGC(MovingGCBase):
         major collection, and finally reserve totalsize bytes.
         """
 
+        if self.sample_nursery_top != llmemory.NULL:
+            # 'nursery_top' was lowered by _set_next_alloc_sample(), so
+            # we may only have reached the next sample point.  The caller
+            # has already bumped 'nursery_free' by 'totalsize'.
+            result = self.nursery_free - totalsize
+            self._restore_nursery_top()
+            if self.nursery_free <= self.nursery_top:
+                self._record_alloc_sample(result, totalsize)
+                self._set_next_alloc_sample()
+                return result
+        #
         minor_collection_count = 0
         while True:
             self.nursery_free = llmemory.NULL      # debug: don't use me
@@ -947,9 +1018,35 @@ class IncrementalMiniMarkGC(MovingGCBase):
             if self.nursery_top - self.nursery_free > self.debug_tiny_nursery:
                 self.nursery_free = self.nursery_top - self.debug_tiny_nursery
         #
+        if self.alloc_sample_interval > 0:
+            self._set_next_alloc_sample()
         return result
     collect_and_reserve._dont_inline_ = True
 
+    def _set_next_alloc_sample(self):
+        # Lower 'nursery_top' so that the allocation which crosses the
+        # next sample point ends up in collect_and_reserve().  This costs
+        # nothing on the fast path, including in the JIT-generated code,
+        # which reads 'nursery_top' from memory.
+        if self.nursery_top - self.nursery_free > self.alloc_sample_interval:
+            self.sample_nursery_top = self.nursery_top
+            self.nursery_top = self.nursery_free + self.alloc_sample_interval
+
+    def _restore_nursery_top(self):
+        if self.sample_nursery_top != llmemory.NULL:
+            self.nursery_top = self.sample_nursery_top
+            self.sample_nursery_top = llmemory.NULL
+
+    def _record_alloc_sample(self, result, totalsize):
+        # 'result' is not initialized yet; we only look at the object
+        # again during the next minor collection.
+        obj = result + self.gcheaderbuilder.size_gc_header
+        self.young_sampled_objects.append(obj)
+        sample_id = self.alloc_sample_next_id
+        self.alloc_sample_next_id = sample_id + 1
+        self.hooks.fire_gc_alloc_sample(sample_id, raw_malloc_usage(totalsize))
+    _record_alloc_sample._dont_inline_ = True
+
 
     # XXX kill alloc_young and make it always True
     def external_malloc(self, typeid, length, alloc_young):
@@ -1107,6 +1204,7 @@ class IncrementalMiniMarkGC(MovingGCBase):
         if self.next_major_collection_threshold < 0:
             # cannot trigger a full collection now, but we can ensure
             # that one will occur very soon
+            self._restore_nursery_top()
             self.nursery_free = self.nursery_top
 
     def can_optimize_clean_setarrayitems(self):
@@ -1867,6 +1965,8 @@ class IncrementalMiniMarkGC(MovingGCBase):
             self.invalidate_young_weakrefs()
         if self.young_objects_with_destructors.non_empty():
             self.deal_with_young_objects_with_destructors()
+        if self.young_sampled_objects.non_empty():
+            self.count_promoted_alloc_samples()
         #
         # Clear this mapping.  Without pinned objects we just clear the dict
         # as all objects in the nursery are dragged out of the nursery and, if
@@ -1945,6 +2045,12 @@ class IncrementalMiniMarkGC(MovingGCBase):
         #
         self.nursery_free = self.nursery
         self.nursery_top = self.nursery_barriers.popleft()
+        self.sample_nursery_top = llmemory.NULL
+        if self.hooks.is_gc_alloc_sample_enabled():
+            self.alloc_sample_interval = max(
+                self.hooks.get_gc_alloc_sample_interval(), 0)
+        else:
+            self.alloc_sample_interval = 0
         #
         # clear GCFLAG_PINNED_OBJECT_PARENT_KNOWN from all parents in the list.
         self.old_objects_pointing_to_pinned.foreach(
@@ -1972,6 +2078,59 @@ class IncrementalMiniMarkGC(MovingGCBase):
             duration=duration,
             total_memory_used=total_memory_used,
             pinned_objects=self.pinned_objects_in_nursery)
+        if self.nursery_pause_budget > 0.0:
+            self._adapt_nursery_size(duration)
+
+    def _adapt_nursery_size(self, duration):
+        # Called at the end of a minor collection if PYPY_GC_NURSERY_PAUSE
+        # is set.  The time taken by a minor collection is mostly spent
+        # copying the surviving objects, so we assume that it grows at
+        # most linearly with the nursery size.  We keep running averages
+        # of the duration and of the fraction of the nursery that
+        # survives.  We halve the nursery if the average duration is above
+        # the budget, or if most of the nursery survives: then a bigger
+        # nursery would not let more objects die young, it would only
+        # make the pauses longer.  We double it if few objects survive,
+        # i.e. a bigger nursery is likely to save work, and the pauses
+        # would still fit in the budget.  The nursery can only be
+        # replaced if it contains no pinned object.
+        self.nursery_pause_avg = (0.75 * self.nursery_pause_avg +
+                                  0.25 * duration)
+        survival = (float(self.nursery_surviving_size) /
+                    float(self.nursery_size))
+        self.nursery_survival_avg = (0.75 * self.nursery_survival_avg +
+                                     0.25 * survival)
+        if (self.nursery_barriers.non_empty() or
+                self.nursery_free != self.nursery or
+                self.debug_rotating_nurseries):
+            return
+        budget = self.nursery_pause_budget
+        newsize = self.nursery_size
+        if (self.nursery_pause_avg > budget or
+                self.nursery_survival_avg >= NURSERY_SURVIVAL_HIGH):
+            newsize = max(newsize // 2, self.nursery_size_min)
+        elif (self.nursery_survival_avg <= NURSERY_SURVIVAL_LOW and
+                self.nursery_pause_avg * 2.0 <= budget):
+            newsize = min(newsize * 2, self.nursery_size_max)
+        newsize &= ~(WORD-1)
+        if newsize != self.nursery_size:
+            # the averages are for the old size: scale them accordingly
+            self.nursery_pause_avg = (self.nursery_pause_avg * newsize /
+                                      self.nursery_size)
+            self._resize_nursery(newsize)
+
+    def _resize_nursery(self, newsize):
+        # The nursery must be empty.  Replace it with a new one.
+        debug_start("gc-set-nursery-size")
+        debug_print("nursery size:", newsize, "(was", self.nursery_size, ")")
+        debug_print("average minor collection time:", self.nursery_pause_avg)
+        debug_print("average surviving fraction:", self.nursery_survival_avg)
+        llarena.arena_free(self.nursery)
+        self.nursery_size = newsize
+        self.nursery = self._alloc_nursery()
+        self.nursery_free = self.nursery
+        self.nursery_top = self.nursery + self.nursery_size
+        debug_stop("gc-set-nursery-size")
 
     def _reset_flag_old_objects_pointing_to_pinned(self, obj, ignore):
         ll_assert(self.header(obj).tid & GCFLAG_PINNED_OBJECT_PARENT_KNOWN != 0,
@@ -2304,12 +2463,27 @@ class IncrementalMiniMarkGC(MovingGCBase):
         if (r_uint(raw_malloc_usage(totalsize)) <=
             r_uint(self.small_request_threshold)):
             # most common path
+            if (self.gc_state == STATE_SWEEPING and
+                    not self.ac.has_free_block(totalsize)):
+                self._sweep_size_class_lazily(totalsize)
             return self.ac.malloc(totalsize)
         else:
             # for nursery objects that are not small
             return self._malloc_out_of_nursery_nonsmall(totalsize)
     _malloc_out_of_nursery._always_inline_ = True
 
+    def _sweep_size_class_lazily(self, totalsize):
+        # We are sweeping and the ArenaCollection has no free block ready
+        # for this size: sweep some old pages of the same size class now
+        # rather than starting a new page.  Freed blocks are reused
+        # immediately, and this is work that the next STATE_SWEEPING
+        # steps don't have to do any more.
+        npages = self.ac.mass_free_size_class(totalsize,
+                                              self._free_if_unvisited,
+                                              self.lazy_sweep_max_pages)
+        self.lazily_swept_pages += npages
+    _sweep_size_class_lazily._dont_inline_ = True
+
     def _malloc_out_of_nursery_nonsmall(self, totalsize):
         if r_uint(raw_malloc_usage(totalsize)) > r_uint(self.nursery_size):
             out_of_memory("memory corruption: bad size for object in the "
@@ -2511,6 +2685,7 @@ class IncrementalMiniMarkGC(MovingGCBase):
                     self.deal_with_old_objects_with_destructors()
                 # objects_to_trace processed fully, can move on to sweeping
                 self.ac.mass_free_prepare()
+                self.lazily_swept_pages = 0
                 self.start_free_rawmalloc_objects()
                 #
                 # get rid of objects pointing to pinned objects that were not
@@ -2555,6 +2730,8 @@ class IncrementalMiniMarkGC(MovingGCBase):
                                                      limit)
                 status = done and "No more pages left." or "More to do."
                 debug_print("freeing GC objects, up to", limit, "pages.", status)
+                debug_print("pages swept lazily by malloc so far:",
+                            self.lazily_swept_pages)
             # XXX tweak the limits above
             #
             if done:
@@ -2583,6 +2760,8 @@ class IncrementalMiniMarkGC(MovingGCBase):
                             self.ac.arenas_count)
                 debug_print("bytes used in arenas: ",
                             self.ac.total_memory_used)
+                debug_print("pages swept lazily:   ",
+                            self.lazily_swept_pages)
                 debug_print("bytes raw-malloced:   ",
                             self.stat_rawmalloced_total_size, " => ",
                             self.rawmalloced_total_size)
@@ -2878,6 +3057,25 @@ class IncrementalMiniMarkGC(MovingGCBase):
     def identityhash(self, gcobj):
         return mangle_hash(self.id_or_identityhash(gcobj))
 
+    def count_promoted_alloc_samples(self):
+        """Report for each sampled young object, in the order of the
+        samples, whether it survived the minor collection.  Must be called
+        before the nursery is cleared: a surviving pinned object is not
+        forwarded, but still has GCFLAG_VISITED."""
+        count = 0
+        survivors = 0
+        while self.young_sampled_objects.non_empty():
+            obj = self.young_sampled_objects.popleft()
+            sample_id = self.alloc_sample_next_report
+            self.alloc_sample_next_report = sample_id + 1
+            count += 1
+            survived = (self.is_forwarded(obj) or
+                        bool(self.header(obj).tid & GCFLAG_VISITED))
+            if survived:
+                survivors += 1
+            self.hooks.fire_gc_alloc_sample_promoted(sample_id, survived)
+        debug_print("sampled allocations promoted:", survivors, "of", count)
+
     # ----------
     # Finalizers
 
@@ -137,6 +137,11 @@ class ArenaCollection(object):
         # part of current_arena might still contain uninitialized pages
         self.num_uninitialized_pages = 0
         #
+        # during an incremental mass_free, the highest size class that
+        # still has pages in 'old_page_for_size' or
+        # 'old_full_page_for_size'; or -1 if there is no mass_free running
+        self.size_class_with_old_pages = -1
+        #
         # the total memory used, counting every block in use, without
         # the additional bookkeeping stuff.
         self.total_memory_used = r_uint(0)
@@ -374,6 +379,38 @@ class ArenaCollection(object):
         return True
 
 
+    def has_free_block(self, size):
+        """Return True if malloc(size) can use a page already in
+        'page_for_size'.  Cheap enough to check before every call to
+        mass_free_size_class()."""
+        nsize = llmemory.raw_malloc_usage(size)
+        size_class = nsize >> WORD_POWER_2
+        return self.page_for_size[size_class] != PAGE_NULL
+    has_free_block._always_inline_ = True
+
+    def mass_free_size_class(self, size, ok_to_free_func, max_pages):
+        """Called during an incremental mass_free before malloc(size).
+        If there is no page with a free block for this size, walk the
+        old pages of the same size class first, stopping as soon as one
+        of them has room again or after 'max_pages' pages.  This reuses
+        the blocks freed in these pages instead of taking a new page,
+        and it is sweeping work that mass_free_incremental() won't have
+        to do any more.  Returns the number of pages walked.
+        """
+        nsize = llmemory.raw_malloc_usage(size)
+        size_class = nsize >> WORD_POWER_2
+        if size_class > self.size_class_with_old_pages:
+            return 0     # this size class is already fully swept
+        npages = 0
+        while (self.page_for_size[size_class] == PAGE_NULL and
+               npages < max_pages and
+               (self.old_full_page_for_size[size_class] != PAGE_NULL or
+                self.old_page_for_size[size_class] != PAGE_NULL)):
+            self.mass_free_in_pages(size_class, ok_to_free_func, 1)
+            npages += 1
+        return npages
+
+
     def mass_free(self, ok_to_free_func):
         """For each object, if ok_to_free_func(obj) returns True, then free
         the object.
@@ -53,6 +53,12 @@ class SimpleArenaCollection(object):
                 return False
         return True
 
+    def has_free_block(self, size):
+        return True
+
+    def mass_free_size_class(self, size, ok_to_free_func, max_pages):
+        return 0
+
     def mass_free(self, ok_to_free_func):
         self.mass_free_prepare()
         res = self.mass_free_incremental(ok_to_free_func, sys.maxint)
@@ -855,6 +855,77 @@ class TestIncrementalMiniMarkGCFull(DirectGCTest):
             (incminimark.STATE_FINALIZING, incminimark.STATE_SCANNING)
             ]
 
+    def test_adaptive_nursery_size(self):
+        gc = self.gc
+        size0 = gc.nursery_size
+        gc.nursery_pause_budget = 1.0
+        gc.nursery_size_min = size0 // 2
+        gc.nursery_size_max = size0 * 4
+        gc._minor_collection()
+        # fast minor collections: the nursery grows up to the maximum
+        for i in range(10):
+            gc._adapt_nursery_size(0.0)
+        assert gc.nursery_size == size0 * 4
+        assert gc.nursery_top == gc.nursery + size0 * 4
+        # slow minor collections: it shrinks down to the minimum
+        for i in range(20):
+            gc._adapt_nursery_size(10.0)
+        assert gc.nursery_size == size0 // 2
+        # no resizing while there are pinned objects in the nursery
+        s = self.malloc(STR, 1)
+        self.stackroots.append(s)
+        assert gc.pin(llmemory.cast_ptr_to_adr(s))
+        gc._minor_collection()
+        for i in range(10):
+            gc._adapt_nursery_size(0.0)
+        assert gc.nursery_size == size0 // 2
+        gc.unpin(llmemory.cast_ptr_to_adr(s))
+
+    def test_adaptive_nursery_size_survival(self):
+        gc = self.gc
+        size0 = gc.nursery_size
+        gc.nursery_pause_budget = 1.0
+        gc.nursery_size_min = size0 // 4
+        gc.nursery_size_max = size0 * 4
+        gc._minor_collection()
+        # most of the nursery survives: it shrinks, even with fast pauses
+        gc.nursery_survival_avg = 1.0
+        gc.nursery_surviving_size = size0 * 4
+        for i in range(10):
+            gc._adapt_nursery_size(0.0)
+        assert gc.nursery_size == size0 // 4
+        # half of it survives: it is left alone
+        gc.nursery_survival_avg = 0.5
+        gc.nursery_surviving_size = (size0 // 4) // 2
+        for i in range(10):
+            gc._adapt_nursery_size(0.0)
+        assert gc.nursery_size == size0 // 4
+        # little survives: it grows
+        gc.nursery_surviving_size = 0
+        for i in range(20):
+            gc._adapt_nursery_size(0.0)
+        assert gc.nursery_size == size0 * 4
+
+    def test_adaptive_nursery_size_keeps_objects(self):
+        gc = self.gc
+        gc.nursery_pause_budget = 1.0
+        gc.nursery_size_min = gc.nursery_size
+        gc.nursery_size_max = gc.nursery_size * 8
+        # only one object out of ten survives, so the nursery grows
+        for i in range(1000):
+            p = self.malloc(S)
+            p.x = i
+            if i % 10 == 0:
+                if self.stackroots:
+                    self.write(p, 'next', self.stackroots.pop())
+                self.stackroots.append(p)
+        assert gc.nursery_size == gc.nursery_size_max
+        gc.collect()
+        p = self.stackroots[0]
+        for i in reversed(range(0, 1000, 10)):
+            assert p.x == i
+            p = p.next
+
     def test_gc_debug_crash_with_prebuilt_objects(self):
         from rpython.rlib import rgc
         flags = self.flags
@@ -1,6 +1,6 @@
 from rpython.rtyper.lltypesystem import lltype, llmemory
 from rpython.memory.gc.hook import GcHooks
-from rpython.memory.gc.test.test_direct import BaseDirectGCTest, S
+from rpython.memory.gc.test.test_direct import BaseDirectGCTest, S, STR
 
 
 class MyGcHooks(GcHooks):
@@ -10,6 +10,8 @@ class MyGcHooks(GcHooks):
         self._gc_minor_enabled = False
         self._gc_collect_step_enabled = False
         self._gc_collect_enabled = False
+        self._gc_alloc_sample_enabled = False
+        self._gc_alloc_sample_interval = 0
         self.reset()
 
     def is_gc_minor_enabled(self):
@@ -21,11 +23,19 @@ class MyGcHooks(GcHooks):
     def is_gc_collect_enabled(self):
         return self._gc_collect_enabled
 
+    def is_gc_alloc_sample_enabled(self):
+        return self._gc_alloc_sample_enabled
+
+    def get_gc_alloc_sample_interval(self):
+        return self._gc_alloc_sample_interval
+
     def reset(self):
         self.minors = []
         self.steps = []
         self.collects = []
         self.durations = []
+        self.samples = []
+        self.promoted = []
 
     def on_gc_minor(self, duration, total_memory_used, pinned_objects):
         self.durations.append(duration)
@@ -53,6 +63,12 @@ class MyGcHooks(GcHooks):
             'pinned_objects': pinned_objects,
         })
 
+    def on_gc_alloc_sample(self, sample_id, size):
+        self.samples.append((sample_id, size))
+
+    def on_gc_alloc_sample_promoted(self, sample_id, survived):
+        self.promoted.append((sample_id, survived))
+
 
 class TestIncMiniMarkHooks(BaseDirectGCTest):
     from rpython.memory.gc.incminimark import IncrementalMiniMarkGC as GCClass
@@ -129,3 +145,66 @@ class TestIncMiniMarkHooks(BaseDirectGCTest):
         assert self.gc.hooks.minors == []
         assert self.gc.hooks.steps == []
         assert self.gc.hooks.collects == []
+
+    def test_on_gc_alloc_sample(self):
+        self.gc.hooks._gc_alloc_sample_enabled = True
+        self.gc.hooks._gc_alloc_sample_interval = self.size_of_S
+        self.gc._minor_collection()
+        assert self.gc.alloc_sample_interval == self.size_of_S
+        #
+        # sampling starts at the next overflow of the nursery
+        n = self.gc.nursery_size // self.size_of_S
+        for i in range(n + 1):
+            self.malloc(S)
+        assert self.gc.sample_nursery_top != llmemory.NULL
+        self.gc.hooks.reset()
+        #
+        # allocate until just before the next minor collection, keeping
+        # every other sampled object alive
+        samples = self.gc.hooks.samples
+        expected = []
+        for i in range(n - 2):
+            p = self.malloc(S)
+            if len(samples) > len(expected):
+                keep = len(expected) % 2 == 0
+                if keep:
+                    self.stackroots.append(p)
+                expected.append((samples[-1][0], keep))
+        assert len(samples) >= 2
+        first_id = samples[0][0]
+        assert samples == [(first_id + i, self.size_of_S)
+                           for i in range(len(samples))]
+        assert self.gc.hooks.promoted == []
+        #
+        self.gc._minor_collection()
+        assert self.gc.hooks.promoted == expected
+        assert self.gc.sample_nursery_top == llmemory.NULL
+
+    def test_alloc_sample_pinned(self):
+        self.gc.hooks._gc_alloc_sample_enabled = True
+        self.gc.hooks._gc_alloc_sample_interval = self.size_of_S
+        self.gc._minor_collection()
+        for i in range(self.gc.nursery_size // self.size_of_S + 1):
+            self.malloc(S)
+        self.gc._minor_collection()
+        self.gc.hooks.reset()
+        #
+        # a sampled object which stays pinned in the nursery survives
+        samples = self.gc.hooks.samples
+        while not samples:
+            p = self.malloc(STR, 1)
+        assert self.gc.pin(llmemory.cast_ptr_to_adr(p))
+        self.stackroots.append(p)
+        self.gc._minor_collection()
+        assert self.gc.is_in_nursery(llmemory.cast_ptr_to_adr(p))
+        [(sample_id, size)] = samples
+        assert self.gc.hooks.promoted == [(sample_id, True)]
+
+    def test_alloc_sample_disabled(self):
+        self.gc.hooks._gc_alloc_sample_interval = self.size_of_S * 10
+        self.gc._minor_collection()
+        assert self.gc.alloc_sample_interval == 0
+        for i in range(self.gc.nursery_size // self.size_of_S + 1):
+            self.malloc(S)
+        assert self.gc.hooks.samples == []
+        assert self.gc.sample_nursery_top == llmemory.NULL
@@ -400,6 +400,49 @@ def test_mass_free_half_page_becomes_more_free():
     assert freepages(ac) == NULL
     assert ac.full_page_for_size[2] == PAGE_NULL
 
+def test_mass_free_size_class():
+    pagesize = hdrsize + 9*WORD
+    ac = arena_collection_for_test(pagesize, "##", fill_with_objects=2)
+    ok_to_free = OkToFree(ac, lambda addr: addr - ac._startpageaddr ==
+                                               pagesize + hdrsize + 2*WORD)
+    ac.mass_free_prepare()
+    assert ac.page_for_size[2] == PAGE_NULL
+    assert not ac.has_free_block(2*WORD)
+    # a different size class has no old page: nothing to do
+    res = ac.mass_free_size_class(3*WORD, ok_to_free, 10)
+    assert res == 0
+    # the first page walked remains full, the second one gets a free block
+    res = ac.mass_free_size_class(2*WORD, ok_to_free, 10)
+    assert res == 2
+    page = getpage(ac, 1)
+    assert page == ac.page_for_size[2]
+    assert page.nfree == 1
+    assert getpage(ac, 0) == ac.full_page_for_size[2]
+    assert ac.old_full_page_for_size[2] == PAGE_NULL
+    # there is now a page with room: no more sweeping
+    assert ac.has_free_block(2*WORD)
+    res = ac.mass_free_size_class(2*WORD, ok_to_free, 10)
+    assert res == 0
+    obj = ac.malloc(2*WORD)
+    chkob(ac, 1, 2*WORD, obj)
+    # the rest of the incremental mass_free doesn't walk the pages again
+    assert ac.mass_free_incremental(ok_to_free, 10)
+    assert len(ok_to_free.seen) == 8
+    res = ac.mass_free_size_class(2*WORD, ok_to_free, 10)
+    assert res == 0
+
+def test_mass_free_size_class_max_pages():
+    pagesize = hdrsize + 9*WORD
+    ac = arena_collection_for_test(pagesize, "###", fill_with_objects=2)
+    ok_to_free = OkToFree(ac, False)
+    ac.mass_free_prepare()
+    res = ac.mass_free_size_class(2*WORD, ok_to_free, 2)
+    assert res == 2
+    assert ac.page_for_size[2] == PAGE_NULL
+    assert ac.old_full_page_for_size[2] != PAGE_NULL
+    assert ac.mass_free_incremental(ok_to_free, 10)
+    assert len(ok_to_free.seen) == 12
+
 # ____________________________________________________________
 
 def test_random(incremental=False):
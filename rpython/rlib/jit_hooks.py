@@ -132,6 +132,10 @@ def stats_asmmemmgr_used(warmrunnerdesc):
 def stats_memmgr_release_all(warmrunnerdesc):
     warmrunnerdesc.memory_manager.release_all_loops()
 
+@register_helper(annmodel.SomeInteger())
+def stats_memmgr_code_size(warmrunnerdesc):
+    return warmrunnerdesc.memory_manager.get_code_size()
+
 # ---------------------- jitcell interface ----------------------
 
 def _new_hook(name, resulttype):
@@ -4,7 +4,7 @@ from rpython.rlib.unroll import unrolling_iterable
 from rpython.rlib.rsre import rsre_char, rsre_constants as consts
 from rpython.tool.sourcetools import func_with_new_name
 from rpython.rlib.objectmodel import we_are_translated, not_rpython
-from rpython.rlib import jit
+from rpython.rlib import jit, rutf8
 from rpython.rlib.rsre.rsre_jit import install_jitdriver, install_jitdriver_spec
 
 _seen_specname = {}
@@ -51,10 +51,17 @@ class EndOfString(Exception):
     pass
 
 class CompiledPattern(object):
-    _immutable_fields_ = ['pattern[*]', 'flags']
+    _immutable_fields_ = ['pattern[*]', 'flags', 'dfa?', 'dfa_built?',
+                          'required_literal?', 'required_literal_built?']
 
     def __init__(self, pattern, flags):
         self.pattern = pattern
+        # computed lazily by get_required_literal()
+        self.required_literal = None
+        self.required_literal_built = False
+        # built lazily by rsre_dfa.get_dfa()
+        self.dfa = None
+        self.dfa_built = False
         if not consts.V37:      # 'flags' is ignored in >=3.7 mode
             self.flags = flags
         # check we don't get the old value of MAXREPEAT
@@ -229,6 +236,23 @@ class AbstractMatchContext(object):
     def fresh_copy(self, start):
         raise NotImplementedError
 
+    def find_literal(self, required, position):
+        """Return the position of the first occurrence of the
+        RequiredLiteral at or after 'position', or 'self.end'."""
+        codes = required.codes
+        while position < self.end:
+            ptr = position
+            i = 0
+            while i < len(codes) and ptr < self.end:
+                if self.str(ptr) != codes[i]:
+                    break
+                ptr = self.next(ptr)
+                i += 1
+            if i == len(codes):
+                return position
+            position = self.next(position)
+        return self.end
+
 class FixedMatchContext(AbstractMatchContext):
     """Abstract subclass to introduce the default implementation for
     these position methods.  The Utf8MatchContext subclass doesn't
@@ -297,6 +321,15 @@ class StrMatchContext(FixedMatchContext):
     def get_single_byte(self, base_position, index):
         return self.str(base_position + index)
 
+    def find_literal(self, required, position):
+        if required.as_bytes is None:
+            return self.end
+        assert position >= 0
+        found = self._string.find(required.as_bytes, position, self.end)
+        if found < 0:
+            return self.end
+        return found
+
     def _real_pos(self, index):
         return index     # overridden by tests
 
@@ -1303,6 +1336,8 @@ def search_context(ctx, pattern):
         base += 1 + pattern.pat(1)
     if pattern.pat(base) == consts.OPCODE_LITERAL:
         return literal_search(ctx, pattern, base)
+    if get_required_literal(pattern) is not None:
+        return required_literal_search(ctx, pattern, base)
     if charset:
         return charset_search(ctx, pattern, base)
     return regular_search(ctx, pattern, base)
@@ -1325,6 +1360,54 @@ def regular_search(ctx, pattern, base):
         start = ctx.next_indirect(start)
     return False
 
+install_jitdriver('RequiredLiteralSearch',
+                  greens=['base', 'pattern'],
+                  reds=['start', 'found', 'ctx'],
+                  debugprint=(1, 0))
+
+def required_literal_search(ctx, pattern, base):
+    # the pattern contains a literal string that every match contains,
+    # at a distance from the start of the match between min_offset and
+    # max_offset characters.  Only try to match where such an occurrence
+    # of the literal is possible.
+    start = ctx.match_start
+    found = ctx.find_literal(get_required_literal(pattern), start)
+    if found >= ctx.end:
+        return False
+    while True:
+        ctx.jitdriver_RequiredLiteralSearch.jit_merge_point(ctx=ctx,
+                pattern=pattern, start=start, found=found, base=base)
+        required = get_required_literal(pattern)
+        # 'last' is the last start of a match that could contain the
+        # occurrence of the literal at 'found'
+        try:
+            last = ctx.prev_n(found, required.min_offset, ctx.ZERO)
+            usable = start <= last
+        except EndOfString:
+            usable = False
+        if not usable:
+            nextpos = ctx.next(found)
+            if nextpos < start:
+                nextpos = start
+            found = ctx.find_literal(required, nextpos)
+            if found >= ctx.end:
+                return False
+            continue
+        if required.max_offset >= 0:
+            try:
+                first = ctx.prev_n(found, required.max_offset, ctx.ZERO)
+            except EndOfString:
+                pass
+            else:
+                if first > start:
+                    start = first
+        if sre_match(ctx, pattern, base, start, None) is not None:
+            ctx.match_start = start
+            return True
+        if start >= ctx.end:
+            return False
+        start = ctx.next_indirect(start)
+
 install_jitdriver_spec("LiteralSearch",
                        greens=['base', 'character', 'pattern'],
                        reds=['start', 'ctx'],
@@ -1420,3 +1503,123 @@ def fast_search(ctx, pattern):
         string_position = ctx.next(string_position)
         if string_position >= ctx.end:
             return False
+
+# ____________________________________________________________
+
+class RequiredLiteral(object):
+    """A string that every match of a pattern contains, starting between
+    'min_offset' and 'max_offset' characters after the start of the match.
+    'max_offset' is -1 if there is no upper bound."""
+    _immutable_fields_ = ['codes', 'min_offset', 'max_offset',
+                          'as_bytes', 'as_utf8']
+
+    def __init__(self, codes, min_offset, max_offset):
+        self.codes = codes
+        self.min_offset = min_offset
+        self.max_offset = max_offset
+        # the literal in a byte string, or None if it contains characters
+        # that cannot be in one
+        self.as_bytes = None
+        for code in codes:
+            if code > 255:
+                break
+        else:
+            self.as_bytes = ''.join([chr(code) for code in codes])
+        self.as_utf8 = ''.join([rutf8.unichr_as_utf8(code, True)
+                                for code in codes])
+
+def get_required_literal(pattern):
+    """Return the RequiredLiteral of the pattern, or None."""
+    # 'required_literal' and 'required_literal_built' are quasi-immutable
+    if not pattern.required_literal_built:
+        _build_required_literal(pattern)
+    return pattern.required_literal
+
+@jit.dont_look_inside
+def _build_required_literal(pattern):
+    pattern.required_literal = _find_required_literal(pattern)
+    pattern.required_literal_built = True
+
+def _find_required_literal(pattern):
+    # look for the longest run of LITERALs in the sequence of opcodes at
+    # the top level of the pattern; all of them are part of every match
+    code = pattern.pattern
+    p = 0
+    if code[0] == consts.OPCODE_INFO:
+        if code[2] & consts.SRE_INFO_PREFIX:
+            return None       # fast_search() is used
+        p = 1 + code[1]
+    min_offset = 0
+    max_offset = 0
+    run = []
+    run_min = run_max = 0
+    best = None
+    while True:
+        op = code[p]
+        if op == consts.OPCODE_LITERAL:
+            if not run:
+                run_min = min_offset
+                run_max = max_offset
+            run.append(code[p + 1])
+            p += 2
+            min_offset += 1
+            if max_offset >= 0:
+                max_offset += 1
+            continue
+        if op == consts.OPCODE_MARK:
+            p += 2
+            continue
+        if run:
+            if best is None or len(run) > len(best.codes):
+                best = RequiredLiteral(run, run_min, run_max)
+            run = []
+        if (op == consts.OPCODE_NOT_LITERAL or
+                op == consts.OPCODE_LITERAL_IGNORE or
+                op == consts.OPCODE_NOT_LITERAL_IGNORE or
+                consts.eq(op, consts.OPCODE37_LITERAL_UNI_IGNORE) or
+                consts.eq(op, consts.OPCODE37_NOT_LITERAL_UNI_IGNORE) or
+                consts.eq(op, consts.OPCODE37_LITERAL_LOC_IGNORE) or
+                consts.eq(op, consts.OPCODE37_NOT_LITERAL_LOC_IGNORE) or
+                op == consts.OPCODE_CATEGORY):
+            width = 1
+            p += 2
+        elif op == consts.OPCODE_ANY or op == consts.OPCODE_ANY_ALL:
+            width = 1
+            p += 1
+        elif (op == consts.OPCODE_IN or
+                op == consts.OPCODE_IN_IGNORE or
+                consts.eq(op, consts.OPCODE37_IN_UNI_IGNORE) or
+                consts.eq(op, consts.OPCODE37_IN_LOC_IGNORE)):
+            width = 1
+            p += 1 + code[p + 1]
+        elif op == consts.OPCODE_AT:
+            width = 0
+            p += 2
+        elif (op == consts.OPCODE_REPEAT_ONE or
+                op == consts.OPCODE_MIN_REPEAT_ONE):
+            # the item is a single character
+            min_offset += code[p + 2]
+            if code[p + 3] == rsre_char.MAXREPEAT:
+                max_offset = -1
+            elif max_offset >= 0:
+                max_offset += code[p + 3]
+            p += 1 + code[p + 1]
+            continue
+        elif op == consts.OPCODE_BRANCH:
+            q = p + 1
+            while code[q]:
+                q += code[q]
+            width = -1
+            p = q + 1
+        elif op == consts.OPCODE_REPEAT:
+            width = -1
+            p += 2 + code[p + 1]
+        else:
+            # SUCCESS, or something we don't know how to skip
+            return best
+        if width < 0:
+            max_offset = -1
+        else:
+            min_offset += width
+            if max_offset >= 0:
+                max_offset += width
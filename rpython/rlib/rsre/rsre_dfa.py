@@ -0,0 +1,675 @@
+"""
+A lazily built DFA that runs in front of the backtracking matcher.
+
+For patterns without backreferences, lookarounds or anchors in the middle,
+the compiled code describes a regular language.  We turn it into a Thompson
+NFA, and build the states of the equivalent DFA on demand, as the input
+requires them.  The DFA can answer "is there a match starting at this
+position?" and "where does the earliest match end?" in linear time, which
+is enough to find the position where rsre_core.search_context() would find
+its match.  The actual match, with its groups, is then done by sre_match()
+at that position only.  This removes the cost of trying sre_match() at
+every position of a string, and avoids catastrophic backtracking on
+patterns like '(a+)+b' when they do not match.
+
+The DFA is cached on the CompiledPattern.  If a pattern needs too many
+states, the DFA gives up and we fall back to rsre_core for good.
+
+A PatternSet puts the NFAs of several patterns side by side, and tells in
+a single pass over the string which of the patterns match.
+"""
+
+from rpython.rlib import jit
+from rpython.rlib.rsre import rsre_char, rsre_core, rsre_constants as consts
+from rpython.rlib.rsre.rsre_core import specializectx, MODE_ANY
+
+
+# the NFA is not built for patterns that compile to more nodes than this
+MAX_NFA_NODES = 1000
+# the DFA gives up when one of its caches needs more states than this
+MAX_DFA_STATES = 1000
+# transitions are not cached any more for a state with that many of them
+MAX_TRANSITIONS = 4096
+
+NODE_CHAR = 0       # consumes one character, if it matches 'arg'
+NODE_SPLIT = 1      # epsilon transitions to 'out1' and 'out2'
+NODE_MATCH = 2
+
+# results of the dfa_*() functions; DEAD is also the state reached when
+# no match is possible any more
+FOUND = 0
+DEAD = -1
+GAVE_UP = -2
+_MISSING = -3
+
+
+class Unsupported(Exception):
+    pass
+
+
+class NFA(object):
+    """ The nodes of the Thompson NFA of one or several patterns, stored as
+    parallel lists.  'arg' is the position in its pattern of the opcode
+    that a NODE_CHAR node must match, or the number of the pattern for a
+    NODE_MATCH node. """
+
+    def __init__(self):
+        self.pattern = None      # the pattern being built
+        self.kinds = []
+        self.args = []
+        self.outs1 = []
+        self.outs2 = []
+        self.node_patterns = []
+        # for each pattern: its start node
+        self.starts = []
+        # for each pattern: True if it starts with '^' or '\A'
+        self.begin_anchors = []
+        # for each pattern: AT_END or AT_END_STRING if it ends with '$'
+        # or '\Z', and -1 otherwise
+        self.end_atcodes = []
+        # True if a pattern contains a REPEAT (a repetition of something
+        # that is not a single character)
+        self.has_general_repeat = False
+
+    def new_node(self, kind, arg, out1, out2):
+        if len(self.kinds) >= MAX_NFA_NODES:
+            raise Unsupported
+        self.kinds.append(kind)
+        self.args.append(arg)
+        self.outs1.append(out1)
+        self.outs2.append(out2)
+        self.node_patterns.append(self.pattern)
+        return len(self.kinds) - 1
+
+    def truncate(self, size):
+        # forget the nodes of a pattern that failed to build
+        del self.kinds[size:]
+        del self.args[size:]
+        del self.outs1[size:]
+        del self.outs2[size:]
+        del self.node_patterns[size:]
+
+    def pat(self, index):
+        if index >= len(self.pattern.pattern):
+            raise Unsupported
+        return self.pattern.pattern[index]
+
+    # ____________________________________________________________
+    # building
+
+    def build(self, pattern):
+        """ Add the nodes of 'pattern', which gets the next pattern number.
+        Raises Unsupported if it cannot be turned into a DFA. """
+        self.pattern = pattern
+        if not consts.V37 and pattern.flags & consts.SRE_FLAG_LOCALE:
+            raise Unsupported    # the result would depend on the locale
+        positions = []
+        p = 0
+        while self.pat(p) != consts.OPCODE_SUCCESS:
+            if self.pat(p) != consts.OPCODE_INFO:
+                positions.append(p)
+            p = self.next_op(p)
+        first = 0
+        last = len(positions)
+        begin_anchor = False
+        end_atcode = -1
+        if last > first and self.pat(positions[first]) == consts.OPCODE_AT:
+            atcode = self.pat(positions[first] + 1)
+            if (atcode == consts.AT_BEGINNING or
+                    atcode == consts.AT_BEGINNING_STRING):
+                begin_anchor = True
+                first += 1
+        if last > first and self.pat(positions[last - 1]) == consts.OPCODE_AT:
+            atcode = self.pat(positions[last - 1] + 1)
+            if atcode == consts.AT_END or atcode == consts.AT_END_STRING:
+                end_atcode = atcode
+                last -= 1
+        cont = self.new_node(NODE_MATCH, len(self.starts), -1, -1)
+        i = last - 1
+        while i >= first:
+            cont = self.compile_op(positions[i], cont)
+            i -= 1
+        self.starts.append(cont)
+        self.begin_anchors.append(begin_anchor)
+        self.end_atcodes.append(end_atcode)
+
+    def compile_seq(self, start, stop, cont):
+        positions = []
+        p = start
+        while p < stop:
+            positions.append(p)
+            p = self.next_op(p)
+        if p != stop:
+            raise Unsupported
+        i = len(positions) - 1
+        while i >= 0:
+            cont = self.compile_op(positions[i], cont)
+            i -= 1
+        return cont
+
+    def next_op(self, p):
+        op = self.pat(p)
+        if (op == consts.OPCODE_LITERAL or
+                op == consts.OPCODE_NOT_LITERAL or
+                op == consts.OPCODE_LITERAL_IGNORE or
+                op == consts.OPCODE_NOT_LITERAL_IGNORE or
+                consts.eq(op, consts.OPCODE37_LITERAL_UNI_IGNORE) or
+                consts.eq(op, consts.OPCODE37_NOT_LITERAL_UNI_IGNORE) or
+                op == consts.OPCODE_CATEGORY or
+                op == consts.OPCODE_MARK):
+            return p + 2
+        elif op == consts.OPCODE_ANY or op == consts.OPCODE_ANY_ALL:
+            return p + 1
+        elif (op == consts.OPCODE_IN or
+                op == consts.OPCODE_IN_IGNORE or
+                consts.eq(op, consts.OPCODE37_IN_UNI_IGNORE) or
+                op == consts.OPCODE_INFO or
+                op == consts.OPCODE_REPEAT_ONE or
+                op == consts.OPCODE_MIN_REPEAT_ONE):
+            return p + 1 + self.pat(p + 1)
+        elif op == consts.OPCODE_BRANCH:
+            q = p + 1
+            while self.pat(q):
+                q += self.pat(q)
+            return q + 1
+        elif op == consts.OPCODE_REPEAT:
+            return p + 1 + self.pat(p + 1) + 1
+        elif op == consts.OPCODE_AT:
+            return p + 2     # only supported at the start or the end
+        raise Unsupported
+
+    def compile_op(self, p, cont):
+        op = self.pat(p)
+        if op == consts.OPCODE_MARK or op == consts.OPCODE_INFO:
+            return cont
+        elif op == consts.OPCODE_CATEGORY:
+            self.check_category(self.pat(p + 1))
+            return self.new_node(NODE_CHAR, p, cont, -1)
+        elif (op == consts.OPCODE_IN or
+                op == consts.OPCODE_IN_IGNORE or
+                consts.eq(op, consts.OPCODE37_IN_UNI_IGNORE)):
+            self.check_charset(p + 2)
+            return self.new_node(NODE_CHAR, p, cont, -1)
+        elif op == consts.OPCODE_BRANCH:
+            alternatives = []
+            q = p + 1
+            while self.pat(q):
+                skip = self.pat(q)
+                if self.pat(q + skip - 2) != consts.OPCODE_JUMP:
+                    raise Unsupported
+                alternatives.append(self.compile_seq(q + 1, q + skip - 2, cont))
+                q += skip
+            if not alternatives:
+                raise Unsupported
+            result = alternatives.pop()
+            while alternatives:
+                result = self.new_node(NODE_SPLIT, 0, alternatives.pop(),
+                                       result)
+            return result
+        elif (op == consts.OPCODE_REPEAT_ONE or
+                op == consts.OPCODE_MIN_REPEAT_ONE):
+            # <REPEAT_ONE> <skip> <1=min> <2=max> item <SUCCESS> tail
+            end = p + 1 + self.pat(p + 1) - 1
+            if self.pat(end) != consts.OPCODE_SUCCESS:
+                raise Unsupported
+            return self.compile_repeat(p + 4, end, self.pat(p + 2),
+                                       self.pat(p + 3), cont)
+        elif op == consts.OPCODE_REPEAT:
+            # <REPEAT> <skip> <1=min> <2=max> item <UNTIL> tail
+            until = p + 1 + self.pat(p + 1)
+            if (self.pat(until) != consts.OPCODE_MAX_UNTIL and
+                    self.pat(until) != consts.OPCODE_MIN_UNTIL):
+                raise Unsupported
+            self.has_general_repeat = True
+            return self.compile_repeat(p + 4, until, self.pat(p + 2),
+                                       self.pat(p + 3), cont)
+        elif op == consts.OPCODE_AT:
+            raise Unsupported
+        else:
+            # a single character
+            return self.new_node(NODE_CHAR, p, cont, -1)
+
+    def compile_repeat(self, start, stop, min, max, cont):
+        # the minimizing and maximizing repeats accept the same strings
+        if min > MAX_NFA_NODES or (max != rsre_char.MAXREPEAT and
+                                   max > MAX_NFA_NODES):
+            raise Unsupported
+        if max == rsre_char.MAXREPEAT:
+            loop = self.new_node(NODE_SPLIT, 0, -1, cont)
+            self.outs1[loop] = self.compile_seq(start, stop, loop)
+            result = loop
+        else:
+            result = cont
+            for i in range(max - min):
+                item = self.compile_seq(start, stop, result)
+                result = self.new_node(NODE_SPLIT, 0, item, cont)
+        for i in range(min):
+            result = self.compile_seq(start, stop, result)
+        return result
+
+    def check_category(self, code):
+        if (code == consts.CATEGORY_LOC_WORD or
+                code == consts.CATEGORY_LOC_NOT_WORD):
+            raise Unsupported    # the result would depend on the locale
+
+    def check_charset(self, p):
+        while True:
+            op = self.pat(p)
+            if op == consts.OPCODE_FAILURE:
+                return
+            elif op == consts.OPCODE_NEGATE:
+                p += 1
+            elif op == consts.OPCODE_CATEGORY:
+                self.check_category(self.pat(p + 1))
+                p += 2
+            elif (op == consts.OPCODE_LITERAL or
+                    op == consts.OPCODE_UNICODE_GENERAL_CATEGORY):
+                p += 2
+            elif (op == consts.OPCODE_RANGE or
+                    consts.eq(op, consts.OPCODE27_RANGE_IGNORE) or
+                    consts.eq(op, consts.OPCODE37_RANGE_UNI_IGNORE)):
+                p += 3
+            elif op == consts.OPCODE_CHARSET:
+                p += 1 + 256 / (8 * rsre_char.CODESIZE)
+            elif op == consts.OPCODE_BIGCHARSET:
+                count = self.pat(p + 1)
+                p += (2 + 256 / rsre_char.CODESIZE +
+                      count * (32 / rsre_char.CODESIZE))
+            else:
+                raise Unsupported
+
+    # ____________________________________________________________
+    # running
+
+    def char_matches(self, ctx, node, c):
+        pattern = self.node_patterns[node]
+        ppos = self.args[node]
+        op = pattern.pattern[ppos]
+        if op == consts.OPCODE_LITERAL:
+            return c == pattern.pattern[ppos + 1]
+        elif op == consts.OPCODE_NOT_LITERAL:
+            return c != pattern.pattern[ppos + 1]
+        elif op == consts.OPCODE_LITERAL_IGNORE:
+            return pattern.lowa(c) == pattern.pattern[ppos + 1]
+        elif op == consts.OPCODE_NOT_LITERAL_IGNORE:
+            return pattern.lowa(c) != pattern.pattern[ppos + 1]
+        elif consts.eq(op, consts.OPCODE37_LITERAL_UNI_IGNORE):
+            return rsre_char.getlower_unicode(c) == pattern.pattern[ppos + 1]
+        elif consts.eq(op, consts.OPCODE37_NOT_LITERAL_UNI_IGNORE):
+            return rsre_char.getlower_unicode(c) != pattern.pattern[ppos + 1]
+        elif op == consts.OPCODE_ANY:
+            return not rsre_char.is_linebreak(c)
+        elif op == consts.OPCODE_ANY_ALL:
+            return True
+        elif op == consts.OPCODE_IN:
+            return rsre_char.check_charset(ctx, pattern, ppos + 2, c)
+        elif op == consts.OPCODE_IN_IGNORE:
+            return rsre_char.check_charset(ctx, pattern, ppos + 2,
+                                           pattern.lowa(c))
+        elif consts.eq(op, consts.OPCODE37_IN_UNI_IGNORE):
+            return rsre_char.check_charset(ctx, pattern, ppos + 2,
+                                           rsre_char.getlower_unicode(c))
+        elif op == consts.OPCODE_CATEGORY:
+            return rsre_char.category_dispatch(pattern.pattern[ppos + 1], c)
+        return False
+
+
+class StateCache(object):
+    """ The states of the DFA that were built so far.  A state is the set
+    of NODE_CHAR nodes of the NFA that are active, plus the numbers of the
+    patterns whose NODE_MATCH was reached.  If 'unanchored' is true, the
+    'start_nodes' are added to every state, which finds matches starting
+    anywhere. """
+
+    def __init__(self, nfa, start_nodes, unanchored):
+        self.nfa = nfa
+        self.unanchored = unanchored
+        self.nodes = []          # list of lists of NODE_CHAR nodes
+        self.matches = []        # list of lists of pattern numbers
+        self.accepting = []      # list of bools
+        self.transitions = []    # list of dicts {char: state or DEAD}
+        self.index = {}          # {key: state}
+        self.gave_up = False
+        self.start_nodes = start_nodes
+        self.start = self.get_state(start_nodes)
+
+    def closure(self, nodes):
+        nfa = self.nfa
+        seen = [False] * len(nfa.kinds)
+        pending = nodes[:]
+        while pending:
+            node = pending.pop()
+            if seen[node]:
+                continue
+            seen[node] = True
+            if nfa.kinds[node] == NODE_SPLIT:
+                pending.append(nfa.outs2[node])
+                pending.append(nfa.outs1[node])
+        # sorted, so that equal sets give equal keys
+        chars = []
+        matches = []
+        for node in range(len(seen)):
+            if seen[node]:
+                kind = nfa.kinds[node]
+                if kind == NODE_CHAR:
+                    chars.append(node)
+                elif kind == NODE_MATCH:
+                    matches.append(nfa.args[node])
+        return chars, matches
+
+    def get_state(self, nodes):
+        chars, matches = self.closure(nodes)
+        if not chars and not matches:
+            return DEAD
+        key = '%s!%s' % (','.join([str(node) for node in chars]),
+                         ','.join([str(number) for number in matches]))
+        state = self.index.get(key, -1)
+        if state < 0:
+            if len(self.nodes) >= MAX_DFA_STATES:
+                self.gave_up = True
+                return GAVE_UP
+            state = len(self.nodes)
+            self.nodes.append(chars)
+            self.matches.append(matches)
+            self.accepting.append(len(matches) > 0)
+            self.transitions.append({})
+            self.index[key] = state
+        return state
+
+    def step(self, ctx, state, c):
+        transitions = self.transitions[state]
+        result = transitions.get(c, _MISSING)
+        if result == _MISSING:
+            result = self.compute_step(ctx, state, c)
+            if result != GAVE_UP and len(transitions) < MAX_TRANSITIONS:
+                transitions[c] = result
+        return result
+
+    def compute_step(self, ctx, state, c):
+        nfa = self.nfa
+        targets = []
+        for node in self.nodes[state]:
+            if nfa.char_matches(ctx, node, c):
+                targets.append(nfa.outs1[node])
+        if self.unanchored:
+            targets.extend(self.start_nodes)
+        return self.get_state(targets)
+
+
+class DFA(object):
+    def __init__(self, nfa):
+        self.nfa = nfa
+        self.anchored = StateCache(nfa, nfa.starts, False)
+        self.unanchored = StateCache(nfa, nfa.starts, True)
+        self.begin_anchor = nfa.begin_anchors[0]
+        self.end_atcode = nfa.end_atcodes[0]
+        # a failing match can take exponential time in sre_match() only
+        # with a REPEAT; otherwise the JIT-friendly loops of rsre_core are
+        # used for both search() and match()
+        self.use_for_search = nfa.has_general_repeat
+        self.use_for_match = nfa.has_general_repeat
+
+    def gave_up(self):
+        return self.anchored.gave_up or self.unanchored.gave_up
+
+
+def get_dfa(pattern):
+    """ Return the DFA of the pattern, or None if the pattern cannot be
+    turned into a DFA or would not benefit from one. """
+    # 'dfa' and 'dfa_built' are quasi-immutable fields
+    if not pattern.dfa_built:
+        _build_dfa(pattern)
+    return pattern.dfa
+
+@jit.dont_look_inside
+def _build_dfa(pattern):
+    nfa = NFA()
+    try:
+        nfa.build(pattern)
+    except Unsupported:
+        pass
+    else:
+        dfa = DFA(nfa)
+        if dfa.use_for_search or dfa.use_for_match:
+            pattern.dfa = dfa
+    pattern.dfa_built = True
+
+# ____________________________________________________________
+
+@specializectx
+def _end_ok(ctx, atcode, ptr):
+    if atcode < 0:
+        return True
+    if ptr == ctx.end:
+        return True
+    return (atcode == consts.AT_END and ptr < ctx.end and
+            ctx.next(ptr) == ctx.end and rsre_char.is_linebreak(ctx.str(ptr)))
+
+@specializectx
+@jit.dont_look_inside
+def dfa_match_at(ctx, dfa, ptr):
+    """ Returns FOUND if the pattern matches at 'ptr', DEAD if not, or
+    GAVE_UP. """
+    cache = dfa.anchored
+    state = cache.start
+    while True:
+        if cache.accepting[state] and _end_ok(ctx, dfa.end_atcode, ptr):
+            return FOUND
+        if ptr >= ctx.end:
+            return DEAD
+        state = cache.step(ctx, state, ctx.str(ptr))
+        if state < 0:
+            return state
+        ptr = ctx.next(ptr)
+
+@specializectx
+@jit.dont_look_inside
+def dfa_first_end(ctx, dfa, ptr):
+    """ Returns (FOUND, end) where 'end' is the first position where a match
+    starting at or after 'ptr' ends, or (DEAD, ptr) if there is no match,
+    or (GAVE_UP, ptr). """
+    cache = dfa.unanchored
+    state = cache.start
+    while True:
+        if cache.accepting[state] and _end_ok(ctx, dfa.end_atcode, ptr):
+            return FOUND, ptr
+        if ptr >= ctx.end:
+            return DEAD, ptr
+        state = cache.step(ctx, state, ctx.str(ptr))
+        if state < 0:
+            return state, ptr
+        ptr = ctx.next(ptr)
+
+@specializectx
+@jit.dont_look_inside
+def dfa_leftmost_start(ctx, dfa, start, end):
+    """ Returns (FOUND, ptr) where 'ptr' is the leftmost position between
+    'start' and 'end' where the pattern matches, knowing that there is
+    one, or (GAVE_UP, start).  The anchored DFA is run from all these
+    positions at the same time.  Two runs that reach the same state have
+    the same future, so only the one that started first is kept: there
+    are never more runs than states, and the time is linear in the length
+    of the string. """
+    cache = dfa.anchored
+    live = {}          # state -> leftmost start of the runs in this state
+    found = False
+    best = start
+    ptr = start
+    while True:
+        if not found and ptr <= end and cache.start not in live:
+            live[cache.start] = ptr
+        for state in live:
+            if (cache.accepting[state] and (not found or live[state] < best)
+                    and _end_ok(ctx, dfa.end_atcode, ptr)):
+                best = live[state]
+                found = True
+        if found:
+            # only the runs that started before 'best' can still matter
+            for state in live.keys():
+                if live[state] >= best:
+                    del live[state]
+        if not live or ptr >= ctx.end:
+            break
+        c = ctx.str(ptr)
+        newlive = {}
+        for state in live:
+            run_start = live[state]
+            target = cache.step(ctx, state, c)
+            if target == GAVE_UP:
+                return GAVE_UP, start
+            if target >= 0 and (target not in newlive or
+                                run_start < newlive[target]):
+                newlive[target] = run_start
+        live = newlive
+        ptr = ctx.next(ptr)
+    if found:
+        return FOUND, best
+    return GAVE_UP, start      # should not occur
+
+@specializectx
+def dfa_find_start(ctx, dfa, start):
+    """ Returns (FOUND, ptr) where 'ptr' is the leftmost position at or after
+    'start' where the pattern matches, (DEAD, start) if there is none, or
+    (GAVE_UP, start). """
+    if dfa.begin_anchor:
+        if start != ctx.ZERO:
+            return DEAD, start
+        return dfa_match_at(ctx, dfa, start), start
+    status, end = dfa_first_end(ctx, dfa, start)
+    if status != FOUND:
+        return status, start
+    # the leftmost match starts at or before the end of the first match
+    return dfa_leftmost_start(ctx, dfa, start, end)
+
+def search_context(ctx, pattern):
+    """ Same as rsre_core.search_context(), using the DFA of the pattern
+    when there is one. """
+    dfa = get_dfa(pattern)
+    if (dfa is None or not dfa.use_for_search or dfa.gave_up() or
+            ctx.match_mode != MODE_ANY or ctx.end < ctx.match_start):
+        return rsre_core.search_context(ctx, pattern)
+    start = ctx.match_start
+    status, found = dfa_find_start(ctx, dfa, start)
+    if status == DEAD:
+        ctx.original_pos = start
+        return False
+    if status == FOUND:
+        ctx.match_start = found
+        if rsre_core.match_context(ctx, pattern):
+            ctx.original_pos = start
+            return True
+        ctx.match_start = start
+    return rsre_core.search_context(ctx, pattern)
+
+def match_context(ctx, pattern):
+    """ Same as rsre_core.match_context(), but first checks with the DFA of
+    the pattern that there is a match. """
+    dfa = get_dfa(pattern)
+    if (dfa is None or not dfa.use_for_match or dfa.gave_up() or
+            ctx.match_mode != MODE_ANY or ctx.end < ctx.match_start):
+        return rsre_core.match_context(ctx, pattern)
+    if dfa_match_at(ctx, dfa, ctx.match_start) == DEAD:
+        ctx.original_pos = ctx.match_start
+        return False
+    return rsre_core.match_context(ctx, pattern)
+
+# ____________________________________________________________
+
+class PatternSet(object):
+    """ Several patterns combined into a single DFA, which finds all the
+    patterns that match in one pass over the string.  The patterns that
+    cannot be turned into a DFA are matched one by one. """
+    _immutable_fields_ = ['patterns[*]', 'numbers[*]', 'fallback[*]',
+                          'nfa', 'anchored', 'unanchored',
+                          'anchored_at_zero', 'unanchored_at_zero']
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        nfa = NFA()
+        numbers = []     # pattern number in the NFA -> index in 'patterns'
+        fallback = []
+        for i in range(len(patterns)):
+            size = len(nfa.kinds)
+            try:
+                nfa.build(patterns[i])
+            except Unsupported:
+                nfa.truncate(size)
+                fallback.append(i)
+            else:
+                numbers.append(i)
+        self.nfa = nfa
+        self.numbers = numbers
+        self.fallback = fallback
+        # the patterns starting with '^' are only started at the start of
+        # the string, in the states '*_at_zero'
+        free = [nfa.starts[k] for k in range(len(nfa.starts))
+                              if not nfa.begin_anchors[k]]
+        self.anchored = StateCache(nfa, free, False)
+        self.unanchored = StateCache(nfa, free, True)
+        self.anchored_at_zero = self.anchored.get_state(nfa.starts)
+        self.unanchored_at_zero = self.unanchored.get_state(nfa.starts)
+
+@specializectx
+@jit.dont_look_inside
+def dfa_set_scan(ctx, patternset, cache, state, matched):
+    """ Runs the DFA of the set from ctx.match_start, and sets matched[k]
+    to True for every pattern number k that matches.  Returns FOUND if
+    all the patterns matched, DEAD if the DFA stopped before, or GAVE_UP.
+    """
+    end_atcodes = patternset.nfa.end_atcodes
+    count = 0
+    ptr = ctx.match_start
+    while state >= 0:
+        for number in cache.matches[state]:
+            if not matched[number] and _end_ok(ctx, end_atcodes[number], ptr):
+                matched[number] = True
+                count += 1
+        if count == len(matched):
+            return FOUND
+        if ptr >= ctx.end:
+            return DEAD
+        state = cache.step(ctx, state, ctx.str(ptr))
+        ptr = ctx.next(ptr)
+    return state
+
+@specializectx
+def _set_context(ctx, patternset, search):
+    patternset = jit.promote(patternset)
+    start = ctx.match_start
+    if search:
+        cache = patternset.unanchored
+        state = patternset.unanchored_at_zero
+    else:
+        cache = patternset.anchored
+        state = patternset.anchored_at_zero
+    if start != ctx.ZERO:
+        state = cache.start
+    matched = [False] * len(patternset.patterns)
+    indexes = patternset.fallback
+    status = GAVE_UP
+    if not cache.gave_up:
+        numbers = patternset.numbers
+        dfa_matched = [False] * len(numbers)
+        status = dfa_set_scan(ctx, patternset, cache, state, dfa_matched)
+        for k in range(len(numbers)):
+            matched[numbers[k]] = dfa_matched[k]
+    if status == GAVE_UP:
+        indexes = range(len(patternset.patterns))
+    for i in indexes:
+        ctx.reset(start)
+        if search:
+            matched[i] = search_context(ctx, patternset.patterns[i])
+        else:
+            matched[i] = match_context(ctx, patternset.patterns[i])
+    ctx.reset(start)
+    return [i for i in range(len(matched)) if matched[i]]
+
+def set_search_context(ctx, patternset):
+    """ Returns the sorted list of the indexes of the patterns of the set
+    that would be found by search_context(). """
+    return _set_context(ctx, patternset, True)
+
+def set_match_context(ctx, patternset):
+    """ Returns the sorted list of the indexes of the patterns of the set
+    that would match with match_context(). """
+    return _set_context(ctx, patternset, False)
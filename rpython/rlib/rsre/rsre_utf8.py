@@ -23,6 +23,13 @@ class Utf8MatchContext(AbstractMatchContext):
     def get_single_byte(self, base_position, index):
         return self._utf8[base_position + index]
 
+    def find_literal(self, required, position):
+        assert position >= 0
+        found = self._utf8.find(required.as_utf8, position, self.end)
+        if found < 0:
+            return self.end
+        return found
+
     def next(self, position):
         return rutf8.next_codepoint_pos(self._utf8, position)
     next_indirect = next
@@ -3,6 +3,7 @@ from rpython.rlib import debug
 from rpython.rlib.rsre.rsre_core import _adjust, match_context, search_context
 from rpython.rlib.rsre.rsre_core import MODE_FULL
 from rpython.rlib.rsre.rsre_core import StrMatchContext, EndOfString
+from rpython.rlib.rsre.rsre_core import AbstractMatchContext
 
 
 class Position(object):
@@ -77,6 +78,10 @@ class MatchContextForTests(StrMatchContext):
     def debug_check_pos(self, position):
         assert isinstance(position, Position)
 
+    def find_literal(self, required, position):
+        # the generic version, which works with Positions
+        return AbstractMatchContext.find_literal(self, required, position)
+
     #def minimum_distance(self, position_low, position_high):
     #    """Return an estimate.  The real value may be higher."""
     #    assert isinstance(position_low, Position)
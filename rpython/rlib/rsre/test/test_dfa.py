@@ -0,0 +1,175 @@
+import re, random
+from rpython.rlib.rsre import rsre_core, rsre_dfa
+from rpython.rlib.rsre.rpy import get_code
+
+
+def search(pattern, string, start=0):
+    ctx = rsre_core.StrMatchContext(string, start, len(string))
+    if rsre_dfa.search_context(ctx, pattern):
+        return ctx
+    return None
+
+def match(pattern, string, start=0):
+    ctx = rsre_core.StrMatchContext(string, start, len(string))
+    if rsre_dfa.match_context(ctx, pattern):
+        return ctx
+    return None
+
+
+def test_get_dfa():
+    assert rsre_dfa.get_dfa(get_code(r"(a+)+b")) is not None
+    assert rsre_dfa.get_dfa(get_code(r"^(\w+\s?)*$")) is not None
+    # no general REPEAT: sre_match() cannot backtrack catastrophically,
+    # and the JIT-friendly loops of rsre_core are used
+    assert rsre_dfa.get_dfa(get_code(r"[ab]c|d")) is None
+    assert rsre_dfa.get_dfa(get_code(r"abc\d+")) is None
+    assert rsre_dfa.get_dfa(get_code(r"[ab]+c")) is None
+    # not regular
+    assert rsre_dfa.get_dfa(get_code(r"(a)(?:x|y)*\1")) is None
+    assert rsre_dfa.get_dfa(get_code(r"(?:a|b)*(?=c)")) is None
+    assert rsre_dfa.get_dfa(get_code(r"(?:a|b)*\bc")) is None
+    assert rsre_dfa.get_dfa(get_code(r"(?L)(?:\w|-)+")) is None
+
+def test_dfa_is_cached():
+    pattern = get_code(r"(?:ab|c)+d")
+    dfa = rsre_dfa.get_dfa(pattern)
+    assert rsre_dfa.get_dfa(pattern) is dfa
+    search(pattern, "xxabcabd")
+    n = len(dfa.unanchored.nodes)
+    search(pattern, "xxabcabd")
+    assert len(dfa.unanchored.nodes) == n
+
+def test_catastrophic_backtracking():
+    pattern = get_code(r"(a+)+b")
+    assert match(pattern, "a" * 100) is None
+    assert search(pattern, "a" * 100) is None
+    res = search(pattern, "a" * 100 + "b")
+    assert (res.match_start, res.match_end) == (0, 101)
+    pattern = get_code(r"^(\w+\s?)*$")
+    assert search(pattern, "an example of a catastrophic input!") is None
+    res = search(pattern, "an example of a fine input")
+    assert res is not None
+
+def test_leftmost_start_is_linear():
+    # many positions could start a match, and all the runs from them are
+    # followed at once
+    pattern = get_code(r"(?:a|ab)+c")
+    dfa = rsre_dfa.get_dfa(pattern)
+    s = "ab" * 2000 + "c"
+    ctx = rsre_core.StrMatchContext(s, 0, len(s))
+    status, end = rsre_dfa.dfa_first_end(ctx, dfa, 0)
+    assert (status, end) == (rsre_dfa.FOUND, len(s))
+    assert rsre_dfa.dfa_leftmost_start(ctx, dfa, 0, end) == (
+        rsre_dfa.FOUND, 0)
+    s = "xb" + "ab" * 10 + "c"
+    res = search(pattern, s)
+    assert (res.match_start, res.match_end) == (2, len(s))
+
+def test_original_pos():
+    pattern = get_code(r"(?:x|yz)+w")
+    res = search(pattern, "aaxyzxw", 1)
+    assert (res.original_pos, res.match_start, res.match_end) == (1, 2, 7)
+
+def test_gave_up(monkeypatch):
+    monkeypatch.setattr(rsre_dfa, 'MAX_DFA_STATES', 3)
+    pattern = get_code(r"(?:ab|b)*a(?:a|b)(?:a|b)(?:a|b)x")
+    res = search(pattern, "bbbabababbabbbx")
+    assert rsre_dfa.get_dfa(pattern).gave_up()
+    assert (res.match_start, res.match_end) == (0, 15)
+
+def test_compare_with_re():
+    patterns = [r"(?:ab|a)*c", r"(a|ab)(c|bcd)(d*)", r"(?:x+x+)+y",
+                r"[a-c]+?(?:b|cc){1,3}", r"(?s).(?:a.|b)*?c", r"a{2,4}b?",
+                r"(?i)(?:AB|c)+D", r"^(?:a|bc)*$", r"(?:a|b)+\Z",
+                r"\d+(?:\.\d*)?", r"\A(?:[^c]c?)+", r"(?:|a|bc)+c",
+                r"(?:a|b|)*", r"[^ab]{0,2}(?:b|ca)"]
+    r = random.Random(42)
+    for regexp in patterns:
+        pattern = get_code(regexp)
+        compiled = re.compile(regexp)
+        for i in range(200):
+            s = ''.join([r.choice('abcdx.\n1') for j in range(r.randrange(12))])
+            start = r.randrange(len(s) + 1)
+            for func, expected in [(search, compiled.search(s, start)),
+                                   (match, compiled.match(s, start))]:
+                res = func(pattern, s, start)
+                if expected is None:
+                    assert res is None, (regexp, s, start)
+                else:
+                    assert res is not None, (regexp, s, start)
+                    assert res.span() == expected.span()
+                    groups = [res.span(i) for i in range(1, compiled.groups + 1)]
+                    assert groups == [expected.span(i)
+                                      for i in range(1, compiled.groups + 1)]
+
+def test_translates():
+    from rpython.rtyper.test.test_llinterp import interpret
+    pattern = get_code(r"(?:ab|c)+d")
+    def f(i):
+        s = "xxabcd" if i else "xxabce"
+        ctx = rsre_core.StrMatchContext(s, 0, len(s))
+        if not rsre_dfa.search_context(ctx, pattern):
+            return -1
+        return ctx.match_start * 10 + ctx.match_end
+    assert interpret(f, [1]) == 26
+    assert interpret(f, [0]) == -1
+
+def set_search(patternset, string, start=0):
+    ctx = rsre_core.StrMatchContext(string, start, len(string))
+    return rsre_dfa.set_search_context(ctx, patternset)
+
+def set_match(patternset, string, start=0):
+    ctx = rsre_core.StrMatchContext(string, start, len(string))
+    return rsre_dfa.set_match_context(ctx, patternset)
+
+def test_pattern_set():
+    regexps = [r"ab+c", r"^a", r"b$", r"(a)\1", r"(?:x|y)+z", r"\d\Z"]
+    patternset = rsre_dfa.PatternSet([get_code(r) for r in regexps])
+    assert patternset.fallback == [3]
+    assert set_search(patternset, "xxabbc") == [0]
+    assert set_search(patternset, "abbcab") == [0, 1, 2]
+    assert set_search(patternset, "abbcab", 1) == [2]
+    assert set_search(patternset, "yyzaa1") == [3, 4, 5]
+    assert set_match(patternset, "yyzaa1") == [4]
+    assert set_match(patternset, "abc") == [0, 1]
+    assert set_match(patternset, "b\n") == [2]
+    assert set_search(patternset, "") == []
+
+def test_pattern_set_compare_with_re():
+    regexps = [r"(?:ab|a)*c", r"(?:x+x+)+y", r"[a-c]+?(?:b|cc){1,3}",
+               r"^(?:a|bc)*$", r"(?:a|b)+\Z", r"\d+(?:\.\d*)?",
+               r"\A(?:[^c]c?)+", r"(a|b)\1", r"(?i)X.", r"b(?=c)"]
+    compiled = [re.compile(r) for r in regexps]
+    patternset = rsre_dfa.PatternSet([get_code(r) for r in regexps])
+    r = random.Random(42)
+    for i in range(300):
+        s = ''.join([r.choice('abcdx.\n1') for j in range(r.randrange(12))])
+        start = r.randrange(len(s) + 1)
+        expected = [k for k in range(len(regexps))
+                      if compiled[k].search(s, start)]
+        assert set_search(patternset, s, start) == expected, (s, start)
+        expected = [k for k in range(len(regexps))
+                      if compiled[k].match(s, start)]
+        assert set_match(patternset, s, start) == expected, (s, start)
+
+def test_pattern_set_gave_up(monkeypatch):
+    monkeypatch.setattr(rsre_dfa, 'MAX_DFA_STATES', 3)
+    patternset = rsre_dfa.PatternSet([get_code(r"(?:a|b)*abbx"),
+                                      get_code(r"c")])
+    assert set_search(patternset, "babbabbx") == [0]
+    assert patternset.unanchored.gave_up
+    assert set_search(patternset, "abbxc") == [0, 1]
+
+def test_pattern_set_translates():
+    from rpython.rtyper.test.test_llinterp import interpret
+    patternset = rsre_dfa.PatternSet([get_code(r"(?:ab|c)+d"),
+                                      get_code(r"^x"), get_code(r"(x)\1")])
+    def f(i):
+        s = "xxabcd" if i else "abxxe"
+        ctx = rsre_core.StrMatchContext(s, 0, len(s))
+        result = 0
+        for index in rsre_dfa.set_search_context(ctx, patternset):
+            result = result * 10 + index + 1
+        return result
+    assert interpret(f, [1]) == 123
+    assert interpret(f, [0]) == 3
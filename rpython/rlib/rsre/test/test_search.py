@@ -230,6 +230,35 @@ class BaseTestSearch:
                     #assert match is None # this is only true on cpy2 (but not on pypy2/3 and cpy3)
                     assert res is None
 
+    def test_required_literal(self):
+        r_code = get_code(r'\d+ ERROR: (.*)')
+        required = rsre_core.get_required_literal(r_code)
+        assert required.codes == map(ord, ' ERROR: ')
+        assert (required.min_offset, required.max_offset) == (1, -1)
+        r_code = get_code(r'[ab]{2,3}(x)y.z')
+        required = rsre_core.get_required_literal(r_code)
+        assert required.codes == map(ord, 'xy')
+        assert (required.min_offset, required.max_offset) == (2, 3)
+        assert rsre_core.get_required_literal(get_code(r'a|bcd')) is None
+
+    def test_required_literal_search(self):
+        P = self.P
+        for regexp in [r'\d+ ERROR: (.*)', r'[ab]{2,3}(x)y.z', r'.xx',
+                       r'[ab]?(?:c|d)xy', r'\s*x', r'[0-9]x+?y']:
+            r_code, r = get_code_and_re(regexp)
+            for s in ['', 'a', '12 ERROR: foo', 'INFO 12 ERROR:',
+                      'x 3 ERROR: 4 ERROR: 5', 'bbxyazabxy.z', 'aaaxyxyz',
+                      'bcxy', 'xxxx', '  x', '1xx1xy']:
+                for start in range(len(s) + 1):
+                    match = r.search(s, start)
+                    res = self.search(r_code, s, start)
+                    if match is None:
+                        assert res is None
+                    else:
+                        assert res is not None
+                        assert res.span() == (P(match.start()),
+                                              P(match.end()))
+
 
 class TestSearchCustom(BaseTestSearch):
     search = staticmethod(support.search)
@@ -257,6 +286,13 @@ class TestSearchUtf8(BaseTestSearch):
         assert     self.match(r, u"üüüüüüüü".encode("utf-8"))
         assert     self.match(r, u"üüüüüüüüü".encode("utf-8"))
 
+    def test_required_literal_non_ascii(self):
+        r_code = get_code(u'\\w+=\xe9t\xe9', re.UNICODE)
+        s = u'a=\xe9 ab=\xe9t\xe9'.encode('utf-8')
+        res = self.search(r_code, s)
+        assert res.span() == (len(u'a=\xe9 '.encode('utf-8')), len(s))
+        assert self.search(r_code, u'ab=\xe9t'.encode('utf-8')) is None
+
     def test_literal_uni_ignore(self):
         r = get_code(u"(?i)\u0135")
         assert self.match(r, u'\u0134'.encode('utf-8'))
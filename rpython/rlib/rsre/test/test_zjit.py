@@ -104,6 +104,11 @@ class TestJitRSre(support.LLJitMixin):
         res = self.meta_interp_search(r"<\w+>", "eiofweoxdiwhdoh<foobar>ua")
         assert res == 15
 
+    def test_required_literal_search(self):
+        res = self.meta_interp_search(r"\d+ ERROR",
+                                      "1 INFO 22 WARN 3 x " * 10 + "42 ERROR")
+        assert res == 190
+
     def test_regular_search_upcase(self):
         res = self.meta_interp_search(r"<\w+>", "EIOFWEOXDIWHDOH<FOOBAR>UA")
         assert res == 15
@@ -32,8 +32,10 @@ def get_unique_id(code):
         return code._vmprof_unique_id
     return 0
 
-def enable(fileno, interval, memory=0, native=0, real_time=0):
-    _get_vmprof().enable(fileno, interval, memory, native, real_time)
+def enable(fileno, interval, memory=0, native=0, real_time=0,
+           alloc_sample=0):
+    _get_vmprof().enable(fileno, interval, memory, native, real_time,
+                         alloc_sample)
 
 def disable():
     _get_vmprof().disable()
@@ -61,6 +63,12 @@ def stop_sampling():
 def start_sampling():
     return _get_vmprof().start_sampling()
 
+def sample_allocation(sample_id, size):
+    _get_vmprof().sample_allocation(sample_id, size)
+
+def alloc_sample_promoted(sample_id, survived):
+    _get_vmprof().alloc_sample_promoted(sample_id, survived)
+
 # ----------------
 # stacklet support
 # ----------------
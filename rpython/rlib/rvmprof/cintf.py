@@ -152,6 +152,13 @@ def setup():
     vmprof_start_sampling = rffi.llexternal("vmprof_start_sampling", [],
                                             lltype.Void, compilation_info=eci,
                                             _nowrapper=True)
+    vmprof_sample_allocation = rffi.llexternal("vmprof_sample_allocation",
+                                               [rffi.LONG, rffi.LONG],
+                                               rffi.INT, compilation_info=eci,
+                                               _nowrapper=True)
+    vmprof_alloc_sample_promoted = rffi.llexternal(
+        "vmprof_alloc_sample_promoted", [rffi.LONG, rffi.LONG],
+        rffi.INT, compilation_info=eci, _nowrapper=True)
 
     return CInterface(locals())
 
@@ -14,7 +14,8 @@ class DummyVMProf(object):
     def register_code(self, code, full_name_func):
         pass
 
-    def enable(self, fileno, interval, memory=0, native=0, real_time=0):
+    def enable(self, fileno, interval, memory=0, native=0, real_time=0,
+               alloc_sample=0):
         pass
 
     def disable(self):
@@ -25,3 +26,9 @@ class DummyVMProf(object):
 
     def stop_sampling(self):
         return -1
+
+    def sample_allocation(self, sample_id, size):
+        pass
+
+    def alloc_sample_promoted(self, sample_id, survived):
+        pass
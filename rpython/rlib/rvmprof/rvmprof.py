@@ -129,15 +129,21 @@ class VMProf(object):
         self._gather_all_code_objs = gather_all_code_objs
 
     @jit.dont_look_inside
-    def enable(self, fileno, interval, memory=0, native=0, real_time=0):
+    def enable(self, fileno, interval, memory=0, native=0, real_time=0,
+               alloc_sample=0):
         """Enable vmprof.  Writes go to the given 'fileno'.
         The sampling interval is given by 'interval' as a number of
         seconds, as a float which must be smaller than 1.0.
+        If 'alloc_sample' is true, the caller is going to write samples
+        with sample_allocation().
         Raises VMProfError if something goes wrong.
         """
         assert fileno >= 0
         if self.is_enabled:
             raise VMProfError("vmprof is already enabled")
+        if alloc_sample and PLAT_WINDOWS:
+            raise VMProfError("allocation sampling is not supported "
+                              "on this platform")
 
         if PLAT_WINDOWS:
             native = 0 # force disabled on Windows
@@ -187,6 +193,27 @@ class VMProf(object):
         """
         self.cintf.vmprof_start_sampling()
 
+    def sample_allocation(self, sample_id, size):
+        """
+        Write a stack sample of the current thread to the profile now,
+        followed by an allocation record with 'sample_id' and the 'size'
+        of the sampled object.  Meant to be called from the GC hooks when
+        an allocation sample is taken; does nothing if vmprof is not
+        enabled.
+        """
+        if self.is_enabled:
+            self.cintf.vmprof_sample_allocation(sample_id, size)
+
+    def alloc_sample_promoted(self, sample_id, survived):
+        """
+        Write a record saying whether the object of the allocation sample
+        'sample_id' survived its first minor collection.  Meant to be
+        called from the GC hooks; does nothing if vmprof is not enabled.
+        """
+        if self.is_enabled:
+            self.cintf.vmprof_alloc_sample_promoted(sample_id,
+                                                    int(survived))
+
 
 def vmprof_execute_code(name, get_code_fn, result_class=None,
                         _hack_update_stack_untranslated=False):
@@ -12,6 +12,7 @@
 #endif
 
 
+#include <string.h>
 #include "vmprof_common.h"
 
 #include "shared/vmprof_get_custom_offset.h"
@@ -46,3 +47,79 @@ void vmprof_start_sampling(void)
 {
     vmprof_ignore_signals(0);
 }
+
+#ifdef VMPROF_UNIX
+/* An allocation sample record is the marker followed by two words. */
+#define ALLOC_RECORD_SIZE  (1 + 2 * sizeof(long))
+
+static void write_alloc_record(char *dst, char marker, long a, long b)
+{
+    dst[0] = marker;
+    memcpy(dst + 1, &a, sizeof(long));
+    memcpy(dst + 1 + sizeof(long), &b, sizeof(long));
+}
+
+int vmprof_sample_allocation(long sample_id, long size)
+{
+    /* Write a stack sample of the current thread right now, in the same
+       format as the ones written by the SIGPROF handler, followed in the
+       same buffer by a MARKER_ALLOC_SAMPLE record with 'sample_id' and
+       the 'size' of the object.  Called by the GC when an allocation
+       crosses an allocation sample point.  Returns 1 if a sample was
+       written, 0 if there was nothing to record and -1 if no buffer was
+       free. */
+    int fd;
+    struct profbuf_s *p;
+
+    fd = vmp_profile_fileno();
+    if (fd < 0)
+        return 0;
+    p = reserve_buffer(fd);
+    if (p == NULL)
+        return -1;
+    /* no thread state, like in the timer case.  Leave room for the
+       thread state, the rss and the allocation record. */
+    if (!_vmprof_sample_stack_at(p, NULL, 0, MAX_STACK_DEPTH - 5)) {
+        cancel_buffer(p);
+        return 0;
+    }
+    write_alloc_record(p->data + p->data_offset + p->data_size,
+                       MARKER_ALLOC_SAMPLE, sample_id, size);
+    p->data_size += ALLOC_RECORD_SIZE;
+    commit_buffer(fd, p);
+    return 1;
+}
+
+int vmprof_alloc_sample_promoted(long sample_id, long survived)
+{
+    /* Write a MARKER_ALLOC_SAMPLE_PROMOTED record: the object of the
+       sample 'sample_id' survived the minor collection (survived == 1)
+       or died in the nursery (survived == 0).  Same return value as
+       vmprof_sample_allocation(). */
+    int fd;
+    struct profbuf_s *p;
+
+    fd = vmp_profile_fileno();
+    if (fd < 0)
+        return 0;
+    p = reserve_buffer(fd);
+    if (p == NULL)
+        return -1;
+    write_alloc_record(p->data, MARKER_ALLOC_SAMPLE_PROMOTED,
+                       sample_id, survived);
+    p->data_size = ALLOC_RECORD_SIZE;
+    commit_buffer(fd, p);
+    return 1;
+}
+#else
+int vmprof_sample_allocation(long sample_id, long size)
+{
+    /* not supported: rvmprof.enable() refuses 'alloc_sample' here */
+    return 0;
+}
+
+int vmprof_alloc_sample_promoted(long sample_id, long survived)
+{
+    return 0;
+}
+#endif
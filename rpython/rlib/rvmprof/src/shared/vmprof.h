@@ -19,6 +19,8 @@
 #define MARKER_TIME_N_ZONE '\x06'
 #define MARKER_META '\x07'
 #define MARKER_NATIVE_SYMBOLS '\x08'
+#define MARKER_ALLOC_SAMPLE '\x09'          /* sample id, size */
+#define MARKER_ALLOC_SAMPLE_PROMOTED '\x0a' /* sample id, survived */
 
 #define VERSION_BASE '\x00'
 #define VERSION_THREAD_ID '\x01'
@@ -87,15 +87,24 @@ void segfault_handler(int arg)
 }
 
 int _vmprof_sample_stack(struct profbuf_s *p, PY_THREAD_STATE_T * tstate, ucontext_t * uc)
+{
+#ifdef RPYTHON_VMPROF
+    return _vmprof_sample_stack_at(p, tstate, (intptr_t)GetPC(uc), MAX_STACK_DEPTH-1);
+#else
+    return _vmprof_sample_stack_at(p, tstate, (intptr_t)NULL, MAX_STACK_DEPTH-1);
+#endif
+}
+
+int _vmprof_sample_stack_at(struct profbuf_s *p, PY_THREAD_STATE_T * tstate, intptr_t pc, int max_depth)
 {
     int depth;
     struct prof_stacktrace_s *st = (struct prof_stacktrace_s *)p->data;
     st->marker = MARKER_STACKTRACE;
     st->count = 1;
 #ifdef RPYTHON_VMPROF
-    depth = get_stack_trace(get_vmprof_stack(), st->stack, MAX_STACK_DEPTH-1, (intptr_t)GetPC(uc));
+    depth = get_stack_trace(get_vmprof_stack(), st->stack, max_depth, pc);
 #else
-    depth = get_stack_trace(tstate, st->stack, MAX_STACK_DEPTH-1, (intptr_t)NULL);
+    depth = get_stack_trace(tstate, st->stack, max_depth, pc);
 #endif
     // useful for tests (see test_stop_sampling)
 #ifndef RPYTHON_LL2CTYPES
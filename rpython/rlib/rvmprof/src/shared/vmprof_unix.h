@@ -52,6 +52,7 @@ int get_stack_trace(PY_THREAD_STATE_T * current, void** result, int max_depth, i
 
 void segfault_handler(int arg);
 int _vmprof_sample_stack(struct profbuf_s *p, PY_THREAD_STATE_T * tstate, ucontext_t * uc);
+int _vmprof_sample_stack_at(struct profbuf_s *p, PY_THREAD_STATE_T * tstate, intptr_t pc, int max_depth);
 void sigprof_handler(int sig_nr, siginfo_t* info, void *ucontext);
 
 